@@ -1,6 +1,6 @@
 import re
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 
 DEFAULT_SUPPORT_TELEGRAM_URL = "https://t.me/example_support"
@@ -158,24 +158,36 @@ def detect_language(text: str) -> str:
     return "en" if english_hits > spanish_hits else "es"
 
 
-def is_low_context_greeting(text: str) -> bool:
-    normalized = re.sub(r"[^a-zA-Záéíóúüñ ]+", " ", str(text or "").lower()).strip()
+_GREETING_STRIP_RE = re.compile(r"[^a-zA-Záéíóúüñ ]+")
+_HEX_SECRET_RE = re.compile(r"\b[0-9a-fA-F]{64}\b")
+_URL_RE = re.compile(r"https?://\S+")
+# One alternation scans the text once instead of one search per pattern.
+_SPAM_RE = re.compile("|".join(f"(?:{pattern})" for pattern in SPAM_PATTERNS))
+_HEX_SECRET_LEN = 64
+
+
+def _lowered(text: str, lowered: Optional[str]) -> str:
+    # Callers that already lowercased the text pass it in to skip another O(n) copy.
+    return str(text or "").lower() if lowered is None else lowered
+
+
+def is_low_context_greeting(text: str, lowered: Optional[str] = None) -> bool:
+    normalized = _GREETING_STRIP_RE.sub(" ", _lowered(text, lowered)).strip()
     words = [piece for piece in normalized.split() if piece]
     if not words or len(words) > 3:
         return False
     return all(word in HELLO_WORDS for word in words)
 
 
-def is_spam_like_message(text: str) -> bool:
-    lowered = str(text or "").lower()
-    return any(re.search(pattern, lowered) for pattern in SPAM_PATTERNS)
+def is_spam_like_message(text: str, lowered: Optional[str] = None) -> bool:
+    return _SPAM_RE.search(_lowered(text, lowered)) is not None
 
 
-def contains_sensitive_material(text: str) -> bool:
-    lowered = str(text or "").lower()
-    if _has_any(lowered, SECRET_KEYWORDS):
+def contains_sensitive_material(text: str, lowered: Optional[str] = None) -> bool:
+    if _has_any(_lowered(text, lowered), SECRET_KEYWORDS):
         return True
-    if re.search(r"\b[0-9a-fA-F]{64}\b", str(text or "")):
+    raw = str(text or "")
+    if len(raw) >= _HEX_SECRET_LEN and _HEX_SECRET_RE.search(raw):
         return True
     return False
 
@@ -184,7 +196,7 @@ def has_reference_url(text: str, config: SupportGuidanceConfig) -> bool:
     lowered = str(text or "").lower()
     prefix = str(config.user_url_prefix or "").strip().lower()
     return bool(
-        re.search(r"https?://\S+", lowered)
+        _URL_RE.search(lowered)
         or "www." in lowered
         or (prefix and prefix in lowered)
     )
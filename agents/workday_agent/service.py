@@ -1,22 +1,49 @@
+import atexit
+import gzip
+import hashlib
 import json
+import os
+import queue
+import re
 import subprocess
 import random
 import threading
 import sys
 import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
 from datetime import date, datetime
 from datetime import timedelta
+from functools import lru_cache
+from itertools import chain, repeat
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Iterator, Optional, Tuple
 from urllib.parse import urlsplit, urlunsplit
 
 import httpx
 from playwright.sync_api import sync_playwright
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - depende del entorno local
+    orjson = None
 
 
 AGENT_NAME = "workday_agent"
 
 
+@dataclass(slots=True)
+class RuntimePlan:
+    """Click timestamps read once from the persisted runtime state."""
+
+    first_click_ts: float = 0.0
+    planned_first_ts: float = 0.0
+    start_break_ts: float = 0.0
+    stop_break_ts: float = 0.0
+    planned_start_break_ts: float = 0.0
+    planned_stop_break_ts: float = 0.0
+    planned_final_ts: float = 0.0
+
+
 class WorkdayAgentService:
     """Agent for phased web automation."""
     ACTIVE_PHASES = {"waiting_start", "working_before_break", "on_break", "working_after_break"}
@@ -38,6 +65,155 @@ class WorkdayAgentService:
     REDUCED_FINAL_CLICK_MAX_DELAY_SECONDS = (
         REDUCED_WORK_DURATION_SECONDS + BREAK_DURATION_SECONDS + FINAL_CLICK_RANDOM_MARGIN_SECONDS
     )
+    # Backoff chunks used while waiting for a planned click with an open page.
+    WAIT_BACKOFF_STEPS_SECONDS = (0.5, 1, 2, 5, 15, 60, 300)
+    WAIT_SELECTOR_PROBE_TIMEOUT_MS = 5_000
+    SCREENSHOT_JPEG_QUALITY = 70
+    SCREENSHOT_CLIP_WIDTH = 1280
+    SCREENSHOT_MAX_CLIP_HEIGHT = 8192
+    END_OF_DAY_MODAL_PRIMARY_SELECTOR = "button:has-text('Sí, he terminado')"
+    END_OF_DAY_MODAL_FALLBACK_SELECTOR = "button:has-text('Si, he terminado')"
+    END_OF_DAY_MODAL_APPEAR_TIMEOUT_MS = 2_000
+    TARGET_PAGE_REUSE_MAX_AGE_SECONDS = 60
+    JITTER_BUFFER_SIZE = 4096
+    IO_QUEUE_MAXSIZE = 1024
+    SLEEP_LOG_INTERVAL_SECONDS = 900
+    HTML_EXCERPT_MAX_CHARS = 200_000
+    # Top-frame markup in one evaluate, without page.content()'s frame coordination.
+    HTML_SNAPSHOT_JS = "() => document.documentElement.outerHTML"
+    # Prefers the <main> app region over the whole document; returns a context header and the markup.
+    HTML_EXCERPT_JS = """
+(limit) => {
+    const el = document.querySelector("main") || document.body || document.documentElement;
+    return [
+        document.title + " | " + location.href + " | " + document.readyState,
+        el ? el.outerHTML.slice(0, limit) : "",
+    ];
+}
+"""
+    # Maps each icon label to whether a visible button holds it; waits up to
+    # timeoutMs for any of them to appear.
+    PROBE_ICONS_JS = """
+([labels, timeoutMs]) => new Promise((resolve) => {
+    const visible = (el) => !!el && (el.checkVisibility ? el.checkVisibility() : el.getClientRects().length > 0);
+    const probe = () => Object.fromEntries(labels.map((label) => [
+        label,
+        Array.from(document.querySelectorAll(`svg[aria-label='${label}']`))
+            .some((svg) => visible(svg.closest("button"))),
+    ]));
+    const first = probe();
+    if (Object.values(first).some(Boolean) || timeoutMs <= 0) {
+        resolve(first);
+        return;
+    }
+    const observer = new MutationObserver(() => {
+        const result = probe();
+        if (Object.values(result).some(Boolean)) {
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve(result);
+        }
+    });
+    const timer = setTimeout(() => {
+        observer.disconnect();
+        resolve(probe());
+    }, timeoutMs);
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+})
+"""
+    IN_VIEWPORT_JS = (
+        "(e) => { const r = e.getBoundingClientRect(); "
+        "return r.top >= 0 && r.left >= 0 && r.bottom <= innerHeight && r.right <= innerWidth; }"
+    )
+    COOKIE_REJECT_SELECTORS = ("#onetrust-reject-all-handler",)
+    LOCATION_DENY_BUTTON_TEXTS = ("Deny", "Block", "No permitir", "Rechazar")
+    COOKIE_DISMISS_TIMEOUT_MS = 1_500
+    LOCATION_DISMISS_TIMEOUT_MS = 1_500
+    # Clicks the first visible CSS match or button whose text contains a candidate
+    # (case-insensitive, like Playwright's :has-text); waits up to timeoutMs for one to render.
+    DISMISS_FIRST_MATCH_JS = """
+([selectors, texts, timeoutMs]) => new Promise((resolve) => {
+    const visible = (el) => el && el.getClientRects().length > 0;
+    const lowered = texts.map((text) => text.toLowerCase());
+    const tryClick = () => {
+        for (const selector of selectors) {
+            const el = document.querySelector(selector);
+            if (visible(el)) {
+                el.click();
+                return selector;
+            }
+        }
+        if (lowered.length) {
+            for (const button of document.querySelectorAll("button")) {
+                const label = (button.textContent || "").toLowerCase();
+                const idx = lowered.findIndex((text) => label.includes(text));
+                if (idx >= 0 && visible(button)) {
+                    button.click();
+                    return texts[idx];
+                }
+            }
+        }
+        return null;
+    };
+    const first = tryClick();
+    if (first || timeoutMs <= 0) {
+        resolve(first);
+        return;
+    }
+    const observer = new MutationObserver(() => {
+        const matched = tryClick();
+        if (matched) {
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve(matched);
+        }
+    });
+    const timer = setTimeout(() => {
+        observer.disconnect();
+        resolve(null);
+    }, timeoutMs);
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+})
+"""
+    # Runs several DISMISS_FIRST_MATCH_JS searches concurrently; resolves to one match (or null) per group.
+    DISMISS_OVERLAYS_JS = "(groups) => Promise.all(groups.map((args) => (" + DISMISS_FIRST_MATCH_JS.strip() + ")(args)))"
+    # DISMISS_FIRST_MATCH_JS arguments per overlay, built once instead of on every dismiss.
+    DISMISS_OVERLAY_GROUPS = {
+        "cookies": [list(COOKIE_REJECT_SELECTORS), [], COOKIE_DISMISS_TIMEOUT_MS],
+        "location": [[], list(LOCATION_DENY_BUTTON_TEXTS), LOCATION_DISMISS_TIMEOUT_MS],
+    }
+    # Resolves true as soon as a visible element matches the selector (same
+    # visibility rule as PROBE_ICONS_JS), false after the timeout.
+    SELECTOR_OBSERVER_JS = """
+([selector, timeoutMs]) => new Promise((resolve) => {
+    const visible = (el) => !!el && (el.checkVisibility ? el.checkVisibility() : el.getClientRects().length > 0);
+    const found = () => Array.from(document.querySelectorAll(selector)).some(visible);
+    if (found()) {
+        resolve(true);
+        return;
+    }
+    const observer = new MutationObserver(() => {
+        if (found()) {
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve(true);
+        }
+    });
+    const timer = setTimeout(() => {
+        observer.disconnect();
+        resolve(false);
+    }, timeoutMs);
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+})
+"""
+
+    # Generic heuristic to detect authentication screens from different providers.
+    AUTH_URL_RE = re.compile(r"login|signin|sso|auth", re.IGNORECASE)
+    SNAPSHOT_LEVELS = ("none", "error_only", "all")
+    ICON_SELECTOR_TMPL = "button:has(svg[aria-label='{}'])"
+    TOOLBAR_ICON_LABELS = ("Icon-play", "Icon-pause", "Icon-stop")
+    WORKDAY_ICONS_SELECTOR = ", ".join(map(ICON_SELECTOR_TMPL.format, TOOLBAR_ICON_LABELS))
+    WORKDAY_ICONS_TIMEOUT_MS = 10_000
 
     def __init__(
         self,
@@ -49,6 +225,9 @@ class WorkdayAgentService:
         webhook_start_break_url: str,
         webhook_stop_break_url: str,
         logger,
+        debug_html_snapshots: bool = False,
+        fast_mode: bool = False,
+        snapshot_level: str = "all",
     ) -> None:
         self.data_dir = data_dir
         self.target_url = target_url
@@ -58,14 +237,43 @@ class WorkdayAgentService:
         self.webhook_start_break_url = webhook_start_break_url
         self.webhook_stop_break_url = webhook_stop_break_url
         self.logger = logger
+        # Full DOM dumps are large; only write them when explicitly requested.
+        self.debug_html_snapshots = bool(debug_html_snapshots)
+        # Dev/CI only: skip the real waits between clicks and advance the browser clock instead.
+        self.fast_mode = bool(fast_mode)
+        self.snapshot_level = self._normalize_snapshot_level(snapshot_level)
         self._run_lock = threading.Lock()
+        # One Event per active run_id; set by cancel_run() to wake planned waits.
+        self._cancel_events: Dict[str, threading.Event] = {}
         self._status_lock = threading.Lock()
         self._config_lock = threading.Lock()
+        self._events_lock = threading.Lock()
+        self._events_fd: Optional[int] = None
+        # Webhooks and event-log writes of a resume run are handed to one
+        # background worker so the Playwright thread is not blocked on I/O.
+        self._io_queue: "queue.Queue[Tuple[Any, tuple, Dict[str, Any]]]" = queue.Queue(maxsize=self.IO_QUEUE_MAXSIZE)
+        self._io_thread: Optional[threading.Thread] = None
+        self._io_thread_lock = threading.Lock()
+        # One keep-alive client for all webhooks instead of a new connection per POST.
+        self._http: Optional[httpx.Client] = None
+        self._http_lock = threading.Lock()
+        self._storage_hashes: Dict[str, bytes] = {}
+        # Directories already created this process, so run setup and click-failure
+        # snapshots do not repeat mkdir syscalls.
+        self._created_dirs: set[Path] = set()
+        # HTML snapshot digests of the current run directory -> file holding that content.
+        self._html_hashes: Dict[bytes, str] = {}
+        self._html_hashes_dir = ""
+        # Overlays already dismissed in the current browser context, per origin.
+        self._dismissed_overlays: set[str] = set()
+        self._dismissed_overlays_origin = ""
         self.config_path = self.data_dir / "workday_agent_config.json"
         self.runtime_state_path = self.data_dir / "workday_runtime_state.json"
         self.runtime_events_path = self.data_dir / "workday_runtime_events.jsonl"
         self._events_retention_days = 30
         self._last_runtime_events_prune_day = ""
+        self._jitter_buf: list[float] = []
+        self._jitter_idx = 0
         self._settings = self._load_settings()
         self._runtime_state: Dict[str, Any] = self._load_runtime_state()
         self._debug("Service initialized", phase=self._runtime_state.get("phase", "before_start"))
@@ -114,14 +322,65 @@ class WorkdayAgentService:
             "job": meta.get("job"),
             "meta": meta,
         }
+        line = json.dumps(item, ensure_ascii=False, separators=(",", ":")) + "\n"
         try:
-            self.runtime_events_path.parent.mkdir(parents=True, exist_ok=True)
-            with self.runtime_events_path.open("a", encoding="utf-8") as fh:
-                fh.write(json.dumps(item, ensure_ascii=False) + "\n")
-            self._maybe_prune_runtime_events()
+            with self._events_lock:
+                os.write(self._runtime_events_fd(), line.encode("utf-8"))
+                self._maybe_prune_runtime_events()
         except Exception:
             self.logger.exception("Failed to store runtime event")
 
+    def _runtime_events_fd(self) -> int:
+        # Kept open in append mode so each event is a single write() call.
+        # Pruning rewrites the same inode, so the descriptor stays valid.
+        if self._events_fd is None:
+            self.runtime_events_path.parent.mkdir(parents=True, exist_ok=True)
+            self._events_fd = os.open(
+                str(self.runtime_events_path),
+                os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                0o644,
+            )
+            atexit.register(self._close_runtime_events_fd)
+        return self._events_fd
+
+    def _close_runtime_events_fd(self) -> None:
+        with self._events_lock:
+            if self._events_fd is None:
+                return
+            try:
+                os.close(self._events_fd)
+            except OSError:
+                pass
+            self._events_fd = None
+
+    def _enqueue_io(self, fn, *args: Any, **kwargs: Any) -> None:
+        with self._io_thread_lock:
+            if self._io_thread is None or not self._io_thread.is_alive():
+                self._io_thread = threading.Thread(
+                    target=self._io_worker,
+                    name=f"{AGENT_NAME}-io",
+                    daemon=True,
+                )
+                self._io_thread.start()
+        try:
+            # Producers (the Playwright thread) never wait on a slow webhook endpoint.
+            self._io_queue.put_nowait((fn, args, kwargs))
+        except queue.Full:
+            self.logger.error("Background I/O queue full; dropping task %s", getattr(fn, "__name__", fn))
+
+    def _io_worker(self) -> None:
+        while True:
+            fn, args, kwargs = self._io_queue.get()
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                self.logger.exception("Background I/O task failed")
+            finally:
+                self._io_queue.task_done()
+
+    def _drain_io_queue(self) -> None:
+        self._io_queue.join()
+
     @staticmethod
     def _safe_parse_iso_datetime(value: Any) -> Optional[datetime]:
         raw = str(value or "").strip()
@@ -143,10 +402,14 @@ class WorkdayAgentService:
             return ""
         if ts <= 0:
             return ""
-        tzinfo = datetime.now().astimezone().tzinfo
-        if tzinfo is None:
-            return datetime.fromtimestamp(ts).isoformat(timespec="seconds")
-        return datetime.fromtimestamp(ts, tz=tzinfo).isoformat(timespec="seconds")
+        # Same planned/executed timestamps are formatted many times per run.
+        return WorkdayAgentService._local_iso_seconds(int(ts))
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _local_iso_seconds(ts: int) -> str:
+        # The UTC offset is the one in force at ts, so cached text stays right across DST changes.
+        return datetime.fromtimestamp(ts).astimezone().isoformat(timespec="seconds")
 
     def _maybe_prune_runtime_events(self) -> None:
         today = date.today().isoformat()
@@ -315,10 +578,17 @@ class WorkdayAgentService:
         )
         return {key: state.get(key) for key in keys}
 
+    def _ensure_dir(self, path: Path) -> Path:
+        if path not in self._created_dirs:
+            path.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(path)
+        return path
+
     def _artifact_dir(self, job: str, run_id: str) -> Path:
-        d = self.data_dir / "runs" / job / run_id
-        d.mkdir(parents=True, exist_ok=True)
-        return d
+        return self._ensure_dir(self.data_dir / "runs" / job / run_id)
+
+    def _storage_state_path(self, job: str) -> Path:
+        return self._ensure_dir(self.data_dir / "storage") / f"{job}.json"
 
     @staticmethod
     def _normalize_iso_date(value: Any) -> str:
@@ -531,6 +801,23 @@ class WorkdayAgentService:
                 raise
             return playwright.chromium.launch(headless=headless)
 
+    @contextmanager
+    def _browser_session(self, run_id: str, job_name: str):
+        """Start Playwright and Chromium for one run and stop both when it ends.
+
+        Sync Playwright objects only work on the thread that started them and runs
+        arrive on short-lived threads, so nothing is kept between runs.
+        """
+        with sync_playwright() as playwright:
+            browser = self._launch_browser(playwright, run_id=run_id, job_name=job_name, headless=True)
+            try:
+                yield browser
+            finally:
+                try:
+                    browser.close()
+                except Exception:
+                    self.logger.exception("Error closing Playwright browser run_id=%s", run_id)
+
     @staticmethod
     def _safe_float(value: Any, default: float = 0.0) -> float:
         try:
@@ -540,6 +827,18 @@ class WorkdayAgentService:
         except Exception:
             return default
 
+    @classmethod
+    def _snapshot_plan(cls, state: Dict[str, Any]) -> RuntimePlan:
+        return RuntimePlan(
+            first_click_ts=cls._safe_float(state.get("first_click_ts")),
+            planned_first_ts=cls._safe_float(state.get("planned_first_ts")),
+            start_break_ts=cls._safe_float(state.get("start_break_ts")),
+            stop_break_ts=cls._safe_float(state.get("stop_break_ts")),
+            planned_start_break_ts=cls._safe_float(state.get("planned_start_break_ts")),
+            planned_stop_break_ts=cls._safe_float(state.get("planned_stop_break_ts")),
+            planned_final_ts=cls._safe_float(state.get("planned_final_ts")),
+        )
+
     def _build_planned_clicks(
         self,
         first_click_ts: float,
@@ -638,6 +937,17 @@ class WorkdayAgentService:
         mode = str(value or "").strip().lower()
         return mode if mode in {"normal", "reduced"} else ""
 
+    @classmethod
+    def _normalize_snapshot_level(cls, value: Any) -> str:
+        level = str(value or "").strip().lower()
+        return level if level in cls.SNAPSHOT_LEVELS else "all"
+
+    def _should_snapshot(self, *, error: bool = False) -> bool:
+        # "all": every step; "error_only": failure captures only; "none": nothing.
+        if self.snapshot_level == "all":
+            return True
+        return error and self.snapshot_level == "error_only"
+
     @classmethod
     def _final_click_delay_bounds_for_duration_mode(cls, mode: str) -> Tuple[int, int]:
         return cls._final_click_delay_bounds_for_mode(mode == "reduced")
@@ -923,18 +1233,139 @@ class WorkdayAgentService:
             "previous_run_id": previous_run_id,
         }
 
-    @staticmethod
-    def _sleep_until(target_ts: float):
-        remaining_log = None
+    def cancel_run(self, run_id: str) -> bool:
+        """Abort the planned waits of an active run; returns False if run_id is not running."""
+        cancel = self._cancel_events.get(str(run_id or "").strip())
+        if cancel is None:
+            return False
+        cancel.set()
+        self.logger.warning("Cancellation requested run_id=%s", run_id)
+        return True
+
+    def _sleep_until(self, target_ts: float, cancel: Optional[threading.Event] = None) -> None:
+        # Event.wait against a monotonic deadline: immune to wall-clock jumps, woken at once on cancel.
+        deadline = time.monotonic() + (float(target_ts) - time.time())
+        waiter = cancel or threading.Event()
         while True:
-            now = time.time()
-            remaining = target_ts - now
+            remaining = deadline - time.monotonic()
             if remaining <= 0:
                 return
-            remaining_int = int(remaining)
-            if remaining_log != remaining_int and remaining_int % 900 == 0:
-                remaining_log = remaining_int
-            time.sleep(min(remaining, 30))
+            if waiter.wait(min(remaining, self.SLEEP_LOG_INTERVAL_SECONDS)):
+                raise RuntimeError("Run cancelled while waiting")
+            if remaining > self.SLEEP_LOG_INTERVAL_SECONDS:
+                self._debug("Waiting for planned time", remaining_seconds=int(remaining - self.SLEEP_LOG_INTERVAL_SECONDS))
+
+    def _wait_for_planned_click(self, context, target_ts: float, cancel: Optional[threading.Event] = None) -> None:
+        if not self.fast_mode:
+            self._sleep_until(target_ts, cancel)
+            return
+        skipped_ms = int(max(0.0, float(target_ts) - time.time()) * 1000)
+        if skipped_ms > 0:
+            context.clock.fast_forward(skipped_ms)
+            self._debug("Fast mode skipped wait", skipped_ms=skipped_ms)
+
+    def _wait_backoff_steps(self) -> Iterator[float]:
+        steps = self.WAIT_BACKOFF_STEPS_SECONDS
+        return chain(steps, repeat(steps[-1]))
+
+    def _wait_until_or_selector(
+        self,
+        page,
+        deadline_ts: float,
+        selector: Optional[str] = None,
+        cancel: Optional[threading.Event] = None,
+        backoff: Optional[Iterator[float]] = None,
+    ) -> bool:
+        """Wait until deadline_ts; return True early if selector shows up on the open page.
+
+        Pass the same backoff iterator across calls to keep the probe interval
+        growing after a detection the caller could not confirm.
+        """
+        deadline = time.monotonic() + max(0.0, float(deadline_ts) - time.time())
+        steps = backoff if backoff is not None else self._wait_backoff_steps()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            step = next(steps)
+            if cancel is None:
+                time.sleep(min(step, remaining))
+            elif cancel.wait(min(step, remaining)):
+                raise RuntimeError("Run cancelled while waiting")
+            if not selector or page is None:
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                # Nothing to observe until the target page has been opened once.
+                if str(page.url or "about:blank") == "about:blank":
+                    continue
+                timeout_ms = int(min(self.WAIT_SELECTOR_PROBE_TIMEOUT_MS, remaining * 1000))
+                if page.evaluate(self.SELECTOR_OBSERVER_JS, [selector, timeout_ms]):
+                    self._debug("Selector detected before planned time", selector=selector)
+                    return True
+            except Exception as err:
+                self._debug("Selector probe failed during wait", selector=selector, error=str(err))
+
+    def _http_client(self) -> "httpx.Client":
+        with self._http_lock:
+            if self._http is None:
+                self._http = httpx.Client(
+                    timeout=15,
+                    limits=httpx.Limits(max_keepalive_connections=4, max_connections=8),
+                    headers={"content-type": "application/json"},
+                )
+                atexit.register(self._close_http_client)
+            return self._http
+
+    def _close_http_client(self) -> None:
+        with self._http_lock:
+            if self._http is None:
+                return
+            try:
+                self._http.close()
+            except Exception:
+                pass
+            self._http = None
+
+    def shutdown(self) -> None:
+        """Flush queued webhooks, then close the pooled HTTP client (app shutdown hook)."""
+        self._drain_io_queue()
+        self._close_http_client()
+
+    @staticmethod
+    def _storage_state_blob(state: Any) -> bytes:
+        # Sorted keys make the blob (and its hash) stable for an unchanged state.
+        if orjson is not None:
+            return orjson.dumps(state, option=orjson.OPT_SORT_KEYS)
+        return json.dumps(state, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+    def _persist_storage_state(self, context, storage_path: Path) -> bool:
+        """Write the context storage_state only when it differs from the persisted one."""
+        key = str(storage_path)
+        if key not in self._storage_hashes and storage_path.exists():
+            try:
+                on_disk = self._storage_state_blob(json.loads(storage_path.read_text(encoding="utf-8")))
+                self._storage_hashes[key] = hashlib.blake2b(on_disk, digest_size=16).digest()
+            except Exception:
+                pass
+        blob = self._storage_state_blob(context.storage_state())
+        digest = hashlib.blake2b(blob, digest_size=16).digest()
+        if self._storage_hashes.get(key) == digest:
+            return False
+        temporary_path = storage_path.with_name(f".{storage_path.name}.tmp")
+        temporary_path.write_bytes(blob)
+        temporary_path.replace(storage_path)
+        self._storage_hashes[key] = digest
+        return True
+
+    @staticmethod
+    def _webhook_body(payload: Dict[str, Any]) -> bytes:
+        # orjson (C encoder, bytes out) when installed; same compact UTF-8 JSON otherwise.
+        if orjson is not None:
+            return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
     def _post_webhook(self, url: str, payload: Dict[str, Any]):
         if not url:
@@ -943,7 +1374,7 @@ class WorkdayAgentService:
         sanitized_url = self._sanitize_url_for_log(url)
         self._debug("Sending webhook", url=sanitized_url)
         try:
-            httpx.post(url, json=payload, timeout=15)
+            self._http_client().post(url, content=self._webhook_body(payload))
             self._debug("Webhook sent", url=sanitized_url)
         except Exception:
             self.logger.exception("Webhook send failed")
@@ -955,20 +1386,11 @@ class WorkdayAgentService:
         step: str,
         message: str,
         ok: bool = True,
-        extra: Optional[Dict[str, Any]] = None,
     ):
-        payload = {
-            "ok": ok,
-            "job": job_name,
-            "run_id": run_id,
-            "step": step,
-            "message": message,
-            "ts": datetime.now().isoformat(),
-            "meta": extra or {},
-        }
+        # Step-by-step details stay in logs; webhooks are sent per event, so no
+        # payload (or timestamp) is built here.
         log_fn = self.logger.info if ok else self.logger.error
         log_fn("[%s:%s] %s - %s", job_name, run_id, step, message)
-        # Step-by-step details stay in logs; webhooks are sent per event.
 
     def send_final(self, job_name: str, run_id: str, result: Dict[str, Any]):
         meta = dict(result or {})
@@ -1018,19 +1440,20 @@ class WorkdayAgentService:
         click_name: str,
         ok: bool,
         meta: Optional[Dict[str, Any]] = None,
+        phase: Optional[str] = None,
     ) -> None:
         payload = {
             "ok": ok,
             "event": f"workday_{click_name}",
             "job": job_name,
             "run_id": run_id,
-            "ts": datetime.now().isoformat(),
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
             "meta": meta or {},
         }
         self._post_webhook(url, payload)
         self._append_runtime_event(
             "click_webhook_sent",
-            phase=self._get_runtime_state().get("phase"),
+            phase=phase if phase is not None else self._get_runtime_state().get("phase"),
             run_id=run_id,
             job=job_name,
             ok=ok,
@@ -1145,27 +1568,108 @@ class WorkdayAgentService:
         return state
 
     @staticmethod
-    def _today_at(hour: int, minute: int, second: int = 0) -> datetime:
-        now = datetime.now()
+    def _today_at(hour: int, minute: int, second: int = 0, now: Optional[datetime] = None) -> datetime:
+        now = now or datetime.now()
         return now.replace(hour=hour, minute=minute, second=second, microsecond=0)
 
     def _first_click_window(self):
-        configured_start = self._today_at(6, 58)
+        now = datetime.now()
+        configured_start = self._today_at(6, 58, now=now)
         first_start = max(
             configured_start,
             self._minimum_first_click_dt_for_final_day(configured_start),
         )
-        first_end = self._today_at(8, 31)
-        rescue_end = self._today_at(9, 30)
+        first_end = self._today_at(8, 31, now=now)
+        rescue_end = self._today_at(9, 30, now=now)
         return first_start, first_end, rescue_end
 
-    @staticmethod
-    def _human_pause(min_ms: int = 120, max_ms: int = 320) -> None:
+    def _jitter_rand(self) -> float:
+        # Humanized-click jitter reads from a pre-sampled buffer that is refilled
+        # when it wraps, instead of one RNG call per pause/mouse offset.
+        idx = self._jitter_idx
+        if idx == 0:
+            self._jitter_buf = [random.random() for _ in range(self.JITTER_BUFFER_SIZE)]
+        self._jitter_idx = (idx + 1) % self.JITTER_BUFFER_SIZE
+        return self._jitter_buf[idx]
+
+    def _jitter_uniform(self, low: float, high: float) -> float:
+        return low + (high - low) * self._jitter_rand()
+
+    def _jitter_randint(self, low: int, high: int) -> int:
+        return low + int(self._jitter_rand() * (high - low + 1))
+
+    def _human_pause(self, min_ms: int = 120, max_ms: int = 320) -> None:
         if max_ms < min_ms:
             max_ms = min_ms
-        time.sleep(random.uniform(min_ms, max_ms) / 1000.0)
+        time.sleep(self._jitter_uniform(min_ms, max_ms) / 1000.0)
+
+    @classmethod
+    def _screenshot_kwargs(cls, page, *, bounded_full_page: bool = False) -> Dict[str, Any]:
+        # Viewport-only JPEG keeps snapshots small; full-page captures of long SPA
+        # pages are huge and often time out.
+        kwargs: Dict[str, Any] = {
+            "type": "jpeg",
+            "quality": cls.SCREENSHOT_JPEG_QUALITY,
+            "full_page": False,
+        }
+        if bounded_full_page:
+            viewport = page.viewport_size or {}
+            width = int(viewport.get("width") or cls.SCREENSHOT_CLIP_WIDTH)
+            scroll_height = int(page.evaluate("document.body ? document.body.scrollHeight : 0") or 0)
+            height = min(cls.SCREENSHOT_MAX_CLIP_HEIGHT, max(1, scroll_height))
+            kwargs["full_page"] = True
+            kwargs["clip"] = {"x": 0, "y": 0, "width": width, "height": height}
+        return kwargs
+
+    @classmethod
+    def _save_screenshot(cls, page, path: Path, *, bounded_full_page: bool = False) -> None:
+        page.screenshot(path=str(path), **cls._screenshot_kwargs(page, bounded_full_page=bounded_full_page))
+
+    def _save_screenshot_in_background(self, page, path: Path, *, bounded_full_page: bool = False) -> None:
+        # Playwright calls stay on this thread; only the disk write is deferred.
+        kwargs = self._screenshot_kwargs(page, bounded_full_page=bounded_full_page)
+        self._enqueue_io(path.write_bytes, page.screenshot(**kwargs))
+
+    @staticmethod
+    def _write_gzip(path: Path, data: bytes) -> None:
+        path.write_bytes(gzip.compress(data, compresslevel=1))
+
+    def _save_html_snapshot(self, page, path: Path, *, background: bool = False) -> None:
+        """Write {tag}.html.gz, or {tag}.html.ref naming the earlier dump with identical HTML."""
+        if not self.debug_html_snapshots:
+            return
+        html_bytes = str(page.evaluate(self.HTML_SNAPSHOT_JS) or "").encode("utf-8", "replace")
+        run_dir = str(path.parent)
+        if run_dir != self._html_hashes_dir:
+            self._html_hashes = {}
+            self._html_hashes_dir = run_dir
+        digest = hashlib.blake2b(html_bytes, digest_size=8).digest()
+        previous = self._html_hashes.get(digest)
+        if previous:
+            write, target, data = Path.write_text, path.with_name(f"{path.name}.ref"), previous
+        else:
+            target = path.with_name(f"{path.name}.gz")
+            self._html_hashes[digest] = target.name
+            write, data = self._write_gzip, html_bytes
+        if background:
+            self._enqueue_io(write, target, data)
+            return
+        write(target, data)
+
+    def _save_html_excerpt(self, page, path: Path, *, background: bool = False) -> None:
+        # Click failures only need the app region plus page context, not a full
+        # page.content() dump.
+        context, snippet = page.evaluate(self.HTML_EXCERPT_JS, self.HTML_EXCERPT_MAX_CHARS)
+        body = f"<!-- {context} -->\n{str(snippet)[: self.HTML_EXCERPT_MAX_CHARS]}"
+        data = body.encode("utf-8", "replace")
+        if background:
+            self._enqueue_io(path.write_bytes, data)
+            return
+        path.write_bytes(data)
 
     def _capture_click_failure_snapshot(self, page, context_label: str) -> None:
+        if not self._should_snapshot(error=True):
+            return
         try:
             state = self._get_runtime_state()
             run_id = str(state.get("run_id", "")).strip() or f"manual-{self.now_id()}"
@@ -1174,14 +1678,21 @@ class WorkdayAgentService:
             safe_label = "".join(ch if (ch.isalnum() or ch in {"-", "_"}) else "_" for ch in str(context_label or "click"))
             safe_label = safe_label.strip("_") or "click"
             ts = self.now_id()
-            png_path = run_dir / f"click_failed_{safe_label}_{ts}.png"
-            html_path = run_dir / f"click_failed_{safe_label}_{ts}.html"
-            page.screenshot(path=str(png_path), full_page=True)
-            html_path.write_text(page.content(), encoding="utf-8")
-            self.logger.warning("Click failure snapshot saved: %s", png_path)
+            image_path = run_dir / f"click_failed_{safe_label}_{ts}.jpg"
+            # The click is retried right after this, so only the capture stays on the Playwright thread.
+            self._save_screenshot_in_background(page, image_path)
+            self._save_html_excerpt(page, run_dir / f"click_failed_{safe_label}_{ts}.html", background=True)
+            self.logger.warning("Click failure snapshot queued: %s", image_path)
         except Exception:
             self.logger.exception("Could not save click failure snapshot")
 
+    @classmethod
+    def _is_in_viewport(cls, locator) -> bool:
+        try:
+            return bool(locator.evaluate(cls.IN_VIEWPORT_JS))
+        except Exception:
+            return False
+
     @staticmethod
     def _pick_largest_visible_locator(page, selector: str, timeout_ms: int = 15_000):
         page.wait_for_selector(selector, timeout=timeout_ms)
@@ -1225,32 +1736,45 @@ class WorkdayAgentService:
                 continue
         return False
 
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _icon_selector(icon_label: str) -> str:
+        return WorkdayAgentService.ICON_SELECTOR_TMPL.format(icon_label)
+
     def _is_icon_visible(self, page, icon_label: str, timeout_ms: int = 0) -> bool:
-        selector = f"button:has(svg[aria-label='{icon_label}'])"
+        selector = self._icon_selector(icon_label)
         return self._is_selector_visible(page, selector, timeout_ms=timeout_ms)
 
+    def _probe_icons(self, page, labels: Tuple[str, ...], timeout_ms: int = 0) -> Dict[str, bool]:
+        try:
+            result = page.evaluate(self.PROBE_ICONS_JS, [list(labels), timeout_ms])
+            return {label: bool(result.get(label)) for label in labels}
+        except Exception:
+            return {label: self._is_icon_visible(page, label, timeout_ms=timeout_ms) for label in labels}
+
     def _humanized_click(self, page, selector: str, timeout_ms: int = 15_000, context_label: str = "click") -> None:
         try:
-            page.wait_for_selector(selector, timeout=timeout_ms)
+            # _pick_largest_visible_locator already waits for the selector.
             locator = self._pick_largest_visible_locator(page, selector, timeout_ms=timeout_ms)
-            try:
-                locator.scroll_into_view_if_needed(timeout=timeout_ms)
-            except Exception:
-                pass
+            if not self._is_in_viewport(locator):
+                try:
+                    locator.scroll_into_view_if_needed(timeout=timeout_ms)
+                except Exception:
+                    pass
             try:
                 box = locator.bounding_box()
                 if box:
                     cx = float(box["x"]) + (float(box["width"]) / 2.0)
                     cy = float(box["y"]) + (float(box["height"]) / 2.0)
                     page.mouse.move(
-                        cx + random.uniform(-36.0, 36.0),
-                        cy + random.uniform(-18.0, 18.0),
-                        steps=random.randint(6, 14),
+                        cx + self._jitter_uniform(-36.0, 36.0),
+                        cy + self._jitter_uniform(-18.0, 18.0),
+                        steps=self._jitter_randint(6, 14),
                     )
                     page.mouse.move(
-                        cx + random.uniform(-2.0, 2.0),
-                        cy + random.uniform(-2.0, 2.0),
-                        steps=random.randint(8, 20),
+                        cx + self._jitter_uniform(-2.0, 2.0),
+                        cy + self._jitter_uniform(-2.0, 2.0),
+                        steps=self._jitter_randint(8, 20),
                     )
             except Exception:
                 pass
@@ -1259,7 +1783,7 @@ class WorkdayAgentService:
             except Exception:
                 pass
             self._human_pause(120, 420)
-            locator.click(timeout=timeout_ms, delay=random.randint(70, 220))
+            locator.click(timeout=timeout_ms, delay=self._jitter_randint(70, 220))
             self._human_pause(80, 220)
             return
         except Exception as human_err:
@@ -1269,7 +1793,7 @@ class WorkdayAgentService:
                 human_err,
             )
             try:
-                page.wait_for_selector(selector, timeout=timeout_ms)
+                # page.click auto-waits for the target to be actionable.
                 page.click(selector, timeout=timeout_ms)
                 self._human_pause(40, 120)
                 return
@@ -1280,9 +1804,34 @@ class WorkdayAgentService:
                 ) from direct_err
 
     def _click_icon_button(self, page, icon_label: str, timeout_ms: int = 15_000):
-        selector = f"button:has(svg[aria-label='{icon_label}'])"
+        selector = self._icon_selector(icon_label)
         self._humanized_click(page, selector, timeout_ms=timeout_ms, context_label=f"icon_{icon_label}")
 
+    def _wait_for_workday_icons(self, page) -> None:
+        # Navigations only wait for commit; the toolbar icons are what the flow needs,
+        # and the SPA keeps loading unrelated resources long after they render.
+        try:
+            if page.evaluate(self.SELECTOR_OBSERVER_JS, [self.WORKDAY_ICONS_SELECTOR, self.WORKDAY_ICONS_TIMEOUT_MS]):
+                return
+        except Exception:
+            pass
+        page.wait_for_load_state("domcontentloaded", timeout=60_000)
+
+    def _reload_target(self, page) -> None:
+        page.reload(wait_until="commit", timeout=60_000)
+        self._wait_for_workday_icons(page)
+
+    def _ensure_icon_ready(self, page, icon_label: str, timeout_ms: int = 10_000) -> None:
+        # The SPA usually keeps the toolbar alive between clicks; only reload
+        # (and re-dismiss banners) when the icon is no longer visible.
+        try:
+            page.wait_for_selector(self._icon_selector(icon_label), state="visible", timeout=timeout_ms)
+            return
+        except Exception:
+            self.logger.info("Icon %s not ready; reloading target page", icon_label)
+        self._reload_target(page)
+        self._dismiss_overlays(page)
+
     def _click_and_confirm_transition(
         self,
         page,
@@ -1291,8 +1840,8 @@ class WorkdayAgentService:
         action_label: str,
         timeout_ms: int = 15_000,
     ) -> None:
-        click_selector = f"button:has(svg[aria-label='{click_icon_label}'])"
-        expected_selector = f"button:has(svg[aria-label='{expected_icon_label}'])"
+        click_selector = self._icon_selector(click_icon_label)
+        expected_selector = self._icon_selector(expected_icon_label)
 
         def reload_for_retry(reason: str) -> None:
             self.logger.warning(
@@ -1301,9 +1850,8 @@ class WorkdayAgentService:
                 reason,
             )
             try:
-                page.reload(wait_until="domcontentloaded", timeout=60_000)
-                self._dismiss_cookie_popup(page)
-                self._dismiss_location_prompt(page)
+                self._reload_target(page)
+                self._dismiss_overlays(page)
             except Exception:
                 self.logger.exception("Failed to reload page during transition retry (%s)", action_label)
 
@@ -1350,14 +1898,20 @@ class WorkdayAgentService:
     def _confirm_end_of_day_modal(self, page, timeout_ms: int = 15_000) -> None:
         # Some interfaces show an additional modal after clicking "Icon-stop".
         # End-of-day is only considered valid after confirming that modal.
-        time.sleep(2)
-        modal_selector = "button:has-text('Sí, he terminado')"
-        fallback_selector = "button:has-text('Si, he terminado')"
+        # Wait for either button to be visible instead of a fixed pause.
+        try:
+            page.wait_for_selector(
+                f"{self.END_OF_DAY_MODAL_PRIMARY_SELECTOR}, {self.END_OF_DAY_MODAL_FALLBACK_SELECTOR}",
+                state="visible",
+                timeout=self.END_OF_DAY_MODAL_APPEAR_TIMEOUT_MS,
+            )
+        except Exception:
+            pass
         try:
-            self._humanized_click(page, modal_selector, timeout_ms=timeout_ms, context_label="end_of_day_modal_primary")
+            self._humanized_click(page, self.END_OF_DAY_MODAL_PRIMARY_SELECTOR, timeout_ms=timeout_ms, context_label="end_of_day_modal_primary")
         except Exception:
             try:
-                self._humanized_click(page, fallback_selector, timeout_ms=timeout_ms, context_label="end_of_day_modal_fallback")
+                self._humanized_click(page, self.END_OF_DAY_MODAL_FALLBACK_SELECTOR, timeout_ms=timeout_ms, context_label="end_of_day_modal_fallback")
             except Exception as exc:
                 raise RuntimeError(
                     "Could not confirm end of day: button 'Sí, he terminado' did not appear"
@@ -1367,35 +1921,97 @@ class WorkdayAgentService:
         self._click_icon_button(page, "Icon-stop", timeout_ms=timeout_ms)
         self._confirm_end_of_day_modal(page, timeout_ms=timeout_ms)
         try:
-            page.wait_for_selector("button:has(svg[aria-label='Icon-play'])", timeout=timeout_ms)
+            page.wait_for_selector(self._icon_selector("Icon-play"), timeout=timeout_ms)
         except Exception as exc:
             raise RuntimeError(
                 "Could not confirm end of day: Icon-play did not appear after modal confirmation"
             ) from exc
 
-    def _dismiss_cookie_popup(self, page):
+    def _click_first_dismiss_match(
+        self,
+        page,
+        *,
+        selectors: Tuple[str, ...] = (),
+        button_texts: Tuple[str, ...] = (),
+        timeout_ms: int = 0,
+    ) -> Optional[str]:
+        # One round trip: every candidate is checked client-side and the first
+        # visible match is clicked, instead of one Playwright click timeout per selector.
         try:
-            page.locator("#onetrust-reject-all-handler").first.click(timeout=5_000)
-            self.logger.info("Consent banner dismissed")
-            return True
+            matched = page.evaluate(
+                self.DISMISS_FIRST_MATCH_JS,
+                [list(selectors), list(button_texts), int(timeout_ms)],
+            )
         except Exception:
+            return None
+        return str(matched) if matched else None
+
+    def _dismiss_cookie_popup(self, page):
+        matched = self._click_first_dismiss_match(
+            page,
+            selectors=self.COOKIE_REJECT_SELECTORS,
+            timeout_ms=self.COOKIE_DISMISS_TIMEOUT_MS,
+        )
+        if not matched:
             return False
+        self.logger.info("Consent banner dismissed")
+        return True
 
     def _dismiss_location_prompt(self, page):
-        candidates = [
-            "button:has-text('Deny')",
-            "button:has-text('Block')",
-            "button:has-text('No permitir')",
-            "button:has-text('Rechazar')",
-        ]
-        for sel in candidates:
-            try:
-                page.locator(sel).first.click(timeout=1_500)
-                self.logger.info("Geolocation modal dismissed with selector: %s", sel)
-                return True
-            except Exception:
+        matched = self._click_first_dismiss_match(
+            page,
+            button_texts=self.LOCATION_DENY_BUTTON_TEXTS,
+            timeout_ms=self.LOCATION_DISMISS_TIMEOUT_MS,
+        )
+        if not matched:
+            return False
+        self.logger.info("Geolocation modal dismissed with button text: %s", matched)
+        return True
+
+    def _reset_dismissed_overlays(self) -> None:
+        self._dismissed_overlays = set()
+        self._dismissed_overlays_origin = ""
+
+    def _dismiss_overlays(self, page) -> None:
+        # The cookie banner and the location prompt are awaited in parallel, so a
+        # page showing neither costs one dismiss timeout instead of two. Once one is
+        # dismissed it does not come back in the same context and origin.
+        try:
+            origin = urlsplit(str(page.url or "")).netloc
+        except Exception:
+            origin = ""
+        if origin != self._dismissed_overlays_origin:
+            self._dismissed_overlays = set()
+            self._dismissed_overlays_origin = origin
+        candidates = self.DISMISS_OVERLAY_GROUPS
+        pending = [name for name in candidates if name not in self._dismissed_overlays]
+        if not pending:
+            return
+        try:
+            matches = page.evaluate(self.DISMISS_OVERLAYS_JS, [candidates[name] for name in pending])
+        except Exception:
+            return
+        for name, matched in zip(pending, matches):
+            if not matched:
                 continue
-        return False
+            self._dismissed_overlays.add(name)
+            if name == "cookies":
+                self.logger.info("Consent banner dismissed")
+            else:
+                self.logger.info("Geolocation modal dismissed with button text: %s", matched)
+
+    def _can_reuse_target_page(self, page, loaded_at: float) -> bool:
+        # Contiguous phases can keep the page that was just loaded; after a
+        # long wait the page is reloaded so the UI state is fresh.
+        if loaded_at <= 0 or time.monotonic() - loaded_at > self.TARGET_PAGE_REUSE_MAX_AGE_SECONDS:
+            return False
+        try:
+            if page.is_closed():
+                return False
+            current_url = str(page.url or "").rstrip("/")
+        except Exception:
+            return False
+        return bool(current_url) and current_url == self.target_url.rstrip("/")
 
     def resume_pending_flow(self) -> Dict[str, Any]:
         """Resume an active run using persisted state."""
@@ -1409,11 +2025,11 @@ class WorkdayAgentService:
 
         if not self._run_lock.acquire(blocking=False):
             return {"ok": False, "resumed": False, "phase": phase, "reason": "busy"}
+        cancel = self._cancel_events[run_id] = threading.Event()
 
         self._debug("Resuming persisted flow", phase=phase, run_id=run_id, job_name=job_name)
         run_dir = self._artifact_dir(job_name, run_id)
-        storage_path = self.data_dir / "storage" / f"{job_name}.json"
-        storage_path.parent.mkdir(parents=True, exist_ok=True)
+        storage_path = self._storage_state_path(job_name)
         self._append_runtime_event(
             "resume_start",
             phase=phase,
@@ -1425,16 +2041,17 @@ class WorkdayAgentService:
         minimum_first_ts = first_start_dt.timestamp()
         start_deadline_ts = rescue_end_dt.timestamp()
 
-        browser = None
+        browser_session = ExitStack()
         context = None
         page = None
 
         try:
             now_ts = time.time()
-            first_click_ts = self._safe_float(state.get("first_click_ts"))
-            planned_first_ts = self._safe_float(state.get("planned_first_ts"))
-            start_break_ts = self._safe_float(state.get("start_break_ts"))
-            stop_break_ts = self._safe_float(state.get("stop_break_ts"))
+            plan = self._snapshot_plan(state)
+            first_click_ts = plan.first_click_ts
+            planned_first_ts = plan.planned_first_ts
+            start_break_ts = plan.start_break_ts
+            stop_break_ts = plan.stop_break_ts
 
             anchor_ts = first_click_ts if first_click_ts > 0 else planned_first_ts
             if anchor_ts > 0 and not self._same_local_day(anchor_ts, now_ts):
@@ -1466,299 +2083,387 @@ class WorkdayAgentService:
                 if now_ts > start_deadline_ts + 300:
                     raise RuntimeError("Start window expired; automatic resume is disabled")
 
-            with sync_playwright() as p:
-                browser = self._launch_browser(p, run_id=run_id, job_name=job_name, headless=True)
-                context_kwargs: Dict[str, Any] = {}
-                if storage_path.exists():
-                    context_kwargs["storage_state"] = str(storage_path)
-                    self.logger.info("Resume: reusing storage_state from %s", storage_path)
-
-                context = browser.new_context(**context_kwargs)
-                page = context.new_page()
-
-                def snap(tag: str):
-                    page.screenshot(path=str(run_dir / f"{tag}.png"), full_page=True)
-                    (run_dir / f"{tag}.html").write_text(page.content(), encoding="utf-8")
-                    self.logger.info("Snapshot saved: %s", tag)
-
-                def open_target():
-                    if not self.target_url:
-                        raise RuntimeError("Missing target_url in configuration")
-                    page.goto(self.target_url, wait_until="domcontentloaded", timeout=60_000)
+            browser = browser_session.enter_context(self._browser_session(run_id=run_id, job_name=job_name))
+            context_kwargs: Dict[str, Any] = {}
+            if storage_path.exists():
+                context_kwargs["storage_state"] = str(storage_path)
+                self.logger.info("Resume: reusing storage_state from %s", storage_path)
+
+            context = browser.new_context(**context_kwargs)
+            page = context.new_page()
+            self._reset_dismissed_overlays()
+
+            def snap_image_only(tag: str):
+                if not self._should_snapshot():
+                    return
+                self._save_screenshot_in_background(page, run_dir / f"{tag}.jpg")
+                self.logger.info("Snapshot queued: %s", tag)
+
+            def snap(tag: str):
+                if not self._should_snapshot():
+                    return
+                self._save_screenshot_in_background(page, run_dir / f"{tag}.jpg")
+                self._save_html_snapshot(page, run_dir / f"{tag}.html", background=True)
+                self.logger.info("Snapshot queued: %s", tag)
+
+            target_loaded_at = 0.0
+
+            def open_target():
+                nonlocal target_loaded_at
+                if not self.target_url:
+                    raise RuntimeError("Missing target_url in configuration")
+                if self._can_reuse_target_page(page, target_loaded_at):
+                    self._debug("Target page reused", url=self._sanitize_url_for_log(page.url))
+                else:
+                    page.goto(self.target_url, wait_until="commit", timeout=60_000)
+                    self._wait_for_workday_icons(page)
+                    target_loaded_at = time.monotonic()
                     self._debug("Target page opened", url=self._sanitize_url_for_log(page.url))
-                    self._dismiss_cookie_popup(page)
-                    self._dismiss_location_prompt(page)
+                self._dismiss_overlays(page)
 
-                if phase == "waiting_start":
-                    self._sleep_until(planned_first_ts)
-                    if time.time() > start_deadline_ts + 300:
-                        raise RuntimeError("Resume is outside the start window")
-                    open_target()
-                    context.storage_state(path=str(storage_path))
+            if phase == "waiting_start":
+                self._sleep_until(planned_first_ts, cancel)
+                if time.time() > start_deadline_ts + 300:
+                    raise RuntimeError("Resume is outside the start window")
+                open_target()
+                if self._persist_storage_state(context, storage_path):
                     self.logger.info("Resume: storage_state updated at %s", storage_path)
-                    self._click_and_confirm_transition(page, "Icon-play", "Icon-pause", "start of workday")
-                    first_click_ts = time.time()
-                    executed_at = datetime.now().isoformat()
-                    self.send_status(job_name, run_id, "first_click", "Resume: clicked start (Icon-play)")
-                    self.send_click_webhook(
-                        self.webhook_start_url,
-                        job_name=job_name,
-                        run_id=run_id,
-                        click_name="start_click",
-                        ok=True,
-                        meta={"executed_at": executed_at, "recovered": True},
-                    )
-                    snap("recovered_first_click")
-                    plans = self._build_planned_clicks(
-                        first_click_ts=first_click_ts,
-                        planned_start_break_ts=self._safe_float(state.get("planned_start_break_ts")),
-                        planned_stop_break_ts=self._safe_float(state.get("planned_stop_break_ts")),
-                        planned_final_ts=self._safe_float(state.get("planned_final_ts")),
-                        **self._planned_duration_kwargs_from_state(state),
-                    )
-                    self._set_runtime_state(
-                        "working_before_break",
-                        "Workday started (resumed)",
-                        run_id=run_id,
-                        job=job_name,
-                        ok=None,
-                        first_click_ts=first_click_ts,
-                        planned_start_break_ts=plans["planned_start_break_ts"],
-                        planned_stop_break_ts=plans["planned_stop_break_ts"],
-                        planned_final_ts=plans["planned_final_ts"],
-                        **self._planned_runtime_fields(plans),
-                    )
-                    phase = "working_before_break"
+                self._click_and_confirm_transition(page, "Icon-play", "Icon-pause", "start of workday")
+                now_dt = datetime.now()
+                first_click_ts = now_dt.timestamp()
+                executed_at = now_dt.isoformat()
+                self._enqueue_io(self.send_status, job_name, run_id, "first_click", "Resume: clicked start (Icon-play)")
+                self._enqueue_io(
+                    self.send_click_webhook,
+                    self.webhook_start_url,
+                    phase=phase,
+                    job_name=job_name,
+                    run_id=run_id,
+                    click_name="start_click",
+                    ok=True,
+                    meta={"executed_at": executed_at, "recovered": True},
+                )
+                snap_image_only("recovered_first_click")
+                plans = self._build_planned_clicks(
+                    first_click_ts=first_click_ts,
+                    planned_start_break_ts=plan.planned_start_break_ts,
+                    planned_stop_break_ts=plan.planned_stop_break_ts,
+                    planned_final_ts=plan.planned_final_ts,
+                    **self._planned_duration_kwargs_from_state(state),
+                )
+                self._set_runtime_state(
+                    "working_before_break",
+                    "Workday started (resumed)",
+                    run_id=run_id,
+                    job=job_name,
+                    ok=None,
+                    first_click_ts=first_click_ts,
+                    planned_start_break_ts=plans["planned_start_break_ts"],
+                    planned_stop_break_ts=plans["planned_stop_break_ts"],
+                    planned_final_ts=plans["planned_final_ts"],
+                    **self._planned_runtime_fields(plans),
+                )
+                phase = "working_before_break"
 
-                if phase == "working_before_break":
-                    if first_click_ts <= 0:
-                        raise RuntimeError("Missing first_click_ts to resume break start")
-                    latest_state = self._get_runtime_state()
-                    plans = self._build_planned_clicks(
-                        first_click_ts=first_click_ts,
-                        planned_start_break_ts=self._safe_float(latest_state.get("planned_start_break_ts")),
-                        planned_stop_break_ts=self._safe_float(latest_state.get("planned_stop_break_ts")),
-                        planned_final_ts=self._safe_float(latest_state.get("planned_final_ts")),
-                        **self._planned_duration_kwargs_from_state(latest_state),
+            if phase == "working_before_break":
+                if first_click_ts <= 0:
+                    raise RuntimeError("Missing first_click_ts to resume break start")
+                latest_state = self._get_runtime_state()
+                plan = self._snapshot_plan(latest_state)
+                plans = self._build_planned_clicks(
+                    first_click_ts=first_click_ts,
+                    planned_start_break_ts=plan.planned_start_break_ts,
+                    planned_stop_break_ts=plan.planned_stop_break_ts,
+                    planned_final_ts=plan.planned_final_ts,
+                    **self._planned_duration_kwargs_from_state(latest_state),
+                )
+                second_click_ts = plans["planned_start_break_ts"]
+                # A manual break (Icon-play) ends the wait early so it is reconciled right away.
+                backoff = self._wait_backoff_steps()
+                while True:
+                    manual_break_seen = self._wait_until_or_selector(
+                        page,
+                        second_click_ts,
+                        self._icon_selector("Icon-play"),
+                        cancel=cancel,
+                        backoff=backoff,
                     )
-                    second_click_ts = plans["planned_start_break_ts"]
-                    self._sleep_until(second_click_ts)
                     open_target()
-                    if self._is_icon_visible(page, "Icon-play", timeout_ms=2_000):
-                        inferred_start_break_ts = self._infer_click_ts_from_events(
-                            run_id=run_id,
-                            click_name="start_break_click",
-                        )
-                        if inferred_start_break_ts <= 0:
-                            self._set_runtime_state(
-                                "on_break",
-                                "On break detected from UI (manual state, unknown remaining time)",
-                                run_id=run_id,
-                                job=job_name,
-                                ok=None,
-                                first_click_ts=first_click_ts,
-                                planned_start_break_ts=plans["planned_start_break_ts"],
-                                planned_stop_break_ts=0.0,
-                                planned_final_ts=plans["planned_final_ts"],
-                                **self._planned_runtime_fields(plans),
-                                manual_state_detected=True,
-                            )
-                            self._append_runtime_event(
-                                "manual_state_detected",
-                                phase="on_break",
-                                run_id=run_id,
-                                job=job_name,
-                                reason="break_start_detected_without_timestamp",
-                            )
-                            self.logger.info(
-                                "Manual break detected without timing reference run_id=%s",
-                                run_id,
-                            )
-                            snap("recovered_manual_on_break")
-                            return {
-                                "ok": True,
-                                "resumed": False,
-                                "phase": "on_break",
-                                "run_id": run_id,
-                                "reason": "manual_break_unknown_timing",
-                            }
-                        start_break_ts = inferred_start_break_ts
+                    probes = self._probe_icons(page, ("Icon-play", "Icon-pause"), timeout_ms=2_000)
+                    if not manual_break_seen or probes["Icon-play"]:
+                        break
+                if probes["Icon-play"]:
+                    self._drain_io_queue()
+                    inferred_start_break_ts = self._infer_click_ts_from_events(
+                        run_id=run_id,
+                        click_name="start_break_click",
+                    )
+                    if inferred_start_break_ts <= 0:
                         self._set_runtime_state(
                             "on_break",
-                            "On break detected from UI (manual state)",
+                            "On break detected from UI (manual state, unknown remaining time)",
                             run_id=run_id,
                             job=job_name,
                             ok=None,
                             first_click_ts=first_click_ts,
-                            start_break_ts=start_break_ts,
                             planned_start_break_ts=plans["planned_start_break_ts"],
-                            planned_stop_break_ts=plans["planned_stop_break_ts"],
+                            planned_stop_break_ts=0.0,
                             planned_final_ts=plans["planned_final_ts"],
                             **self._planned_runtime_fields(plans),
                             manual_state_detected=True,
                         )
-                        phase = "on_break"
-                        self._append_runtime_event(
+                        self._enqueue_io(
+                            self._append_runtime_event,
                             "manual_state_detected",
-                            phase=phase,
+                            phase="on_break",
                             run_id=run_id,
                             job=job_name,
-                            reason="break_start_detected",
+                            reason="break_start_detected_without_timestamp",
                         )
                         self.logger.info(
-                            "Manual break detected and reconciled run_id=%s",
+                            "Manual break detected without timing reference run_id=%s",
                             run_id,
                         )
                         snap("recovered_manual_on_break")
-                    if phase == "working_before_break":
-                        self._click_and_confirm_transition(page, "Icon-pause", "Icon-play", "break start")
-                        start_break_at = datetime.now().isoformat()
-                        self.send_status(
-                            job_name,
-                            run_id,
-                            "start_break_click",
-                            "Resume: clicked break start",
-                        )
-                        self.send_click_webhook(
-                            self.webhook_start_break_url,
-                            job_name=job_name,
-                            run_id=run_id,
-                            click_name="start_break_click",
-                            ok=True,
-                            meta={
-                                "scheduled_at": datetime.fromtimestamp(second_click_ts).isoformat(),
-                                "executed_at": start_break_at,
-                                "recovered": True,
-                            },
-                        )
-                        snap("recovered_start_break_click")
-                        start_break_ts = datetime.fromisoformat(start_break_at).timestamp()
-                        self._set_runtime_state(
-                            "on_break",
-                            "On break (resumed)",
-                            run_id=run_id,
-                            job=job_name,
-                            ok=None,
-                            first_click_ts=first_click_ts,
-                            start_break_ts=start_break_ts,
-                            planned_stop_break_ts=plans["planned_stop_break_ts"],
-                            planned_final_ts=plans["planned_final_ts"],
-                            **self._planned_runtime_fields(plans),
-                        )
-                        phase = "on_break"
-
-                if phase == "on_break":
-                    if first_click_ts <= 0 or start_break_ts <= 0:
-                        raise RuntimeError("Missing previous timestamps to resume break end")
-                    latest_state = self._get_runtime_state()
-                    plans = self._build_planned_clicks(
+                        return {
+                            "ok": True,
+                            "resumed": False,
+                            "phase": "on_break",
+                            "run_id": run_id,
+                            "reason": "manual_break_unknown_timing",
+                        }
+                    start_break_ts = inferred_start_break_ts
+                    self._set_runtime_state(
+                        "on_break",
+                        "On break detected from UI (manual state)",
+                        run_id=run_id,
+                        job=job_name,
+                        ok=None,
                         first_click_ts=first_click_ts,
-                        planned_start_break_ts=self._safe_float(latest_state.get("planned_start_break_ts")),
-                        planned_stop_break_ts=self._safe_float(latest_state.get("planned_stop_break_ts")),
-                        planned_final_ts=self._safe_float(latest_state.get("planned_final_ts")),
-                        stop_break_base_ts=start_break_ts,
-                        **self._planned_duration_kwargs_from_state(latest_state),
+                        start_break_ts=start_break_ts,
+                        planned_start_break_ts=plans["planned_start_break_ts"],
+                        planned_stop_break_ts=plans["planned_stop_break_ts"],
+                        planned_final_ts=plans["planned_final_ts"],
+                        **self._planned_runtime_fields(plans),
+                        manual_state_detected=True,
                     )
-                    third_click_ts = plans["planned_stop_break_ts"]
-                    self._sleep_until(third_click_ts)
-                    open_target()
-                    self._click_and_confirm_transition(page, "Icon-play", "Icon-stop", "break end")
-                    stop_break_at = datetime.now().isoformat()
-                    break_gap_seconds = max(
-                        0,
-                        int(datetime.fromisoformat(stop_break_at).timestamp() - start_break_ts),
+                    phase = "on_break"
+                    self._enqueue_io(
+                        self._append_runtime_event,
+                        "manual_state_detected",
+                        phase=phase,
+                        run_id=run_id,
+                        job=job_name,
+                        reason="break_start_detected",
+                    )
+                    self.logger.info(
+                        "Manual break detected and reconciled run_id=%s",
+                        run_id,
                     )
-                    self.send_status(
+                    snap("recovered_manual_on_break")
+                if phase == "working_before_break":
+                    self._click_and_confirm_transition(page, "Icon-pause", "Icon-play", "break start")
+                    now_dt = datetime.now()
+                    start_break_at = now_dt.isoformat()
+                    self._enqueue_io(
+                        self.send_status,
                         job_name,
                         run_id,
-                        "stop_break_click",
-                        "Resume: clicked break end",
+                        "start_break_click",
+                        "Resume: clicked break start",
                     )
-                    self.send_click_webhook(
-                        self.webhook_stop_break_url,
+                    self._enqueue_io(
+                        self.send_click_webhook,
+                        self.webhook_start_break_url,
+                        phase=phase,
                         job_name=job_name,
                         run_id=run_id,
-                        click_name="stop_break_click",
+                        click_name="start_break_click",
                         ok=True,
                         meta={
-                            "scheduled_at": datetime.fromtimestamp(third_click_ts).isoformat(),
-                            "executed_at": stop_break_at,
-                            "gap_seconds_from_start_break": break_gap_seconds,
-                            "gap_minutes_from_start_break": round(break_gap_seconds / 60, 2),
+                            "scheduled_at": datetime.fromtimestamp(second_click_ts).isoformat(),
+                            "executed_at": start_break_at,
                             "recovered": True,
                         },
                     )
-                    snap("recovered_stop_break_click")
-                    stop_break_ts = datetime.fromisoformat(stop_break_at).timestamp()
+                    snap_image_only("recovered_start_break_click")
+                    start_break_ts = now_dt.timestamp()
                     self._set_runtime_state(
-                        "working_after_break",
-                        "Final segment (resumed)",
+                        "on_break",
+                        "On break (resumed)",
                         run_id=run_id,
                         job=job_name,
                         ok=None,
                         first_click_ts=first_click_ts,
                         start_break_ts=start_break_ts,
-                        stop_break_ts=stop_break_ts,
+                        planned_stop_break_ts=plans["planned_stop_break_ts"],
                         planned_final_ts=plans["planned_final_ts"],
                         **self._planned_runtime_fields(plans),
                     )
-                    phase = "working_after_break"
+                    phase = "on_break"
 
-                if phase == "working_after_break":
-                    if first_click_ts <= 0:
-                        raise RuntimeError("Missing first_click_ts to resume final click")
-                    latest_state = self._get_runtime_state()
-                    plans = self._build_planned_clicks(
-                        first_click_ts=first_click_ts,
-                        planned_start_break_ts=self._safe_float(latest_state.get("planned_start_break_ts")),
-                        planned_stop_break_ts=self._safe_float(latest_state.get("planned_stop_break_ts")),
-                        planned_final_ts=self._safe_float(latest_state.get("planned_final_ts")),
-                        stop_break_base_ts=start_break_ts,
-                        **self._planned_duration_kwargs_from_state(latest_state),
+            if phase == "on_break":
+                if first_click_ts <= 0 or start_break_ts <= 0:
+                    raise RuntimeError("Missing previous timestamps to resume break end")
+                latest_state = self._get_runtime_state()
+                plan = self._snapshot_plan(latest_state)
+                plans = self._build_planned_clicks(
+                    first_click_ts=first_click_ts,
+                    planned_start_break_ts=plan.planned_start_break_ts,
+                    planned_stop_break_ts=plan.planned_stop_break_ts,
+                    planned_final_ts=plan.planned_final_ts,
+                    stop_break_base_ts=start_break_ts,
+                    **self._planned_duration_kwargs_from_state(latest_state),
+                )
+                third_click_ts = plans["planned_stop_break_ts"]
+                # A manually ended break (Icon-stop visible) ends the wait early and is reconciled below.
+                backoff = self._wait_backoff_steps()
+                while True:
+                    stop_signalled = self._wait_until_or_selector(
+                        page,
+                        third_click_ts,
+                        self._icon_selector("Icon-stop"),
+                        cancel=cancel,
+                        backoff=backoff,
                     )
-                    final_ts = plans["planned_final_ts"]
-                    self._sleep_until(final_ts)
                     open_target()
-                    self._complete_end_of_day(page)
-                    self.send_status(job_name, run_id, "final_click", "Resume: clicked end of workday")
-                    snap("recovered_final_click")
-                    final_click_ts = time.time()
-                    result = {
-                        "ok": True,
-                        "job": job_name,
-                        "run_id": run_id,
-                        "url": page.url,
-                        "data_dir": str(self.data_dir),
-                        "recovered": True,
-                        "planned_final_ts": final_ts,
-                        "final_click_ts": final_click_ts,
-                        "scheduled_at": self._timestamp_to_local_iso(final_ts),
-                        "executed_at": self._timestamp_to_local_iso(final_click_ts),
-                    }
+                    manual_stop_seen = stop_signalled and self._is_icon_visible(page, "Icon-stop", timeout_ms=2_000)
+                    if manual_stop_seen or not stop_signalled:
+                        break
+                if manual_stop_seen:
+                    self._drain_io_queue()
+                    inferred_stop_break_ts = self._infer_click_ts_from_events(
+                        run_id=run_id,
+                        click_name="stop_break_click",
+                    )
+                    stop_break_ts = inferred_stop_break_ts if inferred_stop_break_ts > 0 else time.time()
                     self._set_runtime_state(
-                        "completed",
-                        "Workday completed (resumed)",
+                        "working_after_break",
+                        "Final segment detected from UI (manual state)",
                         run_id=run_id,
                         job=job_name,
-                        ok=True,
+                        ok=None,
                         first_click_ts=first_click_ts,
                         start_break_ts=start_break_ts,
                         stop_break_ts=stop_break_ts,
-                        planned_final_ts=final_ts,
-                        final_click_ts=final_click_ts,
+                        planned_final_ts=plans["planned_final_ts"],
                         **self._planned_runtime_fields(plans),
+                        manual_state_detected=True,
                     )
-                    self.send_final(job_name, run_id, result)
-                    self._append_runtime_event(
-                        "resume_completed",
-                        phase="completed",
+                    self._enqueue_io(
+                        self._append_runtime_event,
+                        "manual_state_detected",
+                        phase="working_after_break",
                         run_id=run_id,
                         job=job_name,
+                        reason="break_end_detected",
+                    )
+                    self.logger.info(
+                        "Manual break end detected and reconciled run_id=%s",
+                        run_id,
+                    )
+                    snap("recovered_manual_break_end")
+                else:
+                    self._click_and_confirm_transition(page, "Icon-play", "Icon-stop", "break end")
+                    now_dt = datetime.now()
+                    stop_break_at = now_dt.isoformat()
+                    stop_break_ts = now_dt.timestamp()
+                    break_gap_seconds = max(0, int(stop_break_ts - start_break_ts))
+                    self._enqueue_io(
+                        self.send_status,
+                        job_name,
+                        run_id,
+                        "stop_break_click",
+                        "Resume: clicked break end",
+                    )
+                    self._enqueue_io(
+                        self.send_click_webhook,
+                        self.webhook_stop_break_url,
+                        phase=phase,
+                        job_name=job_name,
+                        run_id=run_id,
+                        click_name="stop_break_click",
                         ok=True,
+                        meta={
+                            "scheduled_at": datetime.fromtimestamp(third_click_ts).isoformat(),
+                            "executed_at": stop_break_at,
+                            "gap_seconds_from_start_break": break_gap_seconds,
+                            "gap_minutes_from_start_break": round(break_gap_seconds / 60, 2),
+                            "recovered": True,
+                        },
                     )
-                    return {"ok": True, "resumed": True, "phase": "completed", "run_id": run_id}
+                    snap_image_only("recovered_stop_break_click")
+                    self._set_runtime_state(
+                        "working_after_break",
+                        "Final segment (resumed)",
+                        run_id=run_id,
+                        job=job_name,
+                        ok=None,
+                        first_click_ts=first_click_ts,
+                        start_break_ts=start_break_ts,
+                        stop_break_ts=stop_break_ts,
+                        planned_final_ts=plans["planned_final_ts"],
+                        **self._planned_runtime_fields(plans),
+                    )
+                phase = "working_after_break"
 
-                return {"ok": True, "resumed": False, "phase": phase, "run_id": run_id}
+            if phase == "working_after_break":
+                if first_click_ts <= 0:
+                    raise RuntimeError("Missing first_click_ts to resume final click")
+                latest_state = self._get_runtime_state()
+                plan = self._snapshot_plan(latest_state)
+                plans = self._build_planned_clicks(
+                    first_click_ts=first_click_ts,
+                    planned_start_break_ts=plan.planned_start_break_ts,
+                    planned_stop_break_ts=plan.planned_stop_break_ts,
+                    planned_final_ts=plan.planned_final_ts,
+                    stop_break_base_ts=start_break_ts,
+                    **self._planned_duration_kwargs_from_state(latest_state),
+                )
+                final_ts = plans["planned_final_ts"]
+                self._wait_until_or_selector(page, final_ts, cancel=cancel)
+                open_target()
+                self._complete_end_of_day(page)
+                self._enqueue_io(self.send_status, job_name, run_id, "final_click", "Resume: clicked end of workday")
+                snap_image_only("recovered_final_click")
+                final_click_ts = time.time()
+                result = {
+                    "ok": True,
+                    "job": job_name,
+                    "run_id": run_id,
+                    "url": page.url,
+                    "data_dir": str(self.data_dir),
+                    "recovered": True,
+                    "planned_final_ts": final_ts,
+                    "final_click_ts": final_click_ts,
+                    "scheduled_at": self._timestamp_to_local_iso(final_ts),
+                    "executed_at": self._timestamp_to_local_iso(final_click_ts),
+                }
+                self._set_runtime_state(
+                    "completed",
+                    "Workday completed (resumed)",
+                    run_id=run_id,
+                    job=job_name,
+                    ok=True,
+                    first_click_ts=first_click_ts,
+                    start_break_ts=start_break_ts,
+                    stop_break_ts=stop_break_ts,
+                    planned_final_ts=final_ts,
+                    final_click_ts=final_click_ts,
+                    **self._planned_runtime_fields(plans),
+                )
+                self._enqueue_io(self.send_final, job_name, run_id, result)
+                self._enqueue_io(
+                    self._append_runtime_event,
+                    "resume_completed",
+                    phase="completed",
+                    run_id=run_id,
+                    job=job_name,
+                    ok=True,
+                )
+                return {"ok": True, "resumed": True, "phase": "completed", "run_id": run_id}
+
+            return {"ok": True, "resumed": False, "phase": phase, "run_id": run_id}
 
         except Exception as err:
             self.logger.exception("Error resuming job=%s run_id=%s", job_name, run_id)
@@ -1767,11 +2472,11 @@ class WorkdayAgentService:
             retry_phase = prev_phase if prev_phase in self.ACTIVE_PHASES else ""
             planned_final_ts = self._safe_float(latest_state.get("planned_final_ts"))
             final_click_ts = self._safe_float(latest_state.get("final_click_ts"))
-            if page is not None:
+            if page is not None and self._should_snapshot(error=True):
                 try:
-                    page.screenshot(path=str(run_dir / "recovered_failed.png"), full_page=True)
-                    (run_dir / "recovered_failed.html").write_text(page.content(), encoding="utf-8")
-                    self.logger.info("Snapshot saved: recovered_failed")
+                    self._save_screenshot_in_background(page, run_dir / "recovered_failed.jpg", bounded_full_page=True)
+                    self._save_html_snapshot(page, run_dir / "recovered_failed.html", background=True)
+                    self.logger.info("Snapshot queued: recovered_failed")
                 except Exception:
                     self.logger.exception("Could not save snapshot during failed resume")
             result = {
@@ -1801,8 +2506,8 @@ class WorkdayAgentService:
                 failed_phase=retry_phase,
                 **self._runtime_resume_fields(latest_state),
             )
-            self.send_status(job_name, run_id, "error", f"Resume error: {err}", ok=False)
-            self.send_final(job_name, run_id, result)
+            self._enqueue_io(self.send_status, job_name, run_id, "error", f"Resume error: {err}", ok=False)
+            self._enqueue_io(self.send_final, job_name, run_id, result)
             return {"ok": False, "resumed": True, "phase": "failed", "run_id": run_id, "error": str(err)}
 
         finally:
@@ -1811,13 +2516,16 @@ class WorkdayAgentService:
                     context.close()
                 except Exception:
                     self.logger.exception("Error closing Playwright context during resume")
-            if browser is not None:
-                try:
-                    browser.close()
-                except Exception:
-                    self.logger.exception("Error closing Playwright browser during resume")
-            self.logger.info("Playwright resources closed after resume job=%s run_id=%s", job_name, run_id)
+            try:
+                browser_session.close()
+            except Exception:
+                self.logger.exception("Error closing Playwright browser during resume")
+            # Queued webhooks/events don't touch the browser or shared run state, so
+            # the next run may start while they are flushed.
+            self._cancel_events.pop(run_id, None)
             self._run_lock.release()
+            self.logger.info("Playwright resources closed after resume job=%s run_id=%s", job_name, run_id)
+            self._drain_io_queue()
 
     def run_workday_flow(self, job_name: str, supervision: bool, run_id: str) -> Dict[str, Any]:
         if not self._run_lock.acquire(blocking=False):
@@ -1835,346 +2543,366 @@ class WorkdayAgentService:
                 ok=False,
                 error=result["error"],
             )
-            self.send_status(job_name, run_id, "busy", result["error"], ok=False)
-            self.send_final(job_name, run_id, result)
+            self._enqueue_io(self.send_status, job_name, run_id, "busy", result["error"], ok=False)
+            self._enqueue_io(self.send_final, job_name, run_id, result)
             return result
+        cancel = self._cancel_events[run_id] = threading.Event()
+        browser_session = ExitStack()
+        page = None
 
-        self._debug("Starting run_workday_flow", job_name=job_name, run_id=run_id, supervision=supervision)
-        run_dir = self._artifact_dir(job_name, run_id)
-        storage_path = self.data_dir / "storage" / f"{job_name}.json"
-        storage_path.parent.mkdir(parents=True, exist_ok=True)
+        def snap(tag: str, full: bool = False, error: bool = False):
+            if page is None or not self._should_snapshot(error=error):
+                return
+            self._save_screenshot_in_background(page, run_dir / f"{tag}.jpg", bounded_full_page=full)
+            self._save_html_snapshot(page, run_dir / f"{tag}.html", background=True)
+            self.logger.info("Snapshot queued: %s", tag)
 
-        self.logger.info(
-            "Start job=%s run_id=%s supervision=%s artifacts=%s",
-            job_name,
-            run_id,
-            supervision,
-            run_dir,
-        )
+        # Everything after the lock is taken, browser startup included, runs inside
+        # the block that releases it.
+        try:
+            self._debug("Starting run_workday_flow", job_name=job_name, run_id=run_id, supervision=supervision)
+            run_dir = self._artifact_dir(job_name, run_id)
+            storage_path = self._storage_state_path(job_name)
 
-        first_start, first_end, rescue_end = self._first_click_window()
+            self.logger.info(
+                "Start job=%s run_id=%s supervision=%s artifacts=%s",
+                job_name,
+                run_id,
+                supervision,
+                run_dir,
+            )
 
-        with sync_playwright() as p:
-            browser = self._launch_browser(p, run_id=run_id, job_name=job_name, headless=True)
+            # The window is judged at invocation time, before browser startup can push
+            # a late call past first_end; an expired window is still reported through
+            # the normal failure path below.
+            first_start, first_end, rescue_end = self._first_click_window()
+            now = datetime.now()
+            rescue_mode = now > first_end
+            if rescue_mode:
+                random_first = time.time()
+                scheduled_message = "Normal window expired: first click (Icon-play) in immediate recovery mode"
+            else:
+                random_first = random.uniform(first_start.timestamp(), first_end.timestamp())
+                scheduled_message = "First click (Icon-play) planned randomly"
+
+            browser = browser_session.enter_context(self._browser_session(run_id=run_id, job_name=job_name))
             context_kwargs: Dict[str, Any] = {}
             if storage_path.exists():
                 context_kwargs["storage_state"] = str(storage_path)
                 self.logger.info("Reutilizando storage_state desde %s", storage_path)
 
             context = browser.new_context(**context_kwargs)
+            browser_session.callback(context.close)
+            if self.fast_mode:
+                context.clock.install()
             page = context.new_page()
+            self._reset_dismissed_overlays()
 
-            def snap(tag: str):
-                page.screenshot(path=str(run_dir / f"{tag}.png"), full_page=True)
-                (run_dir / f"{tag}.html").write_text(page.content(), encoding="utf-8")
-                self.logger.info("Snapshot saved: %s", tag)
+            if now > rescue_end:
+                raise RuntimeError("Execution started after 09:30 for the first click")
 
-            try:
-                now = datetime.now()
-                rescue_mode = now > first_end
-                if now > rescue_end:
-                    raise RuntimeError("Execution started after 09:30 for the first click")
-
-                if rescue_mode:
-                    random_first = time.time()
-                    scheduled_message = "Normal window expired: first click (Icon-play) in immediate recovery mode"
-                else:
-                    random_first = random.uniform(first_start.timestamp(), first_end.timestamp())
-                    scheduled_message = "First click (Icon-play) planned randomly"
+            random_first_iso = datetime.fromtimestamp(random_first).isoformat()
+            self._set_runtime_state(
+                "waiting_start",
+                "Waiting to start",
+                run_id=run_id,
+                job=job_name,
+                ok=None,
+                planned_first_ts=random_first,
+            )
+            self._enqueue_io(
+                self.send_status,
+                job_name,
+                run_id,
+                "scheduled_first",
+                scheduled_message,
+            )
+            self._debug(
+                "Scheduled wait for first click",
+                run_id=run_id,
+                planned_at=random_first_iso,
+                rescue_mode=rescue_mode,
+            )
+            self._wait_for_planned_click(context, random_first, cancel)
 
-                self._set_runtime_state(
-                    "waiting_start",
-                    "Waiting to start",
-                    run_id=run_id,
-                    job=job_name,
-                    ok=None,
-                    planned_first_ts=random_first,
-                )
-                self.send_status(
-                    job_name,
-                    run_id,
-                    "scheduled_first",
-                    scheduled_message,
-                    extra={
-                        "at": datetime.fromtimestamp(random_first).isoformat(),
-                        "rescue_mode": rescue_mode,
-                    },
-                )
-                self._debug(
-                    "Scheduled wait for first click",
-                    run_id=run_id,
-                    planned_at=datetime.fromtimestamp(random_first).isoformat(),
-                    rescue_mode=rescue_mode,
-                )
-                self._sleep_until(random_first)
+            if not self.target_url:
+                raise RuntimeError("Missing target_url in configuration")
 
-                if not self.target_url:
-                    raise RuntimeError("Missing target_url in configuration")
+            self.logger.info("Opening target URL: %s", self._sanitize_url_for_log(self.target_url))
+            page.goto(self.target_url, wait_until="domcontentloaded", timeout=60_000)
+            self._dismiss_overlays(page)
 
-                self.logger.info("Opening target URL: %s", self._sanitize_url_for_log(self.target_url))
-                page.goto(self.target_url, wait_until="domcontentloaded", timeout=60_000)
-                self._dismiss_cookie_popup(page)
-                self._dismiss_location_prompt(page)
-
-                url = page.url.lower()
-                # Generic heuristic to detect authentication screens from different providers.
-                auth_markers = ("login", "signin", "sso", "auth")
-                if any(marker in url for marker in auth_markers):
-                    self.logger.warning(
-                        "Authentication flow detected at URL: %s",
-                        self._sanitize_url_for_log(page.url),
-                    )
-                    if self.sso_email:
-                        try:
-                            page.wait_for_selector(
-                                "input[type='email'], input[name='identifier'], input[name='email']",
-                                timeout=15_000,
-                            )
-                            page.fill(
-                                "input[type='email'], input[name='identifier'], input[name='email']",
-                                self.sso_email,
-                            )
-                            page.keyboard.press("Enter")
-                            self.logger.info("Sign-in identifier auto-filled")
-                        except Exception:
-                            self.logger.exception(
-                                "Could not auto-fill sign-in identifier"
-                            )
-                    if supervision:
-                        snap("sso_required")
-                        raise RuntimeError(
-                            "An authentication screen was detected. Complete login manually and run again"
+            if self.AUTH_URL_RE.search(page.url):
+                self.logger.warning(
+                    "Authentication flow detected at URL: %s",
+                    self._sanitize_url_for_log(page.url),
+                )
+                if self.sso_email:
+                    try:
+                        page.wait_for_selector(
+                            "input[type='email'], input[name='identifier'], input[name='email']",
+                            timeout=15_000,
+                        )
+                        page.fill(
+                            "input[type='email'], input[name='identifier'], input[name='email']",
+                            self.sso_email,
+                        )
+                        page.keyboard.press("Enter")
+                        self.logger.info("Sign-in identifier auto-filled")
+                    except Exception:
+                        self.logger.exception(
+                            "Could not auto-fill sign-in identifier"
                         )
+                if supervision:
+                    snap("sso_required", error=True)
+                    raise RuntimeError(
+                        "An authentication screen was detected. Complete login manually and run again"
+                    )
 
-                context.storage_state(path=str(storage_path))
+            if self._persist_storage_state(context, storage_path):
                 self.logger.info("storage_state updated at %s", storage_path)
 
-                self._click_and_confirm_transition(page, "Icon-play", "Icon-pause", "start of workday")
-                self.send_status(job_name, run_id, "first_click", "Clicked start button (Icon-play)")
-                self.send_click_webhook(
-                    self.webhook_start_url,
-                    job_name=job_name,
-                    run_id=run_id,
-                    click_name="start_click",
-                    ok=True,
-                    meta={"executed_at": datetime.now().isoformat()},
-                )
-                snap("first_click")
-                first_click_ts = time.time()
+            self._click_and_confirm_transition(page, "Icon-play", "Icon-pause", "start of workday")
+            now_dt = datetime.now()
+            first_click_ts = now_dt.timestamp()
+            self._enqueue_io(self.send_status, job_name, run_id, "first_click", "Clicked start button (Icon-play)")
+            self._enqueue_io(
+                self.send_click_webhook,
+                self.webhook_start_url,
+                phase="waiting_start",
+                job_name=job_name,
+                run_id=run_id,
+                click_name="start_click",
+                ok=True,
+                meta={"executed_at": now_dt.isoformat()},
+            )
+            snap("first_click")
+
+            plans = self._build_planned_clicks(first_click_ts=first_click_ts)
+            plan_runtime_fields = self._planned_runtime_fields(plans)
+            second_click_ts = plans["planned_start_break_ts"]
+            third_click_ts = plans["planned_stop_break_ts"]
+            final_ts = plans["planned_final_ts"]
+            plan_iso = {
+                key: datetime.fromtimestamp(plans[key]).isoformat()
+                for key in ("planned_start_break_ts", "planned_stop_break_ts", "planned_final_ts")
+            }
+            self._enqueue_io(
+                self.send_status,
+                job_name,
+                run_id,
+                "scheduled_start_break",
+                "Break start (Icon-pause) planned",
+            )
+            self._debug(
+                "Scheduled wait for break start",
+                run_id=run_id,
+                planned_at=plan_iso["planned_start_break_ts"],
+            )
+            self._set_runtime_state(
+                "working_before_break",
+                "Workday started",
+                run_id=run_id,
+                job=job_name,
+                ok=None,
+                first_click_ts=first_click_ts,
+                planned_start_break_ts=second_click_ts,
+                planned_stop_break_ts=third_click_ts,
+                planned_final_ts=final_ts,
+                **plan_runtime_fields,
+            )
+            self._wait_for_planned_click(context, second_click_ts, cancel)
+            self._ensure_icon_ready(page, "Icon-pause")
+            self._click_and_confirm_transition(page, "Icon-pause", "Icon-play", "break start")
+            now_dt = datetime.now()
+            start_break_at = now_dt.isoformat()
+            start_break_ts = now_dt.timestamp()
+            self._enqueue_io(
+                self.send_status,
+                job_name,
+                run_id,
+                "start_break_click",
+                "Clicked break start (Icon-pause)",
+            )
+            self._enqueue_io(
+                self.send_click_webhook,
+                self.webhook_start_break_url,
+                phase="working_before_break",
+                job_name=job_name,
+                run_id=run_id,
+                click_name="start_break_click",
+                ok=True,
+                meta={
+                    "scheduled_at": plan_iso["planned_start_break_ts"],
+                    "executed_at": start_break_at,
+                },
+            )
+            snap("start_break_click")
 
-                plans = self._build_planned_clicks(first_click_ts=first_click_ts)
-                plan_runtime_fields = self._planned_runtime_fields(plans)
-                second_click_ts = plans["planned_start_break_ts"]
-                third_click_ts = plans["planned_stop_break_ts"]
-                final_ts = plans["planned_final_ts"]
-                self.send_status(
-                    job_name,
-                    run_id,
-                    "scheduled_start_break",
-                    "Break start (Icon-pause) planned",
-                    extra={"at": datetime.fromtimestamp(second_click_ts).isoformat()},
-                )
-                self._debug(
-                    "Scheduled wait for break start",
-                    run_id=run_id,
-                    planned_at=datetime.fromtimestamp(second_click_ts).isoformat(),
-                )
-                self._set_runtime_state(
-                    "working_before_break",
-                    "Workday started",
-                    run_id=run_id,
-                    job=job_name,
-                    ok=None,
-                    first_click_ts=first_click_ts,
-                    planned_start_break_ts=second_click_ts,
-                    planned_stop_break_ts=third_click_ts,
-                    planned_final_ts=final_ts,
-                    **plan_runtime_fields,
-                )
-                self._sleep_until(second_click_ts)
-                page.reload(wait_until="domcontentloaded", timeout=60_000)
-                self._dismiss_cookie_popup(page)
-                self._dismiss_location_prompt(page)
-                self._click_and_confirm_transition(page, "Icon-pause", "Icon-play", "break start")
-                start_break_at = datetime.now().isoformat()
-                self.send_status(
-                    job_name,
-                    run_id,
-                    "start_break_click",
-                    "Clicked break start (Icon-pause)",
-                )
-                self.send_click_webhook(
-                    self.webhook_start_break_url,
-                    job_name=job_name,
-                    run_id=run_id,
-                    click_name="start_break_click",
-                    ok=True,
-                    meta={
-                        "scheduled_at": datetime.fromtimestamp(second_click_ts).isoformat(),
-                        "executed_at": start_break_at,
-                    },
-                )
-                snap("start_break_click")
-                start_break_ts = datetime.fromisoformat(start_break_at).timestamp()
-
-                self.send_status(
-                    job_name,
-                    run_id,
-                    "scheduled_stop_break",
-                    "Break end (Icon-play) planned",
-                    extra={"at": datetime.fromtimestamp(third_click_ts).isoformat()},
-                )
-                self._debug(
-                    "Scheduled wait for break end",
-                    run_id=run_id,
-                    planned_at=datetime.fromtimestamp(third_click_ts).isoformat(),
-                )
-                self._set_runtime_state(
-                    "on_break",
-                    "On break",
-                    run_id=run_id,
-                    job=job_name,
-                    ok=None,
-                    first_click_ts=first_click_ts,
-                    start_break_ts=start_break_ts,
-                    planned_stop_break_ts=third_click_ts,
-                    planned_final_ts=final_ts,
-                    **plan_runtime_fields,
-                )
-                self._sleep_until(third_click_ts)
-                page.reload(wait_until="domcontentloaded", timeout=60_000)
-                self._dismiss_cookie_popup(page)
-                self._dismiss_location_prompt(page)
-                self._click_and_confirm_transition(page, "Icon-play", "Icon-stop", "break end")
-                stop_break_at = datetime.now().isoformat()
-                self.send_status(
-                    job_name,
-                    run_id,
-                    "stop_break_click",
-                    "Clicked break end (Icon-play)",
-                )
-                break_gap_seconds = max(0, int(datetime.fromisoformat(stop_break_at).timestamp() - datetime.fromisoformat(start_break_at).timestamp()))
-                self.send_click_webhook(
-                    self.webhook_stop_break_url,
-                    job_name=job_name,
-                    run_id=run_id,
-                    click_name="stop_break_click",
-                    ok=True,
-                    meta={
-                        "scheduled_at": datetime.fromtimestamp(third_click_ts).isoformat(),
-                        "executed_at": stop_break_at,
-                        "gap_seconds_from_start_break": break_gap_seconds,
-                        "gap_minutes_from_start_break": round(break_gap_seconds / 60, 2),
-                    },
-                )
-                snap("stop_break_click")
-                stop_break_ts = datetime.fromisoformat(stop_break_at).timestamp()
-
-                self.send_status(
-                    job_name,
-                    run_id,
-                    "scheduled_final",
-                    "Final click (Icon-stop) planned",
-                    extra={"at": datetime.fromtimestamp(final_ts).isoformat()},
-                )
-                self._debug(
-                    "Scheduled wait for final click",
-                    run_id=run_id,
-                    planned_at=datetime.fromtimestamp(final_ts).isoformat(),
-                )
-                self._set_runtime_state(
-                    "working_after_break",
-                    "Final segment",
-                    run_id=run_id,
-                    job=job_name,
-                    ok=None,
-                    first_click_ts=first_click_ts,
-                    start_break_ts=start_break_ts,
-                    stop_break_ts=stop_break_ts,
-                    planned_final_ts=final_ts,
-                    **plan_runtime_fields,
-                )
-                self._sleep_until(final_ts)
-                page.reload(wait_until="domcontentloaded", timeout=60_000)
-                self._dismiss_cookie_popup(page)
-                self._dismiss_location_prompt(page)
-                self._complete_end_of_day(page)
-                self.send_status(job_name, run_id, "final_click", "Clicked end of workday (Icon-stop)")
-                snap("final_click")
-                final_click_ts = time.time()
+            self._enqueue_io(
+                self.send_status,
+                job_name,
+                run_id,
+                "scheduled_stop_break",
+                "Break end (Icon-play) planned",
+            )
+            self._debug(
+                "Scheduled wait for break end",
+                run_id=run_id,
+                planned_at=plan_iso["planned_stop_break_ts"],
+            )
+            self._set_runtime_state(
+                "on_break",
+                "On break",
+                run_id=run_id,
+                job=job_name,
+                ok=None,
+                first_click_ts=first_click_ts,
+                start_break_ts=start_break_ts,
+                planned_stop_break_ts=third_click_ts,
+                planned_final_ts=final_ts,
+                **plan_runtime_fields,
+            )
+            self._wait_for_planned_click(context, third_click_ts, cancel)
+            self._ensure_icon_ready(page, "Icon-play")
+            self._click_and_confirm_transition(page, "Icon-play", "Icon-stop", "break end")
+            now_dt = datetime.now()
+            stop_break_at = now_dt.isoformat()
+            stop_break_ts = now_dt.timestamp()
+            self._enqueue_io(
+                self.send_status,
+                job_name,
+                run_id,
+                "stop_break_click",
+                "Clicked break end (Icon-play)",
+            )
+            break_gap_seconds = max(0, int(stop_break_ts - start_break_ts))
+            self._enqueue_io(
+                self.send_click_webhook,
+                self.webhook_stop_break_url,
+                phase="on_break",
+                job_name=job_name,
+                run_id=run_id,
+                click_name="stop_break_click",
+                ok=True,
+                meta={
+                    "scheduled_at": plan_iso["planned_stop_break_ts"],
+                    "executed_at": stop_break_at,
+                    "gap_seconds_from_start_break": break_gap_seconds,
+                    "gap_minutes_from_start_break": round(break_gap_seconds / 60, 2),
+                },
+            )
+            snap("stop_break_click")
 
-                result = {
-                    "ok": True,
-                    "job": job_name,
-                    "run_id": run_id,
-                    "url": page.url,
-                    "data_dir": str(self.data_dir),
-                    "planned_final_ts": final_ts,
-                    "final_click_ts": final_click_ts,
-                    "scheduled_at": self._timestamp_to_local_iso(final_ts),
-                    "executed_at": self._timestamp_to_local_iso(final_click_ts),
-                }
-                self._set_runtime_state(
-                    "completed",
-                    "Workday completed",
-                    run_id=run_id,
-                    job=job_name,
-                    ok=True,
-                    first_click_ts=first_click_ts,
-                    start_break_ts=start_break_ts,
-                    stop_break_ts=stop_break_ts,
-                    planned_final_ts=final_ts,
-                    final_click_ts=final_click_ts,
-                    **plan_runtime_fields,
-                )
-                self.send_final(job_name, run_id, result)
-                self._debug("Run completed OK", job_name=job_name, run_id=run_id)
-                return result
+            self._enqueue_io(
+                self.send_status,
+                job_name,
+                run_id,
+                "scheduled_final",
+                "Final click (Icon-stop) planned",
+            )
+            self._debug(
+                "Scheduled wait for final click",
+                run_id=run_id,
+                planned_at=plan_iso["planned_final_ts"],
+            )
+            self._set_runtime_state(
+                "working_after_break",
+                "Final segment",
+                run_id=run_id,
+                job=job_name,
+                ok=None,
+                first_click_ts=first_click_ts,
+                start_break_ts=start_break_ts,
+                stop_break_ts=stop_break_ts,
+                planned_final_ts=final_ts,
+                **plan_runtime_fields,
+            )
+            self._wait_for_planned_click(context, final_ts, cancel)
+            self._ensure_icon_ready(page, "Icon-stop")
+            self._complete_end_of_day(page)
+            self._enqueue_io(self.send_status, job_name, run_id, "final_click", "Clicked end of workday (Icon-stop)")
+            snap("final_click")
+            final_click_ts = time.time()
 
-            except Exception as err:
-                self.logger.exception("Execution error job=%s run_id=%s", job_name, run_id)
-                latest_state = self._get_runtime_state()
-                prev_phase = str(latest_state.get("phase", ""))
-                retry_phase = prev_phase if prev_phase in self.ACTIVE_PHASES else ""
-                planned_final_ts = self._safe_float(latest_state.get("planned_final_ts"))
-                final_click_ts = self._safe_float(latest_state.get("final_click_ts"))
-                try:
-                    snap("failed")
-                except Exception:
-                    self.logger.exception("Could not save error snapshot")
-                result = {
-                    "ok": False,
-                    "job": job_name,
-                    "run_id": run_id,
-                    "error": str(err),
-                    "url": page.url if "page" in locals() else "",
-                    "planned_final_ts": planned_final_ts,
-                }
-                if retry_phase:
-                    result["failed_phase"] = retry_phase
-                scheduled_at = self._timestamp_to_local_iso(planned_final_ts)
-                executed_at = self._timestamp_to_local_iso(final_click_ts)
-                if scheduled_at:
-                    result["scheduled_at"] = scheduled_at
-                if executed_at:
-                    result["executed_at"] = executed_at
-                self._set_runtime_state(
-                    "failed",
-                    "Workday failed",
-                    run_id=run_id,
-                    job=job_name,
-                    ok=False,
-                    error=str(err),
-                    failed_phase=retry_phase,
-                    **self._runtime_resume_fields(latest_state),
-                )
-                self.send_status(job_name, run_id, "error", f"Execution error: {err}", ok=False)
-                self.send_final(job_name, run_id, result)
-                self._debug("Run finished with error", job_name=job_name, run_id=run_id, error=str(err))
-                return result
+            result = {
+                "ok": True,
+                "job": job_name,
+                "run_id": run_id,
+                "url": page.url,
+                "data_dir": str(self.data_dir),
+                "planned_final_ts": final_ts,
+                "final_click_ts": final_click_ts,
+                "scheduled_at": self._timestamp_to_local_iso(final_ts),
+                "executed_at": self._timestamp_to_local_iso(final_click_ts),
+            }
+            self._set_runtime_state(
+                "completed",
+                "Workday completed",
+                run_id=run_id,
+                job=job_name,
+                ok=True,
+                first_click_ts=first_click_ts,
+                start_break_ts=start_break_ts,
+                stop_break_ts=stop_break_ts,
+                planned_final_ts=final_ts,
+                final_click_ts=final_click_ts,
+                **plan_runtime_fields,
+            )
+            # The final webhook and snapshot writes are flushed while the browser shuts down.
+            self._enqueue_io(self.send_final, job_name, run_id, result)
+            self._debug("Run completed OK", job_name=job_name, run_id=run_id)
+            return result
 
+        except Exception as err:
+            self.logger.exception("Execution error job=%s run_id=%s", job_name, run_id)
+            latest_state = self._get_runtime_state()
+            prev_phase = str(latest_state.get("phase", ""))
+            retry_phase = prev_phase if prev_phase in self.ACTIVE_PHASES else ""
+            planned_final_ts = self._safe_float(latest_state.get("planned_final_ts"))
+            final_click_ts = self._safe_float(latest_state.get("final_click_ts"))
+            try:
+                snap("failed", full=True, error=True)
+            except Exception:
+                self.logger.exception("Could not save error snapshot")
+            result = {
+                "ok": False,
+                "job": job_name,
+                "run_id": run_id,
+                "error": str(err),
+                "url": page.url if page is not None else "",
+                "planned_final_ts": planned_final_ts,
+            }
+            if retry_phase:
+                result["failed_phase"] = retry_phase
+            scheduled_at = self._timestamp_to_local_iso(planned_final_ts)
+            executed_at = self._timestamp_to_local_iso(final_click_ts)
+            if scheduled_at:
+                result["scheduled_at"] = scheduled_at
+            if executed_at:
+                result["executed_at"] = executed_at
+            self._set_runtime_state(
+                "failed",
+                "Workday failed",
+                run_id=run_id,
+                job=job_name,
+                ok=False,
+                error=str(err),
+                failed_phase=retry_phase,
+                **self._runtime_resume_fields(latest_state),
+            )
+            self._enqueue_io(self.send_status, job_name, run_id, "error", f"Execution error: {err}", ok=False)
+            self._enqueue_io(self.send_final, job_name, run_id, result)
+            self._debug("Run finished with error", job_name=job_name, run_id=run_id, error=str(err))
+            return result
+
+        finally:
+            try:
+                browser_session.close()
+            except Exception:
+                self.logger.exception("Error closing Playwright resources job=%s run_id=%s", job_name, run_id)
             finally:
-                context.close()
-                browser.close()
-                self.logger.info("Playwright resources closed job=%s run_id=%s", job_name, run_id)
+                self._cancel_events.pop(run_id, None)
                 self._run_lock.release()
+            self.logger.info("Playwright resources closed job=%s run_id=%s", job_name, run_id)
+            self._drain_io_queue()
@@ -1,16 +1,23 @@
 import asyncio
+import copy
 import json
 import logging
 import os
 import re
+import secrets
+import threading
 import time
-import uuid
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type
 
 import httpx
 from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
 from pydantic import BaseModel
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - depende del entorno local
+    orjson = None
 from agents.support_guidance import (
     DEFAULT_SUPPORT_MARKETING_URL,
     DEFAULT_SUPPORT_TELEGRAM_URL,
@@ -36,30 +43,285 @@ CONVERSATIONS_PATH = DATA_DIR / "conversations.json"
 PENDING_ISSUES_PATH = DATA_DIR / "pending_issues.json"
 MANUAL_ACTIONS_PATH = DATA_DIR / "manual_actions.json"
 BLOCKED_USERS_PATH = DATA_DIR / "blocked_users.json"
+STATE_WAL_PATH = DATA_DIR / "state.wal"
+FALLBACK_REPLY = "Give me a second to check this."
+
+_PUNCT_RE = re.compile(r"[^\w\sáéíóúüñ¿?¡!]")
+# ASCII characters _PUNCT_RE would drop, deleted in one C-level pass by str.translate.
+_ASCII_PUNCT_TABLE = str.maketrans(
+    "", "", "".join(ch for ch in map(chr, range(128)) if _PUNCT_RE.match(ch) and not ch.isspace())
+)
+
+
+def _json_dumps(payload: Any, indent: bool = False) -> bytes:
+    # orjson (C encoder) when installed; stdlib json otherwise. Both emit UTF-8 without ASCII escaping.
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0))
+    return json.dumps(payload, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def _json_loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
 
 
 def _load_json(path: Path, default: Any) -> Any:
     if not path.exists():
         return default
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
+        return _json_loads(path.read_bytes())
     except Exception:
         logger.exception("Could not read JSON at %s; using fallback", path)
         return default
 
 
-def _save_json(path: Path, payload: Any) -> None:
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+def _save_json(path: Path, payload: Any, indent: bool = False) -> None:
+    # Write-then-rename so readers and crash recovery never see a half-written file.
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as fh:
+        fh.write(_json_dumps(payload, indent=indent))
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+
+
+class _StateJournal:
+    """Append-only JSON-lines log shared by every JSON store of the server.
+
+    Each mutation is one fsynced line in ``state.wal`` tagged with its store and
+    a global sequence number; snapshots are only rewritten every
+    ``compact_every`` events. Every snapshot records the sequence it folds
+    under ``_wal_seq`` so a crash between writing snapshots and truncating the
+    log never replays an event twice.
+    """
+
+    def __init__(self, path: Path, compact_every: int) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.stores: Dict[str, "_WalStore"] = {}
+        self._compact_every = max(1, int(compact_every))
+        self._seq = 0
+        self._pending = 0
+
+    def store(
+        self,
+        path: Path,
+        default: Dict[str, Any],
+        apply: Callable[[Dict[str, Any], Dict[str, Any]], None],
+        store_cls: Optional[Type["_WalStore"]] = None,
+    ) -> "_WalStore":
+        store = (store_cls or _WalStore)(self, path, default, apply)
+        self.stores[store.name] = store
+        return store
+
+    def load(self) -> None:
+        for store in self.stores.values():
+            store.load_snapshot()
+            self._seq = max(self._seq, store.seq)
+        if not self.path.exists():
+            return
+        with self.path.open("rb") as fh:
+            for line in fh:
+                try:
+                    event = _json_loads(line)
+                except ValueError:
+                    # A torn tail line means the process died mid-append; nothing after it was acknowledged.
+                    logger.warning("Ignoring truncated WAL record in %s", self.path)
+                    break
+                seq = int(event.get("seq") or 0)
+                self._seq = max(self._seq, seq)
+                store = self.stores.get(str(event.get("store") or ""))
+                if store is None or seq <= store.seq:
+                    continue
+                store.apply(event)
+                self._pending += 1
+        if self._pending:
+            logger.info("Replayed %s WAL events from %s", self._pending, self.path.name)
+
+    def append(self, store: "_WalStore", event: Dict[str, Any]) -> None:
+        self._commit([(store, event)])
+
+    @contextmanager
+    def batch(self) -> Iterator["_JournalBatch"]:
+        """Collect the writes of one request and commit them with a single write+fsync.
+
+        Nothing is written or applied if the block raises.
+        """
+        tx = _JournalBatch()
+        yield tx
+        self._commit(tx.events)
+
+    def _commit(self, events: List[Tuple["_WalStore", Dict[str, Any]]]) -> None:
+        if not events:
+            return
+        with self.lock:
+            records = [
+                (store, {**event, "store": store.name, "seq": self._seq + offset})
+                for offset, (store, event) in enumerate(events, start=1)
+            ]
+            payload = b"".join(_json_dumps(record) + b"\n" for _, record in records)
+            with self.path.open("ab") as fh:
+                fh.write(payload)
+                fh.flush()
+                os.fsync(fh.fileno())
+            self._seq += len(records)
+            for store, record in records:
+                store.apply(record)
+            self._pending += len(records)
+            if self._pending >= self._compact_every:
+                self._compact()
+
+    def _compact(self) -> None:
+        for store in self.stores.values():
+            store.save_snapshot(self._seq)
+        self.path.write_bytes(b"")
+        self._pending = 0
+        _debug("WAL compacted", seq=self._seq, stores=len(self.stores))
+
+
+class _JournalBatch:
+    def __init__(self) -> None:
+        self.events: List[Tuple["_WalStore", Dict[str, Any]]] = []
+
+    def append(self, store: "_WalStore", event: Dict[str, Any]) -> None:
+        self.events.append((store, event))
+
+
+class _WalStore:
+    """JSON snapshot kept hot in memory; mutations go through the shared journal.
+
+    ``lock`` only guards the in-memory dict, so readers never wait on the
+    journal's disk writes.
+    """
+
+    def __init__(
+        self,
+        journal: _StateJournal,
+        path: Path,
+        default: Dict[str, Any],
+        apply: Callable[[Dict[str, Any], Dict[str, Any]], None],
+    ) -> None:
+        self.journal = journal
+        self.path = path
+        self.name = path.stem
+        self._default = default
+        self._apply = apply
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.data: Dict[str, Any] = copy.deepcopy(default)
+
+    def load_snapshot(self) -> None:
+        self.data = _load_json(self.path, copy.deepcopy(self._default))
+        self.seq = int(self.data.pop("_wal_seq", 0) or 0)
+
+    def save_snapshot(self, seq: int) -> None:
+        # Copy under the lock, write outside it: compaction must not block readers either.
+        with self.lock:
+            snapshot = {**copy.deepcopy(self.data), "_wal_seq": seq}
+        _save_json(self.path, snapshot)
+        self.seq = seq
+
+    def apply(self, event: Dict[str, Any]) -> None:
+        with self.lock:
+            self._apply(self.data, event)
+
+    def append(self, event: Dict[str, Any]) -> None:
+        self.journal.append(self, event)
+
+    def read(self) -> Dict[str, Any]:
+        with self.lock:
+            return copy.deepcopy(self.data)
+
+
+class _ConversationStore(_WalStore):
+    """Conversation store with O(1) lookups: normalized user texts per user and chat_id -> user.
+
+    Both indexes are derived data: they are never persisted and are rebuilt
+    from the messages whenever the snapshot is loaded. The seen texts are the
+    user messages of the current history window, so the repeat check gives the
+    same answer before and after a restart.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.normalized_seen: Dict[str, Set[str]] = {}
+        self.chat_to_user: Dict[int, str] = {}
+        super().__init__(*args, **kwargs)
+
+    def load_snapshot(self) -> None:
+        super().load_snapshot()
+        with self.lock:
+            self.normalized_seen = {}
+            self.chat_to_user = {}
+            for user_key, user_entry in self.data.get("users", {}).items():
+                self._index(user_key, user_entry.get("messages", []))
+
+    def apply(self, event: Dict[str, Any]) -> None:
+        super().apply(event)
+        with self.lock:
+            user_key = str(event["user_id"])
+            self._index(user_key, self.data["users"][user_key]["messages"])
+
+    def _index(self, user_key: str, messages: Iterable[Dict[str, Any]]) -> None:
+        # Rebuilt from the (capped) window on every write, so it is bounded by max_history_messages.
+        seen = self.normalized_seen[user_key] = set()
+        for message in messages:
+            chat_id = message.get("chat_id")
+            if chat_id is not None:
+                # First user seen in a chat keeps it, as the former linear scan over users did.
+                self.chat_to_user.setdefault(chat_id, user_key)
+            normalized = message.get("normalized")
+            if message.get("role") == "user" and normalized:
+                seen.add(normalized)
+
+    def user_for_chat(self, chat_id: int) -> Optional[str]:
+        return self.chat_to_user.get(chat_id)
+
+    def has_seen(self, user_key: str, normalized: str) -> bool:
+        return normalized in self.normalized_seen.get(user_key, ())
+
+
+class _BlockedUsersStore(_WalStore):
+    """Blocked-users store with a hash set mirror; the JSON snapshot keeps its list form."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.ids: Set[int] = set()
+        super().__init__(*args, **kwargs)
+
+    def load_snapshot(self) -> None:
+        super().load_snapshot()
+        with self.lock:
+            self.ids = set(self.data.get("blocked", []))
+
+    def apply(self, event: Dict[str, Any]) -> None:
+        super().apply(event)
+        with self.lock:
+            self.ids.add(event["item"])
+
+    def is_blocked(self, user_id: int) -> bool:
+        return user_id in self.ids
+
+
+def _apply_conversation_event(data: Dict[str, Any], event: Dict[str, Any]) -> None:
+    users = data.setdefault("users", {})
+    user_entry = users.setdefault(
+        str(event["user_id"]),
+        {"messages": [], "last_bot_message_id": None, "display_name": event.get("display_name")},
+    )
+    if "display_name" in event:
+        user_entry["display_name"] = event["display_name"]
+    messages = user_entry.setdefault("messages", [])
+    messages.extend(event.get("messages", []))
+    # Rolling window: keeps memory and snapshot size per user constant.
+    if len(messages) > SETTINGS.max_history_messages:
+        del messages[: -SETTINGS.max_history_messages]
+    if "last_bot_message_id" in event:
+        user_entry["last_bot_message_id"] = event["last_bot_message_id"]
+
 
+def _list_appender(key: str) -> Callable[[Dict[str, Any], Dict[str, Any]], None]:
+    def _apply(data: Dict[str, Any], event: Dict[str, Any]) -> None:
+        data.setdefault(key, []).append(event["item"])
 
-for file_path, fallback in [
-    (CONVERSATIONS_PATH, {"users": {}}),
-    (PENDING_ISSUES_PATH, {"issues": []}),
-    (MANUAL_ACTIONS_PATH, {"actions": []}),
-    (BLOCKED_USERS_PATH, {"blocked": []}),
-]:
-    if not file_path.exists():
-        _save_json(file_path, fallback)
+    return _apply
 
 
 class Settings:
@@ -74,6 +336,9 @@ class Settings:
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-5-mini")
     bot_response_delay_seconds: int = int(os.getenv("BOT_RESPONSE_DELAY_SECONDS", "8"))
+    wal_compact_events: int = int(os.getenv("WAL_COMPACT_EVENTS", "500"))
+    max_history_messages: int = max(1, int(os.getenv("MAX_HISTORY_MESSAGES", "64")))
+    openai_max_concurrency: int = max(1, int(os.getenv("OPENAI_MAX_CONCURRENCY", "8")))
     request_timeout_seconds: int = int(os.getenv("REQUEST_TIMEOUT_SECONDS", "30"))
     support_telegram_url: str = os.getenv("SUPPORT_TELEGRAM_URL", DEFAULT_SUPPORT_TELEGRAM_URL).strip()
     support_marketing_url: str = os.getenv("SUPPORT_MARKETING_URL", DEFAULT_SUPPORT_MARKETING_URL).strip()
@@ -81,12 +346,76 @@ class Settings:
 
 
 SETTINGS = Settings()
-APP = FastAPI(title="Answers Agent", version="0.1.0")
+STATE_JOURNAL = _StateJournal(STATE_WAL_PATH, SETTINGS.wal_compact_events)
+CONVERSATIONS = STATE_JOURNAL.store(
+    CONVERSATIONS_PATH,
+    {"users": {}},
+    _apply_conversation_event,
+    store_cls=_ConversationStore,
+)
+PENDING_ISSUES = STATE_JOURNAL.store(PENDING_ISSUES_PATH, {"issues": []}, _list_appender("issues"))
+MANUAL_ACTIONS = STATE_JOURNAL.store(MANUAL_ACTIONS_PATH, {"actions": []}, _list_appender("actions"))
+BLOCKED_USERS = STATE_JOURNAL.store(
+    BLOCKED_USERS_PATH,
+    {"blocked": []},
+    _list_appender("blocked"),
+    store_cls=_BlockedUsersStore,
+)
+STATE_JOURNAL.load()
+TELEGRAM_API_BASE_URL = "https://api.telegram.org"
+OPENAI_API_BASE_URL = "https://api.openai.com"
+HTTP_CLIENT_BASE_URLS = {
+    "telegram_client": TELEGRAM_API_BASE_URL,
+    "openai_client": OPENAI_API_BASE_URL,
+}
+
+
+def _new_http_client(base_url: str) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url,
+        timeout=SETTINGS.request_timeout_seconds,
+        limits=httpx.Limits(max_keepalive_connections=20),
+    )
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # One pooled client per upstream host so webhooks reuse keep-alive connections.
+    for name, base_url in HTTP_CLIENT_BASE_URLS.items():
+        setattr(app.state, name, _new_http_client(base_url))
+    app.state.openai_semaphore = asyncio.Semaphore(SETTINGS.openai_max_concurrency)
+    try:
+        yield
+    finally:
+        for name in HTTP_CLIENT_BASE_URLS:
+            client = getattr(app.state, name, None)
+            setattr(app.state, name, None)
+            if client is not None:
+                await client.aclose()
+
+
+APP = FastAPI(title="Answers Agent", version="0.1.0", lifespan=_lifespan)
 SUPPORT_GUIDANCE = SupportGuidanceConfig(
     telegram_support_url=SETTINGS.support_telegram_url or DEFAULT_SUPPORT_TELEGRAM_URL,
     marketing_url=SETTINGS.support_marketing_url or DEFAULT_SUPPORT_MARKETING_URL,
     user_url_prefix=SETTINGS.support_user_url_prefix or DEFAULT_SUPPORT_USER_URL_PREFIX,
 )
+# SUPPORT_GUIDANCE and the credentials are fixed after startup, so the prompt and headers are built once.
+_SYSTEM_PROMPT = (
+    "You are a Telegram support assistant. "
+    "Reply in English. "
+    f"If you are unsure, reply exactly: '{FALLBACK_REPLY}' "
+    "Be brief and helpful.\n\n"
+    "Mandatory policies:\n"
+    + "\n".join(f"- {line}" for line in build_prompt_policy_lines(SUPPORT_GUIDANCE))
+)
+_OPENAI_HEADERS = {
+    "Authorization": f"Bearer {SETTINGS.openai_api_key}",
+    "Content-Type": "application/json",
+}
+_OPENAI_INFLIGHT: Dict[bytes, "asyncio.Future[Optional[str]]"] = {}
+GUIDELINE_FILES = ("behavior.md", "escalation.md")
+_GUIDELINES_CACHE: Dict[str, Tuple[int, str]] = {}
 logger.info(
     "Answers agent server initialized (has_bot_token=%s, has_webhook_secret=%s, has_openai_key=%s, support_telegram_url=%s)",
     bool(SETTINGS.telegram_bot_token),
@@ -103,20 +432,32 @@ def _debug(message: str, **meta: Any) -> None:
 
 
 def _now_ts() -> int:
-    return int(time.time())
+    # Integer clock read; skips the float round-trip of int(time.time()).
+    return time.time_ns() // 1_000_000_000
+
+
+def _normalize_text(text: str, lowered: Optional[str] = None) -> str:
+    collapsed = " ".join((text.lower() if lowered is None else lowered).split())
+    if collapsed.isascii():
+        return collapsed.translate(_ASCII_PUNCT_TABLE)
+    return _PUNCT_RE.sub("", collapsed)
 
 
-def _normalize_text(text: str) -> str:
-    cleaned = re.sub(r"\s+", " ", text.lower().strip())
-    return re.sub(r"[^\w\sáéíóúüñ¿?¡!]", "", cleaned)
+def _looks_like_spam(text: str, lowered: Optional[str] = None) -> bool:
+    return is_spam_like_message(text, lowered=lowered)
 
 
-def _looks_like_spam(text: str) -> bool:
-    return is_spam_like_message(text)
+def _contains_sensitive_request(text: str, lowered: Optional[str] = None) -> bool:
+    return contains_sensitive_material(text, lowered=lowered)
 
 
-def _contains_sensitive_request(text: str) -> bool:
-    return contains_sensitive_material(text)
+def _http_client(name: str) -> httpx.AsyncClient:
+    client = getattr(APP.state, name, None)
+    if client is None:
+        # Fallback when the app runs without lifespan (e.g. embedded test clients).
+        client = _new_http_client(HTTP_CLIENT_BASE_URLS[name])
+        setattr(APP.state, name, client)
+    return client
 
 
 def _resolve_user_display_name(from_user: Dict[str, Any]) -> str:
@@ -135,7 +476,7 @@ def _resolve_user_display_name(from_user: Dict[str, Any]) -> str:
 async def _telegram_request(method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
     if not SETTINGS.telegram_bot_token:
         raise HTTPException(status_code=500, detail="TELEGRAM_BOT_TOKEN is not configured")
-    url = f"https://api.telegram.org/bot{SETTINGS.telegram_bot_token}/{method}"
+    url = f"/bot{SETTINGS.telegram_bot_token}/{method}"
     _debug(
         "Telegram API call",
         method=method,
@@ -143,10 +484,13 @@ async def _telegram_request(method: str, payload: Dict[str, Any]) -> Dict[str, A
         has_message_id=bool(payload.get("message_id")),
     )
     try:
-        async with httpx.AsyncClient(timeout=SETTINGS.request_timeout_seconds) as client:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            return response.json()
+        response = await _http_client("telegram_client").post(
+            url,
+            content=_json_dumps(payload),
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+        return _json_loads(response.content)
     except Exception:
         logger.exception("Telegram API request failed (method=%s, chat_id=%s)", method, payload.get("chat_id"))
         raise
@@ -157,85 +501,108 @@ async def _openai_response(messages: List[Dict[str, str]]) -> Optional[str]:
         _debug("OpenAI not configured; using local fallback")
         return None
 
-    policy_lines = build_prompt_policy_lines(SUPPORT_GUIDANCE)
-    system_prompt = (
-        "You are a Telegram support assistant. "
-        "Reply in English. "
-        "If you are unsure, reply exactly: 'Give me a second to check this.' "
-        "Be brief and helpful.\n\n"
-        "Mandatory policies:\n"
-        + "\n".join(f"- {line}" for line in policy_lines)
-    )
-
     payload = {
         "model": SETTINGS.openai_model,
         "input": [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": _SYSTEM_PROMPT},
             *[{"role": m["role"], "content": m["content"]} for m in messages],
         ],
     }
-    headers = {
-        "Authorization": f"Bearer {SETTINGS.openai_api_key}",
-        "Content-Type": "application/json",
-    }
+    content = _json_dumps(payload)
 
+    # Identical prompts already in flight (e.g. Telegram retrying a slow webhook) share one upstream call.
+    inflight = _OPENAI_INFLIGHT.get(content)
+    if inflight is not None:
+        _debug("Joining in-flight OpenAI request", messages_count=len(messages))
+        return await asyncio.shield(inflight)
+
+    future: "asyncio.Future[Optional[str]]" = asyncio.get_running_loop().create_future()
+    _OPENAI_INFLIGHT[content] = future
     try:
-        _debug("Requesting response from OpenAI", messages_count=len(messages), model=SETTINGS.openai_model)
-        async with httpx.AsyncClient(timeout=SETTINGS.request_timeout_seconds) as client:
-            res = await client.post("https://api.openai.com/v1/responses", headers=headers, json=payload)
-            res.raise_for_status()
-            body = res.json()
-            output_text = body.get("output_text", "").strip()
-            if output_text:
-                _debug("OpenAI responded", reply_chars=len(output_text))
-                return output_text
+        reply = await _post_openai_response(content, len(messages))
+    except BaseException:
+        # If the leading call fails or is cancelled, joiners get None and fall back locally.
+        future.set_result(None)
+        raise
+    finally:
+        _OPENAI_INFLIGHT.pop(content, None)
+    future.set_result(reply)
+    return reply
+
+
+async def _post_openai_response(content: bytes, messages_count: int) -> str:
+    semaphore = getattr(APP.state, "openai_semaphore", None)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(SETTINGS.openai_max_concurrency)
+        APP.state.openai_semaphore = semaphore
+
+    try:
+        async with semaphore:
+            _debug("Requesting response from OpenAI", messages_count=messages_count, model=SETTINGS.openai_model)
+            res = await _http_client("openai_client").post(
+                "/v1/responses",
+                headers=_OPENAI_HEADERS,
+                content=content,
+            )
+        res.raise_for_status()
+        body = _json_loads(res.content)
+        output_text = body.get("output_text", "").strip()
+        if output_text:
+            _debug("OpenAI responded", reply_chars=len(output_text))
+            return output_text
     except Exception:
         logger.exception("OpenAI /v1/responses request failed; using fallback")
 
     # Defensive fallback if OpenAI fails or returns no usable text.
-    return "Give me a second to check this."
+    return FALLBACK_REPLY
 
 
 def _append_manual_action(action_type: str, user_id: int, chat_id: int, context: Dict[str, Any]) -> None:
-    data = _load_json(MANUAL_ACTIONS_PATH, {"actions": []})
-    data["actions"].append(
+    MANUAL_ACTIONS.append(
         {
-            "id": str(uuid.uuid4()),
-            "type": action_type,
-            "user_id": user_id,
-            "chat_id": chat_id,
-            "context": context,
-            "created_at": _now_ts(),
-            "status": "pending",
+            "item": {
+                "id": secrets.token_hex(16),
+                "type": action_type,
+                "user_id": user_id,
+                "chat_id": chat_id,
+                "context": context,
+                "created_at": _now_ts(),
+                "status": "pending",
+            }
         }
     )
-    _save_json(MANUAL_ACTIONS_PATH, data)
     logger.info("Manual action created (type=%s, user_id=%s, chat_id=%s)", action_type, user_id, chat_id)
 
 
-def _append_pending_issue(user_id: int, chat_id: int, summary: str, conversation: List[Dict[str, Any]]) -> None:
-    data = _load_json(PENDING_ISSUES_PATH, {"issues": []})
-    data["issues"].append(
+def _append_pending_issue(
+    user_id: int,
+    chat_id: int,
+    summary: str,
+    conversation: List[Dict[str, Any]],
+    tx: Optional[_JournalBatch] = None,
+    created_at: Optional[int] = None,
+) -> None:
+    (tx or STATE_JOURNAL).append(
+        PENDING_ISSUES,
         {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "chat_id": chat_id,
-            "summary": summary,
-            "conversation": conversation,
-            "status": "pending_review",
-            "created_at": _now_ts(),
-        }
+            "item": {
+                "id": secrets.token_hex(16),
+                "user_id": user_id,
+                "chat_id": chat_id,
+                "summary": summary,
+                "conversation": conversation,
+                "status": "pending_review",
+                "created_at": created_at or _now_ts(),
+            }
+        },
     )
-    _save_json(PENDING_ISSUES_PATH, data)
     logger.info("Pending issue recorded (user_id=%s, chat_id=%s, summary=%s)", user_id, chat_id, summary)
 
 
 async def _handle_spam(user_id: int, chat_id: int) -> None:
     logger.warning("Message flagged as spam (user_id=%s, chat_id=%s)", user_id, chat_id)
-    blocked = _load_json(BLOCKED_USERS_PATH, {"blocked": []})
-    if user_id not in blocked["blocked"]:
-        blocked["blocked"].append(user_id)
-        _save_json(BLOCKED_USERS_PATH, blocked)
+    if not BLOCKED_USERS.is_blocked(user_id):
+        BLOCKED_USERS.append({"item": user_id})
 
     try:
         await _telegram_request("banChatMember", {"chat_id": chat_id, "user_id": user_id})
@@ -282,6 +649,47 @@ async def _delayed_reply(chat_id: int, text: str, edit_message_id: Optional[int]
     return msg.get("message_id")
 
 
+async def _deliver_reply(user_id: int, chat_id: int, reply: str) -> None:
+    try:
+        bot_message_id = await _delayed_reply(chat_id, reply)
+    except Exception:
+        logger.warning("Scheduled reply could not be delivered (chat_id=%s, user_id=%s)", chat_id, user_id)
+        return
+
+    user_key = str(user_id)
+    ts = _now_ts()
+    assistant_message = {
+        "role": "assistant",
+        "content": reply,
+        "chat_id": chat_id,
+        "message_id": bot_message_id,
+        "timestamp": ts,
+    }
+    # The user message was journaled when the webhook was accepted, so history already ends with it.
+    history = CONVERSATIONS.data["users"].get(user_key, {}).get("messages", [])
+    # One journal commit (single fsync) for the reply and its follow-up issue.
+    with STATE_JOURNAL.batch() as tx:
+        tx.append(
+            CONVERSATIONS,
+            {
+                "user_id": user_key,
+                "last_bot_message_id": bot_message_id,
+                "messages": [assistant_message],
+            },
+        )
+        reply_lower = reply.lower()
+        if "dev team" in reply_lower or "equipo" in reply_lower:
+            _append_pending_issue(
+                user_id,
+                chat_id,
+                "User issue pending follow-up",
+                [*history[-11:], assistant_message],
+                tx=tx,
+                created_at=ts,
+            )
+    _debug("Scheduled reply delivered", chat_id=chat_id, user_id=user_id, bot_message_id=bot_message_id)
+
+
 class TelegramWebhookPayload(BaseModel):
     update_id: Optional[int] = None
     message: Optional[Dict[str, Any]] = None
@@ -300,7 +708,11 @@ def _ensure_webhook_authorized(request: Request) -> None:
         return
 
     provided = request.headers.get("x-telegram-bot-api-secret-token", "").strip()
-    if provided != expected:
+    try:
+        authorized = secrets.compare_digest(provided.encode("utf-8"), expected.encode("utf-8"))
+    except UnicodeEncodeError:
+        authorized = False
+    if not authorized:
         logger.warning("Webhook rejected due to invalid secret (path=%s)", request.url.path)
         raise HTTPException(status_code=401, detail="Unauthorized webhook")
 
@@ -318,14 +730,27 @@ def health() -> Dict[str, Any]:
     }
 
 
+def _read_guideline(path: Path) -> str:
+    # A stat is enough to validate the cached text; the file is only re-read after an edit.
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        _GUIDELINES_CACHE.pop(path.name, None)
+        return ""
+    cached = _GUIDELINES_CACHE.get(path.name)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    text = path.read_text(encoding="utf-8")
+    _GUIDELINES_CACHE[path.name] = (mtime_ns, text)
+    return text
+
+
 @APP.get("/answers_agent/guidelines")
 def get_guidelines() -> Dict[str, str]:
-    files = ["behavior.md", "escalation.md"]
     result: Dict[str, str] = {}
-    for f in files:
-        path = GUIDELINES_DIR / f
-        result[f] = path.read_text(encoding="utf-8") if path.exists() else ""
-    _debug("Guidelines requested", files=len(files))
+    for f in GUIDELINE_FILES:
+        result[f] = _read_guideline(GUIDELINES_DIR / f)
+    _debug("Guidelines requested", files=len(GUIDELINE_FILES))
     return result
 
 
@@ -341,7 +766,8 @@ async def telegram_webhook(
     if not text:
         _debug("Webhook ignored due to non-text message")
         return {"ok": True, "ignored": "non-text-message"}
-    if is_low_context_greeting(text):
+    text_lower = text.lower()
+    if is_low_context_greeting(text, lowered=text_lower):
         # Avoid unnecessary calls when there is no real support context.
         _debug("Webhook ignored due to low-context greeting")
         return {"ok": True, "ignored": "low-context-greeting"}
@@ -357,36 +783,33 @@ async def telegram_webhook(
     user_name = _resolve_user_display_name(from_user)
     _debug("Webhook received", chat_id=chat_id, user_id=user_id, user_name=user_name, text_chars=len(text))
 
-    blocked = _load_json(BLOCKED_USERS_PATH, {"blocked": []})
-    if user_id in blocked.get("blocked", []):
+    if BLOCKED_USERS.is_blocked(user_id):
         _debug("Blocked user; message ignored", user_id=user_id, chat_id=chat_id)
         return {"ok": True, "ignored": "blocked-user"}
 
-    if _looks_like_spam(text):
+    if _looks_like_spam(text, lowered=text_lower):
         background_tasks.add_task(_handle_spam, user_id, chat_id)
         _debug("Spam detected; block task queued in background", user_id=user_id, chat_id=chat_id)
         return {"ok": True, "action": "spam-detected"}
 
-    conversations = _load_json(CONVERSATIONS_PATH, {"users": {}})
-    users = conversations.setdefault("users", {})
-    user_entry = users.setdefault(str(user_id), {"messages": [], "last_bot_message_id": None, "display_name": user_name})
-    user_entry["display_name"] = user_name
+    user_key = str(user_id)
+    history = CONVERSATIONS.data["users"].get(user_key, {}).get("messages", [])
 
-    normalized = _normalize_text(text)
-    repeated = any(m.get("normalized") == normalized and m.get("role") == "user" for m in user_entry["messages"])
-    _debug("Message analyzed", repeated=repeated, history_messages=len(user_entry["messages"]))
+    normalized = _normalize_text(text, lowered=text_lower)
+    repeated = CONVERSATIONS.has_seen(user_key, normalized)
+    _debug("Message analyzed", repeated=repeated, history_messages=len(history))
 
-    user_entry["messages"].append(
-        {
-            "role": "user",
-            "content": text,
-            "normalized": normalized,
-            "chat_id": chat_id,
-            "timestamp": _now_ts(),
-            "name": user_name,
-        }
-    )
+    user_message = {
+        "role": "user",
+        "content": text,
+        "normalized": normalized,
+        "chat_id": chat_id,
+        "timestamp": _now_ts(),
+        "name": user_name,
+    }
 
+    # Only model output needs the sensitive-material scan; fixed and workflow replies are ours.
+    reply_from_llm = False
     if repeated:
         reply = "The dev team is checking."
         _debug("Repeat-message fallback applied", chat_id=chat_id)
@@ -396,34 +819,23 @@ async def telegram_webhook(
             reply = workflow_reply
             _debug("Support-workflow reply applied", chat_id=chat_id)
         else:
-            context_window = user_entry["messages"][-8:]
+            context_window = [*history[-7:], user_message]
             model_messages = [{"role": m["role"], "content": m["content"]} for m in context_window if m["role"] in {"user", "assistant"}]
             reply = await _openai_response(model_messages)
+            reply_from_llm = bool(reply) and reply != FALLBACK_REPLY
             if not reply:
-                reply = "Give me a second to check this."
+                reply = FALLBACK_REPLY
                 _debug("OpenAI returned no usable response; fallback applied", chat_id=chat_id)
 
-    if _contains_sensitive_request(reply):
-        reply = "Give me a second to check this."
+    if reply_from_llm and _contains_sensitive_request(reply):
+        reply = FALLBACK_REPLY
         logger.warning("Potentially sensitive response detected; replaced with fallback (chat_id=%s)", chat_id)
 
-    bot_message_id = await _delayed_reply(chat_id, reply)
-    user_entry["last_bot_message_id"] = bot_message_id
-    user_entry["messages"].append(
-        {
-            "role": "assistant",
-            "content": reply,
-            "chat_id": chat_id,
-            "message_id": bot_message_id,
-            "timestamp": _now_ts(),
-        }
-    )
-
-    if "dev team" in reply.lower() or "equipo" in reply.lower():
-        _append_pending_issue(user_id, chat_id, "User issue pending follow-up", user_entry["messages"][-12:])
-
-    _save_json(CONVERSATIONS_PATH, conversations)
-    logger.info("Webhook processed successfully (chat_id=%s, user_id=%s, bot_message_id=%s)", chat_id, user_id, bot_message_id)
+    # Journal the user message before acking, so it survives a failed or lost delivery;
+    # the delayed send and the assistant message run after the response.
+    CONVERSATIONS.append({"user_id": user_key, "display_name": user_name, "messages": [user_message]})
+    background_tasks.add_task(_deliver_reply, user_id, chat_id, reply)
+    logger.info("Webhook processed successfully; reply scheduled (chat_id=%s, user_id=%s)", chat_id, user_id)
     return {"ok": True, "reply": reply}
 
 
@@ -436,22 +848,24 @@ async def manual_respond(input_data: ManualResponseInput) -> Dict[str, Any]:
         edit_message_id=input_data.edit_message_id,
     )
 
-    conversations = _load_json(CONVERSATIONS_PATH, {"users": {}})
-    for user_id, user_entry in conversations.get("users", {}).items():
-        if user_entry.get("messages") and any(msg.get("chat_id") == input_data.chat_id for msg in user_entry["messages"]):
-            user_entry["last_bot_message_id"] = message_id
-            user_entry["messages"].append(
-                {
-                    "role": "assistant",
-                    "content": input_data.text,
-                    "chat_id": input_data.chat_id,
-                    "message_id": message_id,
-                    "timestamp": _now_ts(),
-                    "manual": True,
-                }
-            )
-            break
-    _save_json(CONVERSATIONS_PATH, conversations)
+    user_key = CONVERSATIONS.user_for_chat(input_data.chat_id)
+    if user_key is not None:
+        CONVERSATIONS.append(
+            {
+                "user_id": user_key,
+                "last_bot_message_id": message_id,
+                "messages": [
+                    {
+                        "role": "assistant",
+                        "content": input_data.text,
+                        "chat_id": input_data.chat_id,
+                        "message_id": message_id,
+                        "timestamp": _now_ts(),
+                        "manual": True,
+                    }
+                ],
+            }
+        )
     logger.info("Manual response sent (chat_id=%s, message_id=%s)", input_data.chat_id, message_id)
 
     return {"ok": True, "message_id": message_id}
@@ -459,13 +873,13 @@ async def manual_respond(input_data: ManualResponseInput) -> Dict[str, Any]:
 
 @APP.get("/answers_agent/pending-issues")
 def pending_issues() -> Dict[str, Any]:
-    data = _load_json(PENDING_ISSUES_PATH, {"issues": []})
+    data = PENDING_ISSUES.read()
     _debug("Pending-issues queried", count=len(data.get("issues", [])))
     return data
 
 
 @APP.get("/answers_agent/manual-actions")
 def pending_manual_actions() -> Dict[str, Any]:
-    data = _load_json(MANUAL_ACTIONS_PATH, {"actions": []})
+    data = MANUAL_ACTIONS.read()
     _debug("Manual-actions queried", count=len(data.get("actions", [])))
     return data
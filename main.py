@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import os
@@ -6,12 +7,16 @@ import sys
 import threading
 import time
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Tuple
 
 from fastapi import FastAPI, Request
-from fastapi.responses import RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - depende del entorno local
+    orjson = None
 
 from agents.answers_agent.service import AnswersAgentService
 from agents.discord_agent.service import DiscordAgentService
@@ -73,6 +78,17 @@ def _path_is_within(parent: Path, candidate: Path) -> bool:
         return False
 
 
+def _json_loads(raw: bytes) -> Any:
+    # orjson (C parser) when installed; its JSONDecodeError subclasses json's.
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _json_dumps_pretty(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+
+
 def _load_addon_options() -> Dict[str, Any]:
     """Carga opciones desde DATA_DIR/options.json cuando existe."""
     options_path = DATA_DIR / "options.json"
@@ -80,7 +96,7 @@ def _load_addon_options() -> Dict[str, Any]:
         logger.info("No existe options.json; se usarán variables de entorno o valores por defecto")
         return {}
     try:
-        options = json.loads(options_path.read_text(encoding="utf-8"))
+        options = _json_loads(options_path.read_bytes())
         logger.info("Opciones cargadas desde %s", options_path)
         return options
     except json.JSONDecodeError:
@@ -93,13 +109,15 @@ def _load_addon_options() -> Dict[str, Any]:
 
 ADDON_OPTIONS = _load_addon_options()
 
+# Settings are resolved once at import: ENV (upper-case names) over options.json,
+# both keyed by the lower-case setting name, so each lookup is a single dict.get.
+_ENV_SETTINGS: Dict[str, str] = {key.lower(): value for key, value in os.environ.items() if key == key.upper()}
+_SETTINGS: Dict[str, Any] = {**ADDON_OPTIONS, **_ENV_SETTINGS}
+
 
 def _setting(name: str, default: str = "") -> str:
     """Resuelve configuración priorizando ENV y luego options.json."""
-    env_name = name.upper()
-    if env_name in os.environ:
-        return os.getenv(env_name, default)
-    return str(ADDON_OPTIONS.get(name.lower(), default))
+    return str(_SETTINGS.get(name.lower(), default))
 
 
 _UNCONFIGURED_CREDENTIAL_PLACEHOLDERS = frozenset({"", "false", "none", "null"})
@@ -134,14 +152,9 @@ def _setting_credential_with_aliases(name: str, aliases: list[str]) -> str:
 
 def _setting_values_with_aliases(name: str, aliases: list[str]) -> List[str]:
     """Resolve usable credential values for a canonical key and its aliases."""
-    keys = [name, *aliases]
     values: List[str] = []
-    for key in keys:
-        env_name = key.upper()
-        if env_name in os.environ:
-            value = str(os.getenv(env_name, "")).strip()
-        else:
-            value = str(ADDON_OPTIONS.get(key.lower(), "")).strip()
+    for key in (name, *aliases):
+        value = str(_SETTINGS.get(key.lower(), "")).strip()
         if _is_configured_reader_credential(value) and value not in values:
             values.append(value)
     return values
@@ -149,13 +162,8 @@ def _setting_values_with_aliases(name: str, aliases: list[str]) -> List[str]:
 
 def _setting_is_explicit(name: str, aliases: list[str] | None = None) -> bool:
     """Devuelve True si el usuario ha definido el setting por ENV u options.json."""
-    keys = [name, *(aliases or [])]
-    for key in keys:
-        env_name = key.upper()
-        if env_name in os.environ:
-            return True
-        raw = ADDON_OPTIONS.get(key.lower(), "")
-        if str(raw or "").strip():
+    for key in (name, *(aliases or [])):
+        if key.lower() in _ENV_SETTINGS or str(_SETTINGS.get(key.lower(), "") or "").strip():
             return True
     return False
 
@@ -170,32 +178,25 @@ def _setting_int(name: str, default: int) -> int:
 
 
 def _normalize_email_list(raw: Any) -> List[str]:
-    if raw is None:
-        return []
     if isinstance(raw, list):
-        return [str(item).strip().lower() for item in raw if str(item).strip()]
-    if isinstance(raw, str):
-        return [item.strip().lower() for item in raw.split(",") if item.strip()]
-    return []
+        items = raw
+    elif isinstance(raw, str):
+        items = raw.split(",")
+    else:
+        return []
+    normalized: List[str] = []
+    for item in items:
+        value = str(item).strip()
+        if value:
+            normalized.append(sys.intern(value.lower()))
+    return normalized
 
 
 def _setting_email_whitelist(name: str, aliases: list[str]) -> List[str]:
-    env_name = name.upper()
-    if env_name in os.environ:
-        return _normalize_email_list(os.getenv(env_name, ""))
-
-    value = ADDON_OPTIONS.get(name.lower())
-    if value is not None:
-        return _normalize_email_list(value)
-
-    for alias in aliases:
-        alias_env = alias.upper()
-        if alias_env in os.environ:
-            return _normalize_email_list(os.getenv(alias_env, ""))
-        value = ADDON_OPTIONS.get(alias.lower())
+    for key in (name, *aliases):
+        value = _SETTINGS.get(key.lower())
         if value is not None:
             return _normalize_email_list(value)
-
     return []
 
 
@@ -212,16 +213,12 @@ def _normalize_string_list(raw: Any) -> List[str]:
 
 def _setting_string_list(name: str) -> List[str]:
     """Read an allow-list from ENV or add-on options without leaking its values."""
-    env_name = name.upper()
-    if env_name in os.environ:
-        return _normalize_string_list(os.getenv(env_name, ""))
-    return _normalize_string_list(ADDON_OPTIONS.get(name.lower()))
+    return _normalize_string_list(_SETTINGS.get(name.lower()))
 
 
 def _setting_bool(name: str, default: bool = False) -> bool:
     """Read a boolean option with conservative false-by-default behavior."""
-    env_name = name.upper()
-    raw: Any = os.getenv(env_name) if env_name in os.environ else ADDON_OPTIONS.get(name.lower(), default)
+    raw: Any = _SETTINGS.get(name.lower(), default)
     if isinstance(raw, bool):
         return raw
     if raw is None:
@@ -250,6 +247,9 @@ WORKDAY_WEBHOOK_FINAL_URL = _setting_with_aliases(
 )
 WORKDAY_WEBHOOK_START_BREAK_URL = _setting("workday_webhook_start_break_url", "")
 WORKDAY_WEBHOOK_STOP_BREAK_URL = _setting("workday_webhook_stop_break_url", "")
+WORKDAY_DEBUG_HTML = _setting_bool("workday_debug_html", False)
+WORKDAY_FAST_MODE = _setting_bool("workday_fast_mode", False)
+WORKDAY_SNAPSHOT_LEVEL = _setting("workday_snapshot_level", "all")
 
 # Email agent (email + IMAP)
 EMAIL_OPENAI_API_KEY = _setting_with_aliases("email_openai_api_key", ["openai_api_key"], "")
@@ -415,7 +415,7 @@ def _answers_dir_has_meaningful_data(path: Path) -> bool:
         if not file_path.exists():
             continue
         try:
-            payload = json.loads(file_path.read_text(encoding="utf-8"))
+            payload = _json_loads(file_path.read_bytes())
         except Exception:
             return True
         if payload != default_payload:
@@ -520,6 +520,9 @@ workday_service = WorkdayAgentService(
     webhook_start_break_url=WORKDAY_WEBHOOK_START_BREAK_URL,
     webhook_stop_break_url=WORKDAY_WEBHOOK_STOP_BREAK_URL,
     logger=logger.getChild("workday_agent"),
+    debug_html_snapshots=WORKDAY_DEBUG_HTML,
+    fast_mode=WORKDAY_FAST_MODE,
+    snapshot_level=WORKDAY_SNAPSHOT_LEVEL,
 )
 
 email_service = EmailAgentService(
@@ -549,6 +552,7 @@ class AgentModule:
     router_factory: Callable[[], Any]
     health_factory: Callable[[], Dict[str, Any]]
     startup_tasks: Tuple[Tuple[str, Callable[[], None]], ...] = ()
+    shutdown_tasks: Tuple[Tuple[str, Callable[[], None]], ...] = ()
 
 
 issue_service = IssueAgentService(
@@ -610,9 +614,14 @@ answers_service = AnswersAgentService(
     logger=logger.getChild("answers_agent"),
 )
 
-def _workday_missing_required_config() -> List[str]:
-    missing: List[str] = []
-    required = {
+def _missing_settings(required: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(key for key, value in required.items() if not str(value).strip())
+
+
+# Settings are fixed for the life of the process, so the missing-config checks
+# used by /health, routers and scheduler loops are evaluated once.
+_WORKDAY_MISSING_CONFIG = _missing_settings(
+    {
         "job_secret": JOB_SECRET,
         "workday_target_url": WORKDAY_TARGET_URL,
         "workday_webhook_start_url": WORKDAY_WEBHOOK_START_URL,
@@ -620,92 +629,106 @@ def _workday_missing_required_config() -> List[str]:
         "workday_webhook_start_break_url": WORKDAY_WEBHOOK_START_BREAK_URL,
         "workday_webhook_stop_break_url": WORKDAY_WEBHOOK_STOP_BREAK_URL,
     }
-    for key, value in required.items():
-        if not str(value).strip():
-            missing.append(key)
-    return missing
-
-
-def _email_missing_required_config() -> List[str]:
-    missing: List[str] = []
-    required = {
+)
+_EMAIL_MISSING_CONFIG = _missing_settings(
+    {
         "email_openai_api_key": EMAIL_OPENAI_API_KEY,
         "email_imap_email": EMAIL_IMAP_EMAIL,
         "email_imap_password": EMAIL_IMAP_PASSWORD,
     }
-    for key, value in required.items():
-        if not str(value).strip():
-            missing.append(key)
-    return missing
+)
+_ISSUE_MISSING_CONFIG = _missing_settings(
+    {
+        "issue_repo_base_url": ISSUE_REPO_BASE_URL,
+        "issue_openai_api_key": ISSUE_OPENAI_API_KEY,
+    }
+)
+
+
+def _workday_missing_required_config() -> List[str]:
+    return list(_WORKDAY_MISSING_CONFIG)
+
+
+def _email_missing_required_config() -> List[str]:
+    return list(_EMAIL_MISSING_CONFIG)
+
+
+# /health fragments built from settings fixed at import; the payload functions
+# only add runtime values and fresh copies of mutable fields.
+_WORKDAY_STATIC_HEALTH: Dict[str, Any] = {
+    "config_valid": not _WORKDAY_MISSING_CONFIG,
+    "has_target_url": bool(WORKDAY_TARGET_URL),
+    "has_sso_email": bool(WORKDAY_SSO_EMAIL),
+    "has_webhook_start": bool(WORKDAY_WEBHOOK_START_URL),
+    "has_webhook_final": bool(WORKDAY_WEBHOOK_FINAL_URL),
+    "has_webhook_start_break": bool(WORKDAY_WEBHOOK_START_BREAK_URL),
+    "has_webhook_stop_break": bool(WORKDAY_WEBHOOK_STOP_BREAK_URL),
+    "timezone": WORKDAY_TIMEZONE,
+    "runtime_state_file": str(workday_service.runtime_state_path),
+    "runtime_events_file": str(workday_service.runtime_events_path),
+}
 
 
 def _workday_health_payload() -> Dict[str, Any]:
     return {
-        "config_valid": len(_workday_missing_required_config()) == 0,
-        "missing_required_config": _workday_missing_required_config(),
-        "has_target_url": bool(WORKDAY_TARGET_URL),
-        "has_sso_email": bool(WORKDAY_SSO_EMAIL),
-        "has_webhook_start": bool(WORKDAY_WEBHOOK_START_URL),
-        "has_webhook_final": bool(WORKDAY_WEBHOOK_FINAL_URL),
-        "has_webhook_start_break": bool(WORKDAY_WEBHOOK_START_BREAK_URL),
-        "has_webhook_stop_break": bool(WORKDAY_WEBHOOK_STOP_BREAK_URL),
-        "timezone": WORKDAY_TIMEZONE,
+        **_WORKDAY_STATIC_HEALTH,
+        "missing_required_config": list(_WORKDAY_MISSING_CONFIG),
         "runtime_phase": workday_service.get_status().get("phase"),
-        "runtime_state_file": str(workday_service.runtime_state_path),
-        "runtime_events_file": str(workday_service.runtime_events_path),
     }
 
 
+_EMAIL_STATIC_HEALTH: Dict[str, Any] = {
+    "config_valid": not _EMAIL_MISSING_CONFIG,
+    "has_openai_api_key": bool(EMAIL_OPENAI_API_KEY),
+    "has_openai_model": bool(EMAIL_OPENAI_MODEL),
+    "has_imap_email": bool(EMAIL_IMAP_EMAIL),
+    "has_imap_password": bool(EMAIL_IMAP_PASSWORD),
+    "has_imap_credentials": bool(EMAIL_IMAP_EMAIL and EMAIL_IMAP_PASSWORD),
+    "imap_host": EMAIL_IMAP_HOST,
+    "has_smtp_email": bool(EMAIL_SMTP_EMAIL),
+    "has_smtp_password": bool(EMAIL_SMTP_PASSWORD),
+    "has_smtp_credentials": bool(EMAIL_SMTP_EMAIL and EMAIL_SMTP_PASSWORD),
+    "smtp_host": EMAIL_SMTP_HOST,
+    "smtp_port": EMAIL_SMTP_PORT,
+    "default_from_email": EMAIL_DEFAULT_FROM,
+    "default_cc_email": EMAIL_DEFAULT_CC,
+    "signature_assets_dir": EMAIL_SIGNATURE_ASSETS_DIR,
+    "support_telegram_url": SUPPORT_TELEGRAM_URL,
+    "support_marketing_url": SUPPORT_MARKETING_URL,
+    "support_user_url_prefix": SUPPORT_USER_URL_PREFIX,
+    "has_webhook_notify": bool(EMAIL_WEBHOOK_NOTIFY_URL),
+    "background_interval_hours": EMAIL_BACKGROUND_INTERVAL_HOURS,
+}
+
+
 def _email_health_payload() -> Dict[str, Any]:
     return {
-        "config_valid": len(_email_missing_required_config()) == 0,
-        "missing_required_config": _email_missing_required_config(),
-        "has_openai_api_key": bool(EMAIL_OPENAI_API_KEY),
-        "has_openai_model": bool(EMAIL_OPENAI_MODEL),
-        "has_imap_email": bool(EMAIL_IMAP_EMAIL),
-        "has_imap_password": bool(EMAIL_IMAP_PASSWORD),
-        "has_imap_credentials": bool(EMAIL_IMAP_EMAIL and EMAIL_IMAP_PASSWORD),
-        "imap_host": EMAIL_IMAP_HOST,
-        "has_smtp_email": bool(EMAIL_SMTP_EMAIL),
-        "has_smtp_password": bool(EMAIL_SMTP_PASSWORD),
-        "has_smtp_credentials": bool(EMAIL_SMTP_EMAIL and EMAIL_SMTP_PASSWORD),
-        "smtp_host": EMAIL_SMTP_HOST,
-        "smtp_port": EMAIL_SMTP_PORT,
-        "default_from_email": EMAIL_DEFAULT_FROM,
-        "default_cc_email": EMAIL_DEFAULT_CC,
-        "signature_assets_dir": EMAIL_SIGNATURE_ASSETS_DIR,
-        "support_telegram_url": SUPPORT_TELEGRAM_URL,
-        "support_marketing_url": SUPPORT_MARKETING_URL,
-        "support_user_url_prefix": SUPPORT_USER_URL_PREFIX,
-        "has_webhook_notify": bool(EMAIL_WEBHOOK_NOTIFY_URL),
-        "allowed_from_whitelist": EMAIL_ALLOWED_FROM_WHITELIST,
-        "background_interval_hours": EMAIL_BACKGROUND_INTERVAL_HOURS,
+        **_EMAIL_STATIC_HEALTH,
+        "missing_required_config": list(_EMAIL_MISSING_CONFIG),
+        "allowed_from_whitelist": list(EMAIL_ALLOWED_FROM_WHITELIST),
     }
 
 
 def _issue_missing_required_config() -> List[str]:
-    missing: List[str] = []
-    required = {
-        "issue_repo_base_url": ISSUE_REPO_BASE_URL,
-        "issue_openai_api_key": ISSUE_OPENAI_API_KEY,
-    }
-    for key, value in required.items():
-        if not str(value).strip():
-            missing.append(key)
-    return missing
+    return list(_ISSUE_MISSING_CONFIG)
+
+
+_ISSUE_STATIC_HEALTH: Dict[str, Any] = {
+    "config_valid": not _ISSUE_MISSING_CONFIG,
+    "has_repo_base_url": bool(ISSUE_REPO_BASE_URL),
+    "has_project_name": bool(ISSUE_PROJECT_NAME),
+    "has_storage_state_path_config": bool(str(ISSUE_STORAGE_STATE_PATH).strip()),
+    "storage_state_path": str(issue_service.storage_state_path),
+    "has_openai_api_key": bool(ISSUE_OPENAI_API_KEY),
+    "has_openai_model": bool(ISSUE_OPENAI_MODEL),
+    "has_webhook_url": bool(ISSUE_WEBHOOK_URL),
+}
 
 
 def _issue_health_payload() -> Dict[str, Any]:
     return {
-        "config_valid": len(_issue_missing_required_config()) == 0,
-        "missing_required_config": _issue_missing_required_config(),
-        "has_repo_base_url": bool(ISSUE_REPO_BASE_URL),
-        "has_project_name": bool(ISSUE_PROJECT_NAME),
-        "has_storage_state_path_config": bool(str(ISSUE_STORAGE_STATE_PATH).strip()),
-        "storage_state_path": str(issue_service.storage_state_path),
-        "has_openai_api_key": bool(ISSUE_OPENAI_API_KEY),
-        "has_openai_model": bool(ISSUE_OPENAI_MODEL),
-        "has_webhook_url": bool(ISSUE_WEBHOOK_URL),
+        **_ISSUE_STATIC_HEALTH,
+        "missing_required_config": list(_ISSUE_MISSING_CONFIG),
         "bug_parent_repo_by_repo": issue_service.bug_parent_repo_by_repo,
         "bug_parent_issue_number_by_repo": issue_service.bug_parent_issue_number_by_repo,
     }
@@ -785,60 +808,109 @@ def _telegram_reader_health_payload() -> Dict[str, Any]:
     }
 
 
+_ANSWERS_STATIC_HEALTH: Dict[str, Any] = {
+    "config_valid": True,
+    "has_telegram_token": bool(ANSWERS_TELEGRAM_BOT_TOKEN),
+    "has_webhook_secret": bool(ANSWERS_TELEGRAM_WEBHOOK_SECRET),
+    "has_openai_api_key": bool(ANSWERS_OPENAI_API_KEY),
+    "has_openai_model": bool(ANSWERS_OPENAI_MODEL),
+    "data_dir": str(ANSWERS_DATA_DIR),
+    "data_dir_within_persistent_data_dir": _path_is_within(DATA_DIR, ANSWERS_DATA_DIR),
+}
+
+
 def _answers_health_payload() -> Dict[str, Any]:
     return {
-        "config_valid": True,
+        **_ANSWERS_STATIC_HEALTH,
         "missing_required_config": [],
-        "has_telegram_token": bool(ANSWERS_TELEGRAM_BOT_TOKEN),
-        "has_webhook_secret": bool(ANSWERS_TELEGRAM_WEBHOOK_SECRET),
-        "has_openai_api_key": bool(ANSWERS_OPENAI_API_KEY),
-        "has_openai_model": bool(ANSWERS_OPENAI_MODEL),
-        "data_dir": str(ANSWERS_DATA_DIR),
-        "data_dir_within_persistent_data_dir": _path_is_within(DATA_DIR, ANSWERS_DATA_DIR),
     }
 
 
 WORKDAY_SCHEDULER_STATE_PATH = DATA_DIR / "workday_agent_scheduler_state.json"
+# Ventana de arranque automático en minutos del día: 06:57 a 09:30 inclusive.
+WORKDAY_START_WINDOW_FIRST_MINUTE = 6 * 60 + 57
+WORKDAY_START_WINDOW_LAST_MINUTE = 9 * 60 + 30
+
+
+# Último estado leído o escrito; solo este proceso escribe el fichero, así que
+# los ticks del scheduler no necesitan releerlo del disco.
+_scheduler_state_cache: Dict[str, Any] | None = None
 
 
 def _load_scheduler_state() -> Dict[str, Any]:
+    global _scheduler_state_cache
+    if _scheduler_state_cache is not None:
+        return dict(_scheduler_state_cache)
     if not WORKDAY_SCHEDULER_STATE_PATH.exists():
         return {}
     try:
-        data = json.loads(WORKDAY_SCHEDULER_STATE_PATH.read_text(encoding="utf-8"))
+        data = _json_loads(WORKDAY_SCHEDULER_STATE_PATH.read_bytes())
         if isinstance(data, dict):
-            return data
+            _scheduler_state_cache = data
+            return dict(data)
     except Exception:
         logger.exception("No se pudo leer estado del scheduler de workday")
     return {}
 
 
 def _save_scheduler_state(state: Dict[str, Any]) -> None:
+    global _scheduler_state_cache
+    if state == _scheduler_state_cache:
+        return
+    temporary_path = WORKDAY_SCHEDULER_STATE_PATH.with_name(f".{WORKDAY_SCHEDULER_STATE_PATH.name}.tmp")
     try:
-        WORKDAY_SCHEDULER_STATE_PATH.write_text(
-            json.dumps(state, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
+        temporary_path.write_bytes(_json_dumps_pretty(state))
+        temporary_path.replace(WORKDAY_SCHEDULER_STATE_PATH)
+        _scheduler_state_cache = dict(state)
     except Exception:
         logger.exception("No se pudo guardar estado del scheduler de workday")
 
 
+# Máximo entre revisiones aunque nadie despierte al scheduler: cubre cambios de
+# hora y ajustes de fechas editados fuera de la API.
+WORKDAY_SCHEDULER_MAX_WAIT_SECONDS = 900
+_workday_scheduler_wakeup = threading.Event()
+_workday_scheduler_stopping = threading.Event()
+
+
+def trigger_workday_scheduler() -> None:
+    """Despierta el scheduler de workday para que reevalúe su estado ya."""
+    _workday_scheduler_wakeup.set()
+
+
+def _stop_workday_scheduler() -> None:
+    _workday_scheduler_stopping.set()
+    _workday_scheduler_wakeup.set()
+
+
+def _seconds_until_start_window(now: datetime) -> float:
+    """Segundos hasta la próxima apertura de la ventana de arranque (06:57)."""
+    opening = now.replace(
+        hour=WORKDAY_START_WINDOW_FIRST_MINUTE // 60,
+        minute=WORKDAY_START_WINDOW_FIRST_MINUTE % 60,
+        second=0,
+        microsecond=0,
+    )
+    if now >= opening:
+        opening += timedelta(days=1)
+    return (opening - now).total_seconds()
+
+
+def _workday_scheduler_wait(seconds: float) -> None:
+    # Se limpia al despertar: un aviso llegado durante el tick adelanta la siguiente espera.
+    _workday_scheduler_wakeup.wait(timeout=min(max(seconds, 1.0), WORKDAY_SCHEDULER_MAX_WAIT_SECONDS))
+    _workday_scheduler_wakeup.clear()
+
+
 def _workday_scheduler_loop() -> None:
     logger.info("Scheduler interno workday iniciado")
-    last_invalid_signature = ""
+    if _WORKDAY_MISSING_CONFIG:
+        # La configuración no cambia sin reiniciar: no hay nada que reintentar.
+        logger.error("Config workday inválida. Faltan: %s", ",".join(sorted(_WORKDAY_MISSING_CONFIG)))
+        return
     last_active_phase = ""
     last_blocked_day = ""
-    while True:
-        missing = _workday_missing_required_config()
-        if missing:
-            signature = ",".join(sorted(missing))
-            if signature != last_invalid_signature:
-                logger.error("Config workday inválida. Faltan: %s", signature)
-                last_invalid_signature = signature
-            time.sleep(60)
-            continue
-
-        last_invalid_signature = ""
+    while not _workday_scheduler_stopping.is_set():
         if workday_service.has_active_run():
             active_phase = str(workday_service.get_status().get("phase", ""))
             if active_phase != last_active_phase:
@@ -847,14 +919,16 @@ def _workday_scheduler_loop() -> None:
                     active_phase,
                 )
                 last_active_phase = active_phase
-            time.sleep(30)
+            _workday_scheduler_wait(30)
             continue
 
         last_active_phase = ""
         now = datetime.now()
+        # Sin nada pendiente hoy, la siguiente decisión llega con la próxima apertura.
+        wait_seconds = _seconds_until_start_window(now)
         # Weekdays: lunes(0) a viernes(4)
         if now.weekday() <= 4:
-            today = now.strftime("%Y-%m-%d")
+            today = now.date().isoformat()
             if workday_service.is_automatic_start_blocked_for_day(today):
                 settings = workday_service.get_settings()
                 if last_blocked_day != today:
@@ -865,15 +939,14 @@ def _workday_scheduler_loop() -> None:
                         today,
                     )
                     last_blocked_day = today
-                time.sleep(30)
+                _workday_scheduler_wait(wait_seconds)
                 continue
 
             last_blocked_day = ""
             state = _load_scheduler_state()
             last_run_date = str(state.get("last_run_date", ""))
             in_start_window = (
-                (now.hour > 6 or (now.hour == 6 and now.minute >= 57))
-                and (now.hour < 9 or (now.hour == 9 and now.minute <= 30))
+                WORKDAY_START_WINDOW_FIRST_MINUTE <= now.hour * 60 + now.minute <= WORKDAY_START_WINDOW_LAST_MINUTE
             )
             should_start_today = last_run_date != today and in_start_window
             if should_start_today:
@@ -888,29 +961,24 @@ def _workday_scheduler_loop() -> None:
                     )
                 except Exception:
                     logger.exception("Fallo no controlado en ejecución automática workday")
+                wait_seconds = _seconds_until_start_window(datetime.now())
         else:
             last_blocked_day = ""
-        time.sleep(30)
+        _workday_scheduler_wait(wait_seconds)
+    logger.info("Scheduler interno workday detenido")
 
 
 def _workday_recovery_loop() -> None:
     logger.info("Recovery workday iniciado")
-    last_invalid_signature = ""
     while True:
         if not workday_service.has_active_run():
             logger.info("Recovery workday: no hay ejecución pendiente de reanudar")
             return
 
-        missing = _workday_missing_required_config()
-        if missing:
-            signature = ",".join(sorted(missing))
-            if signature != last_invalid_signature:
-                logger.error("Recovery workday bloqueado. Faltan: %s", signature)
-                last_invalid_signature = signature
-            time.sleep(60)
-            continue
+        if _WORKDAY_MISSING_CONFIG:
+            logger.error("Recovery workday bloqueado. Faltan: %s", ",".join(sorted(_WORKDAY_MISSING_CONFIG)))
+            return
 
-        last_invalid_signature = ""
         result = workday_service.resume_pending_flow()
         logger.info("Recovery workday resultado: %s", result)
         if result.get("reason") == "busy":
@@ -925,19 +993,11 @@ def _email_scheduler_loop() -> None:
         EMAIL_BACKGROUND_INTERVAL_HOURS,
         ",".join(EMAIL_ALLOWED_FROM_WHITELIST) if EMAIL_ALLOWED_FROM_WHITELIST else "*",
     )
+    if _EMAIL_MISSING_CONFIG:
+        logger.error("Invalid email config. Missing: %s", ",".join(sorted(_EMAIL_MISSING_CONFIG)))
+        return
     interval_seconds = EMAIL_BACKGROUND_INTERVAL_HOURS * 3600
-    last_invalid_signature = ""
     while True:
-        missing = _email_missing_required_config()
-        if missing:
-            signature = ",".join(sorted(missing))
-            if signature != last_invalid_signature:
-                logger.error("Invalid email config. Missing: %s", signature)
-                last_invalid_signature = signature
-            time.sleep(60)
-            continue
-
-        last_invalid_signature = ""
         try:
             created = email_service.check_new_and_suggest(
                 max_emails=10,
@@ -954,20 +1014,12 @@ def _email_scheduler_loop() -> None:
 def _issue_daily_report_loop() -> None:
     # HA add-on scheduler: sends a daily heartbeat to the configured webhook.
     logger.info("Issue-agent daily scheduler started")
+    if _ISSUE_MISSING_CONFIG:
+        logger.error("Invalid issue-agent config. Missing: %s", ",".join(sorted(_ISSUE_MISSING_CONFIG)))
+        return
     last_report_date = ""
-    last_invalid_signature = ""
     while True:
-        missing = _issue_missing_required_config()
-        if missing:
-            signature = ",".join(sorted(missing))
-            if signature != last_invalid_signature:
-                logger.error("Invalid issue-agent config. Missing: %s", signature)
-                last_invalid_signature = signature
-            time.sleep(60)
-            continue
-
-        last_invalid_signature = ""
-        today = datetime.now().strftime("%Y-%m-%d")
+        today = date.today().isoformat()
         if today != last_report_date:
             try:
                 issue_service.send_webhook_report(reason="daily_status", details={"date": today})
@@ -1102,6 +1154,28 @@ def _telegram_reader_retention_cleanup_once() -> Dict[str, Any]:
     return result
 
 
+HEALTH_CACHE_TTL_SECONDS = 1.0
+
+
+def _ttl_memo(
+    fn: Callable[[], Dict[str, Any]],
+    ttl_seconds: float = HEALTH_CACHE_TTL_SECONDS,
+) -> Callable[[], Dict[str, Any]]:
+    """Reuse a health payload for ttl_seconds so bursts of /health polls share one build."""
+    cached: Tuple[float, Dict[str, Any]] = (float("-inf"), {})
+
+    def wrapper() -> Dict[str, Any]:
+        nonlocal cached
+        now = time.monotonic()
+        expires_at, payload = cached
+        if now >= expires_at:
+            payload = fn()
+            cached = (now + ttl_seconds, payload)
+        return payload
+
+    return wrapper
+
+
 def _build_agent_modules() -> List[AgentModule]:
     # Do not fan out raw webhook text until every shared requirement is valid.
     # A disabled or incomplete reader must start from a fresh local boundary.
@@ -1113,12 +1187,17 @@ def _build_agent_modules() -> List[AgentModule]:
                 workday_service,
                 JOB_SECRET,
                 _workday_missing_required_config,
+                on_change=trigger_workday_scheduler,
             ),
-            health_factory=_workday_health_payload,
+            health_factory=_ttl_memo(_workday_health_payload),
             startup_tasks=(
                 ("recovery", _workday_recovery_loop),
                 ("scheduler", _workday_scheduler_loop),
             ),
+            shutdown_tasks=(
+                ("scheduler", _stop_workday_scheduler),
+                ("http-client", workday_service.shutdown),
+            ),
         ),
         AgentModule(
             name="email_agent",
@@ -1127,7 +1206,7 @@ def _build_agent_modules() -> List[AgentModule]:
                 JOB_SECRET,
                 _email_missing_required_config,
             ),
-            health_factory=_email_health_payload,
+            health_factory=_ttl_memo(_email_health_payload),
             startup_tasks=(
                 ("scheduler", _email_scheduler_loop),
             ),
@@ -1139,7 +1218,7 @@ def _build_agent_modules() -> List[AgentModule]:
                 JOB_SECRET,
                 _issue_missing_required_config,
             ),
-            health_factory=_issue_health_payload,
+            health_factory=_ttl_memo(_issue_health_payload),
             startup_tasks=(
                 ("daily_report", _issue_daily_report_loop),
             ),
@@ -1151,7 +1230,7 @@ def _build_agent_modules() -> List[AgentModule]:
                 JOB_SECRET,
                 _discord_missing_required_config,
             ),
-            health_factory=_discord_health_payload,
+            health_factory=_ttl_memo(_discord_health_payload),
             startup_tasks=(
                 (("scheduler", _discord_poll_loop),)
                 if DISCORD_ENABLED
@@ -1165,7 +1244,7 @@ def _build_agent_modules() -> List[AgentModule]:
                 JOB_SECRET,
                 _telegram_reader_missing_required_config,
             ),
-            health_factory=_telegram_reader_health_payload,
+            health_factory=_ttl_memo(_telegram_reader_health_payload),
             startup_tasks=(
                 ("retention_cleanup", _telegram_reader_retention_cleanup_loop),
             )
@@ -1185,12 +1264,21 @@ def _build_agent_modules() -> List[AgentModule]:
                 # until its own shared configuration is complete.
                 telegram_reader_sink=(telegram_reader_service if telegram_reader_ready else None),
             ),
-            health_factory=_answers_health_payload,
+            health_factory=_ttl_memo(_answers_health_payload),
         ),
     ]
 
 
 AGENT_MODULES = _build_agent_modules()
+# Campos de /health que no dependen de la petición.
+_AGENT_NAMES = tuple(module.name for module in AGENT_MODULES)
+_DATA_DIR_STR = str(DATA_DIR)
+_HAS_JOB_SECRET = bool(JOB_SECRET)
+
+
+# Hilos de startup_tasks por nombre. Son daemon a propósito: los bucles no
+# terminan y un ThreadPoolExecutor los esperaría al salir del intérprete.
+_startup_threads: Dict[str, threading.Thread] = {}
 
 
 @APP.on_event("startup")
@@ -1228,21 +1316,62 @@ def _on_startup() -> None:
             )
     for module in AGENT_MODULES:
         for task_name, task_target in module.startup_tasks:
-            thread = threading.Thread(
-                target=task_target,
-                name=f"{module.name}-{task_name}",
-                daemon=True,
-            )
+            thread_name = f"agent-{module.name}-{task_name}"
+            running = _startup_threads.get(thread_name)
+            if running is not None and running.is_alive():
+                logger.warning("Startup task already running; not starting it twice (%s)", thread_name)
+                continue
+            thread = threading.Thread(target=task_target, name=thread_name, daemon=True)
+            _startup_threads[thread_name] = thread
             thread.start()
 
 
+@APP.on_event("shutdown")
+def _on_shutdown() -> None:
+    for module in AGENT_MODULES:
+        for task_name, task_target in module.shutdown_tasks:
+            try:
+                task_target()
+            except Exception:
+                logger.exception("Shutdown task failed (%s-%s)", module.name, task_name)
+
+
 for module in AGENT_MODULES:
     APP.include_router(module.router_factory())
 APP.include_router(create_ui_router(JOB_SECRET))
 
 
+def _install_profiler_middleware(app: FastAPI) -> bool:
+    """Register the on-demand pyinstrument profiler (``?profile=1``) if available."""
+    try:
+        from pyinstrument import Profiler
+    except ModuleNotFoundError:
+        logger.warning("AGENT_RUNNER_PROFILING=1 but pyinstrument is not installed; profiling disabled")
+        return False
+
+    @app.middleware("http")
+    async def _profile_request(request: Request, call_next):
+        if request.query_params.get("profile") != "1":
+            return await call_next(request)
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            await call_next(request)
+        finally:
+            # A failing route must not leave the profiler running for the next request.
+            profiler.stop()
+        return HTMLResponse(profiler.output_html())
+
+    logger.info("Request profiling enabled (append ?profile=1 to any route)")
+    return True
+
+
+if _setting_bool("agent_runner_profiling", False):
+    _install_profiler_middleware(APP)
+
+
 @APP.get("/")
-def root(request: Request):
+async def root(request: Request):
     """Redirige la raíz al UI integrado de la aplicación."""
     target = "ui"
     if request.url.query:
@@ -1250,15 +1379,20 @@ def root(request: Request):
     return RedirectResponse(url=target, status_code=307)
 
 
+def _per_agent_health() -> Dict[str, Any]:
+    return {module.name: module.health_factory() for module in AGENT_MODULES}
+
+
 @APP.get("/health")
-def health():
+async def health():
     """Expone estado básico y disponibilidad de configuración por agente."""
-    per_agent = {module.name: module.health_factory() for module in AGENT_MODULES}
+    # Los get_status() de los servicios toman locks y pueden persistir en disco.
+    per_agent = await asyncio.to_thread(_per_agent_health)
     return {
         "ok": True,
-        "data_dir": str(DATA_DIR),
-        "has_job_secret": bool(JOB_SECRET),
+        "data_dir": _DATA_DIR_STR,
+        "has_job_secret": _HAS_JOB_SECRET,
         **per_agent,
-        "agents": [module.name for module in AGENT_MODULES],
+        "agents": _AGENT_NAMES,
         "ui_path": "/ui",
     }
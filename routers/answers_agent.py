@@ -5,7 +5,7 @@ from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
 from agents.answers_agent.service import AnswersAgentService
-from routers.auth import ensure_request_authorized
+from routers.auth import ensure_request_authorized, secret_matches
 
 
 logger = logging.getLogger("agent_runner.answers_router")
@@ -80,7 +80,7 @@ def create_answers_router(
         if not accepted:
             logger.error("Telegram webhook rejected: no configured secret")
             raise HTTPException(status_code=401, detail="Unauthorized webhook")
-        if not provided or provided not in accepted:
+        if not provided or not any(secret_matches(provided, secret) for secret in accepted):
             logger.warning("Telegram webhook rejected due to invalid secret")
             raise HTTPException(status_code=401, detail="Unauthorized webhook")
 
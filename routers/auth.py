@@ -36,6 +36,14 @@ def extract_secret(request: Request, body_secret: Optional[str] = None) -> Tuple
     return "", "missing"
 
 
+def secret_matches(provided: str, expected: str) -> bool:
+    """Constant-time secret comparison; secrets that cannot be encoded never match."""
+    try:
+        return secrets.compare_digest(provided.encode("utf-8"), expected.encode("utf-8"))
+    except UnicodeEncodeError:
+        return False
+
+
 def ensure_request_authorized(
     request: Request,
     job_secret: str,
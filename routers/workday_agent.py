@@ -1,5 +1,8 @@
 import logging
-from typing import Any, Callable, Dict, List, Optional
+import threading
+from concurrent.futures import Future
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional
 
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
@@ -9,6 +12,9 @@ from routers.auth import ensure_request_authorized
 
 logger = logging.getLogger("agent_runner.workday_router")
 
+# Finished runs kept for GET /runs/{run_id}.
+MAX_TRACKED_RUNS = 50
+
 
 class RunRequest(BaseModel):
     """Payload to run web-agent jobs."""
@@ -28,15 +34,56 @@ def create_workday_router(
     service: WorkdayAgentService,
     job_secret: str,
     missing_config_fn: Callable[[], List[str]],
+    on_change: Optional[Callable[[], None]] = None,
 ) -> APIRouter:
-    """Creates the web-agent HTTP router and delegates execution to the service."""
-    router = APIRouter(tags=["workday-agent"])
+    """Creates the web-agent HTTP router and delegates execution to the service.
 
-    runners: Dict[str, Callable[[str, bool, str], Dict[str, Any]]] = service.list_jobs()
+    on_change, when given, is called after runs, cancellations and settings
+    updates so the internal scheduler re-evaluates without waiting for its timer.
+    """
+    router = APIRouter(tags=["workday-agent"])
 
-    @router.post("/run/{job_name}")
+    def notify_change() -> None:
+        if on_change is not None:
+            on_change()
+
+    # The job set is fixed once the router is built.
+    runners: Mapping[str, Callable[[str, bool, str], Dict[str, Any]]] = MappingProxyType(dict(service.list_jobs()))
+    job_names = sorted(runners)
+    runs: Dict[str, Future] = {}
+    # Requests run on the threadpool; every read or write of runs holds this.
+    runs_lock = threading.Lock()
+
+    def start_run(runner: Callable[..., Dict[str, Any]], job_name: str, supervision: bool, run_id: str) -> bool:
+        # A run blocks for the whole workday, so it gets its own daemon thread
+        # (like the scheduler loops) instead of a request worker; a second
+        # submission is rejected as busy by the service right away. Returns False
+        # when run_id is still tracked as pending.
+        future: Future = Future()
+
+        def target() -> None:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(runner(job_name=job_name, supervision=supervision, run_id=run_id))
+            except Exception as err:
+                logger.exception("Run failed job=%s run_id=%s", job_name, run_id)
+                future.set_exception(err)
+
+        with runs_lock:
+            previous = runs.get(run_id)
+            if previous is not None and not previous.done():
+                return False
+            runs[run_id] = future
+            finished = [key for key, item in runs.items() if item.done()]
+            for key in finished[: max(0, len(runs) - MAX_TRACKED_RUNS)]:
+                runs.pop(key, None)
+        threading.Thread(target=target, name=f"workday-job-{run_id}", daemon=True).start()
+        return True
+
+    @router.post("/run/{job_name}", status_code=202)
     def run_job(job_name: str, req: RunRequest, request: Request):
-        """Runs a registered job (for example workday_flow)."""
+        """Starts a registered job (for example workday_flow) in the background; poll GET /runs/{run_id} for its result."""
         missing = missing_config_fn()
         if missing:
             raise HTTPException(
@@ -53,22 +100,51 @@ def create_workday_router(
             context_path=f"/run/{job_name}",
         )
 
-        runner = runners.get(job_name)
-        if not runner:
-            raise HTTPException(status_code=404, detail=f"Unknown job: {job_name}")
+        try:
+            runner = runners[job_name]
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"Unknown job: {job_name}") from None
 
         run_id = req.run_id or service.now_id()
-        return runner(job_name=job_name, supervision=req.supervision, run_id=run_id)
+        if not start_run(runner, job_name=job_name, supervision=req.supervision, run_id=run_id):
+            raise HTTPException(status_code=409, detail=f"Run still pending: {run_id}")
+        notify_change()
+        logger.info("Run accepted job=%s run_id=%s", job_name, run_id)
+        return {"accepted": True, "job": job_name, "run_id": run_id}
 
     def ensure_auth(request: Request) -> None:
         """Validates auth for the router GET/POST endpoints."""
         ensure_request_authorized(request, job_secret, logger)
 
+    @router.get("/runs/{run_id}")
+    def run_status(run_id: str, request: Request):
+        """Returns whether a run started by POST /run/{job_name} finished, and its result."""
+        ensure_auth(request)
+        with runs_lock:
+            future = runs.get(run_id)
+        if future is None:
+            raise HTTPException(status_code=404, detail=f"Unknown run: {run_id}")
+        if not future.done():
+            return {"run_id": run_id, "done": False, "result": None}
+        error = future.exception()
+        if error is not None:
+            return {"run_id": run_id, "done": True, "result": {"ok": False, "run_id": run_id, "error": str(error)}}
+        return {"run_id": run_id, "done": True, "result": future.result()}
+
+    @router.post("/runs/{run_id}/cancel")
+    def cancel_run(run_id: str, request: Request):
+        """Wakes the planned waits of an active run so it stops with an error."""
+        ensure_auth(request)
+        if not service.cancel_run(run_id):
+            raise HTTPException(status_code=404, detail=f"No active run: {run_id}")
+        notify_change()
+        return {"ok": True, "run_id": run_id}
+
     @router.get("/jobs")
     def list_jobs(request: Request):
         """Lists available jobs in the web agent."""
         ensure_auth(request)
-        return {"jobs": sorted(runners.keys())}
+        return {"jobs": job_names}
 
     @router.get("/status")
     def status(request: Request):
@@ -95,6 +171,7 @@ def create_workday_router(
             )
         except RuntimeError as err:
             raise HTTPException(status_code=400, detail=str(err)) from err
+        notify_change()
         return {"ok": True, "settings": updated}
 
     @router.get("/events")
@@ -0,0 +1,441 @@
+import asyncio
+import json
+import os
+import re
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+try:
+    import httpx
+    from fastapi.testclient import TestClient
+
+    from answers_agent import server as answers_server
+
+    DEPS_AVAILABLE = True
+except ModuleNotFoundError:  # pragma: no cover - depende del entorno local
+    DEPS_AVAILABLE = False
+
+
+@unittest.skipUnless(DEPS_AVAILABLE, "fastapi no está instalado en este entorno")
+class AnswersServerHttpClientTests(unittest.TestCase):
+    def test_lifespan_shares_and_closes_http_clients(self) -> None:
+        with TestClient(answers_server.APP):
+            telegram_client = answers_server._http_client("telegram_client")
+            openai_client = answers_server._http_client("openai_client")
+            self.assertIsInstance(telegram_client, httpx.AsyncClient)
+            self.assertIs(telegram_client, answers_server._http_client("telegram_client"))
+            self.assertEqual(str(openai_client.base_url).rstrip("/"), answers_server.OPENAI_API_BASE_URL)
+
+        self.assertTrue(telegram_client.is_closed)
+        self.assertTrue(openai_client.is_closed)
+        self.assertIsNone(answers_server.APP.state.telegram_client)
+
+
+@unittest.skipUnless(DEPS_AVAILABLE, "fastapi no está instalado en este entorno")
+class AnswersServerOpenAITests(unittest.TestCase):
+    def test_concurrent_calls_share_identical_prompts_and_respect_limit(self) -> None:
+        state = {"active": 0, "peak": 0, "posts": 0}
+
+        class FakeClient:
+            async def post(self, url, headers=None, content=None):
+                state["posts"] += 1
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+                await asyncio.sleep(0.01)
+                state["active"] -= 1
+                return httpx.Response(200, json={"output_text": "reply"}, request=httpx.Request("POST", url))
+
+        async def run() -> list:
+            answers_server.APP.state.openai_semaphore = asyncio.Semaphore(2)
+            calls = [answers_server._openai_response([{"role": "user", "content": "same"}]) for _ in range(3)]
+            calls += [answers_server._openai_response([{"role": "user", "content": f"q{i}"}]) for i in range(4)]
+            return await asyncio.gather(*calls)
+
+        with mock.patch.object(answers_server.SETTINGS, "openai_api_key", "key"), mock.patch.object(
+            answers_server, "_http_client", return_value=FakeClient()
+        ):
+            try:
+                replies = asyncio.run(run())
+            finally:
+                answers_server.APP.state.openai_semaphore = None
+
+        self.assertEqual(replies, ["reply"] * 7)
+        self.assertEqual(state["posts"], 5)
+        self.assertEqual(state["peak"], 2)
+        self.assertEqual(answers_server._OPENAI_INFLIGHT, {})
+
+    def test_joiners_get_none_when_the_leading_call_is_cancelled(self) -> None:
+        async def run() -> list:
+            leader = asyncio.ensure_future(answers_server._openai_response([{"role": "user", "content": "same"}]))
+            await asyncio.sleep(0)
+            joiner = asyncio.ensure_future(answers_server._openai_response([{"role": "user", "content": "same"}]))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await asyncio.gather(leader, joiner, return_exceptions=True)
+
+        async def slow_post(content, messages_count):
+            await asyncio.sleep(5)
+            return "reply"
+
+        with mock.patch.object(answers_server.SETTINGS, "openai_api_key", "key"), mock.patch.object(
+            answers_server, "_post_openai_response", slow_post
+        ):
+            leader_result, joiner_result = asyncio.run(run())
+
+        self.assertIsInstance(leader_result, asyncio.CancelledError)
+        self.assertIsNone(joiner_result)
+        self.assertEqual(answers_server._OPENAI_INFLIGHT, {})
+
+
+@unittest.skipUnless(DEPS_AVAILABLE, "fastapi no está instalado en este entorno")
+class AnswersServerNormalizeTextTests(unittest.TestCase):
+    def test_fast_path_matches_regex_normalization(self) -> None:
+        def reference(text: str) -> str:
+            cleaned = re.sub(r"\s+", " ", text.lower().strip())
+            return re.sub(r"[^\w\sáéíóúüñ¿?¡!]", "", cleaned)
+
+        samples = [
+            "  Hello,   WORLD!!  ",
+            "a - b\t\n_c_ (d) [e] {f} #g",
+            "¿Cuándo llega mi REEMBOLSO?",
+            "smart “quotes” … and — dashes",
+            "ctrl\x00chars\x1fhere\x7f",
+            "",
+        ]
+        for sample in samples:
+            self.assertEqual(answers_server._normalize_text(sample), reference(sample), sample)
+
+
+@unittest.skipUnless(DEPS_AVAILABLE, "fastapi no está instalado en este entorno")
+class AnswersServerGuidelinesTests(unittest.TestCase):
+    def test_guidelines_are_cached_until_file_changes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            behavior = Path(tmp) / "behavior.md"
+            behavior.write_text("v1", encoding="utf-8")
+            with mock.patch.object(answers_server, "GUIDELINES_DIR", Path(tmp)), mock.patch.object(
+                answers_server, "_GUIDELINES_CACHE", {}
+            ):
+                client = TestClient(answers_server.APP)
+                self.assertEqual(client.get("/answers_agent/guidelines").json(), {"behavior.md": "v1", "escalation.md": ""})
+                with mock.patch.object(Path, "read_text", side_effect=AssertionError("re-read")):
+                    self.assertEqual(client.get("/answers_agent/guidelines").json()["behavior.md"], "v1")
+
+                behavior.write_text("v2", encoding="utf-8")
+                os.utime(behavior, ns=(0, behavior.stat().st_mtime_ns + 1_000_000))
+                self.assertEqual(client.get("/answers_agent/guidelines").json()["behavior.md"], "v2")
+
+
+@unittest.skipUnless(DEPS_AVAILABLE, "fastapi no está instalado en este entorno")
+class AnswersServerJsonCodecTests(unittest.TestCase):
+    def test_codec_matches_stdlib_with_and_without_orjson(self) -> None:
+        payload = {"users": {"1": {"display_name": "Begoña", "messages": [{"content": "¿hola?"}]}}}
+        for backend in (answers_server.orjson, None):
+            with mock.patch.object(answers_server, "orjson", backend):
+                compact = answers_server._json_dumps(payload)
+                self.assertIn("Begoña".encode("utf-8"), compact)
+                self.assertNotIn(b"\n", compact)
+                self.assertEqual(answers_server._json_loads(compact), payload)
+                self.assertEqual(json.loads(answers_server._json_dumps(payload, indent=True)), payload)
+
+
+@unittest.skipUnless(DEPS_AVAILABLE, "fastapi no está instalado en este entorno")
+class AnswersServerWalStoreTests(unittest.TestCase):
+    def _journal(self, tmp: str, compact_every: int = 100) -> "answers_server._StateJournal":
+        journal = answers_server._StateJournal(Path(tmp) / "state.wal", compact_every)
+        journal.store(
+            Path(tmp) / "conversations.json",
+            {"users": {}},
+            answers_server._apply_conversation_event,
+            store_cls=answers_server._ConversationStore,
+        )
+        journal.store(Path(tmp) / "pending_issues.json", {"issues": []}, answers_server._list_appender("issues"))
+        journal.load()
+        return journal
+
+    def _store(self, tmp: str, compact_every: int = 100) -> "answers_server._WalStore":
+        return self._journal(tmp, compact_every).stores["conversations"]
+
+    def test_append_only_touches_wal_and_replays_on_load(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = self._store(tmp)
+            store.append({"user_id": "7", "display_name": "Ana", "messages": [{"role": "user", "content": "hola"}]})
+            store.append({"user_id": "7", "last_bot_message_id": 11, "messages": [{"role": "assistant", "content": "ok"}]})
+
+            self.assertFalse(store.path.exists())
+            self.assertEqual(len(store.journal.path.read_text(encoding="utf-8").splitlines()), 2)
+
+            reloaded = self._store(tmp)
+            self.assertEqual(reloaded.data, store.data)
+            self.assertEqual(reloaded.data["users"]["7"]["last_bot_message_id"], 11)
+            self.assertEqual(len(reloaded.data["users"]["7"]["messages"]), 2)
+
+    def test_stores_share_one_journal_and_compact_together(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = self._journal(tmp, compact_every=2)
+            journal.stores["conversations"].append({"user_id": "1", "messages": [{"role": "user", "content": "a"}]})
+            journal.stores["pending_issues"].append({"item": {"id": "x"}})
+
+            self.assertEqual(journal.path.read_bytes(), b"")
+            issues = json.loads((Path(tmp) / "pending_issues.json").read_text(encoding="utf-8"))
+            self.assertEqual(issues, {"issues": [{"id": "x"}], "_wal_seq": 2})
+            self.assertEqual(self._journal(tmp).stores["pending_issues"].data, {"issues": [{"id": "x"}]})
+
+    def test_batch_commits_every_store_with_one_fsync(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = self._journal(tmp)
+            conversations = journal.stores["conversations"]
+            issues = journal.stores["pending_issues"]
+            with mock.patch.object(answers_server.os, "fsync") as fsync:
+                with journal.batch() as tx:
+                    tx.append(conversations, {"user_id": "1", "messages": [{"role": "user", "content": "a"}]})
+                    tx.append(issues, {"item": {"id": "x"}})
+                    self.assertEqual(issues.data["issues"], [])
+
+            self.assertEqual(fsync.call_count, 1)
+            self.assertEqual(len(journal.path.read_text(encoding="utf-8").splitlines()), 2)
+            self.assertEqual(issues.data["issues"], [{"id": "x"}])
+
+            with self.assertRaises(RuntimeError):
+                with journal.batch() as tx:
+                    tx.append(issues, {"item": {"id": "y"}})
+                    raise RuntimeError("boom")
+            self.assertEqual(issues.data["issues"], [{"id": "x"}])
+            self.assertEqual(len(journal.path.read_text(encoding="utf-8").splitlines()), 2)
+
+    def test_reads_do_not_wait_on_journal_writes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = self._journal(tmp)
+            store = journal.stores["pending_issues"]
+            store.append({"item": {"id": "x"}})
+            with journal.lock:
+                snapshot = store.read()
+            snapshot["issues"].append({"id": "copy-only"})
+            self.assertEqual(store.data, {"issues": [{"id": "x"}]})
+
+    def test_reads_do_not_wait_on_compaction_writes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = self._journal(tmp, compact_every=1)
+            held = []
+            save_json = answers_server._save_json
+
+            def save_and_check(path, payload, indent=False):
+                held.append([store.lock.locked() for store in journal.stores.values()])
+                save_json(path, payload, indent=indent)
+
+            with mock.patch.object(answers_server, "_save_json", save_and_check):
+                journal.stores["pending_issues"].append({"item": {"id": "x"}})
+
+            self.assertEqual(held, [[False, False], [False, False]])
+            self.assertEqual(self._journal(tmp).stores["pending_issues"].data, {"issues": [{"id": "x"}]})
+
+    def test_compaction_folds_wal_into_snapshot_without_double_replay(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = self._store(tmp, compact_every=2)
+            store.append({"user_id": "1", "messages": [{"role": "user", "content": "a"}]})
+            wal_line = store.journal.path.read_bytes()
+            store.append({"user_id": "1", "messages": [{"role": "user", "content": "b"}]})
+
+            raw_snapshot = store.path.read_text(encoding="utf-8")
+            self.assertNotIn("\n", raw_snapshot)
+            self.assertFalse(store.path.with_name("conversations.json.tmp").exists())
+            snapshot = json.loads(raw_snapshot)
+            self.assertEqual(snapshot["_wal_seq"], 2)
+            self.assertEqual(store.journal.path.read_bytes(), b"")
+
+            # Simulates a crash between snapshot write and WAL truncation, plus a torn tail.
+            store.journal.path.write_bytes(wal_line + b'{"store": "conversations", "mess')
+            reloaded = self._store(tmp)
+            self.assertEqual([m["content"] for m in reloaded.data["users"]["1"]["messages"]], ["a", "b"])
+            self.assertNotIn("_wal_seq", reloaded.data)
+
+    def test_conversation_store_tracks_seen_user_texts(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = self._store(tmp)
+            store.append(
+                {
+                    "user_id": "3",
+                    "messages": [
+                        {"role": "user", "content": "Refund?", "normalized": "refund?"},
+                        {"role": "assistant", "content": "ok", "normalized": "ok"},
+                    ],
+                }
+            )
+            self.assertTrue(store.has_seen("3", "refund?"))
+            self.assertFalse(store.has_seen("3", "ok"))
+            self.assertFalse(store.has_seen("4", "refund?"))
+            self.assertTrue(self._store(tmp).has_seen("3", "refund?"))
+
+            with mock.patch.object(answers_server.SETTINGS, "max_history_messages", 2):
+                for text in ("a", "b", "c"):
+                    store.append({"user_id": "5", "messages": [{"role": "user", "normalized": text}]})
+            self.assertFalse(store.has_seen("5", "a"))
+            self.assertTrue(store.has_seen("5", "c"))
+
+    def test_manual_respond_uses_chat_index(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = self._journal(tmp)
+            store = journal.stores["conversations"]
+            store.append({"user_id": "1", "messages": [{"role": "user", "content": "hi", "chat_id": 100}]})
+            store.append({"user_id": "2", "messages": [{"role": "user", "content": "yo", "chat_id": 100}]})
+            store.append({"user_id": "2", "messages": [{"role": "user", "content": "dm", "chat_id": 200}]})
+            self.assertEqual(self._store(tmp).chat_to_user, {100: "1", 200: "2"})
+
+            with mock.patch.object(answers_server, "STATE_JOURNAL", journal), mock.patch.object(
+                answers_server, "CONVERSATIONS", store
+            ), mock.patch.object(answers_server, "_delayed_reply", mock.AsyncMock(return_value=77)):
+                client = TestClient(answers_server.APP)
+                client.post("/answers_agent/manual/respond", json={"chat_id": 200, "text": "Done"})
+                client.post("/answers_agent/manual/respond", json={"chat_id": 999, "text": "Nobody"})
+
+            self.assertEqual(store.data["users"]["2"]["last_bot_message_id"], 77)
+            self.assertTrue(store.data["users"]["2"]["messages"][-1]["manual"])
+            self.assertEqual(len(store.data["users"]["1"]["messages"]), 1)
+            self.assertEqual(len(journal.path.read_text(encoding="utf-8").splitlines()), 4)
+
+    def test_blocked_users_store_mirrors_list_in_a_set(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            def build() -> "answers_server._BlockedUsersStore":
+                journal = answers_server._StateJournal(Path(tmp) / "state.wal", 100)
+                store = journal.store(
+                    Path(tmp) / "blocked_users.json",
+                    {"blocked": []},
+                    answers_server._list_appender("blocked"),
+                    store_cls=answers_server._BlockedUsersStore,
+                )
+                journal.load()
+                return store
+
+            (Path(tmp) / "blocked_users.json").write_text('{"blocked": [1, 2]}', encoding="utf-8")
+            store = build()
+            self.assertTrue(store.is_blocked(2))
+            store.append({"item": 3})
+            self.assertTrue(store.is_blocked(3))
+            self.assertFalse(store.is_blocked(4))
+            self.assertEqual(build().data, {"blocked": [1, 2, 3]})
+
+    def test_conversation_history_is_capped(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = self._store(tmp)
+            with mock.patch.object(answers_server.SETTINGS, "max_history_messages", 3):
+                for index in range(5):
+                    store.append({"user_id": "1", "messages": [{"role": "user", "content": str(index), "normalized": str(index)}]})
+                reloaded = self._store(tmp)
+            self.assertEqual([m["content"] for m in store.data["users"]["1"]["messages"]], ["2", "3", "4"])
+            # The seen texts follow the window, as they would after reloading it.
+            self.assertFalse(store.has_seen("1", "0"))
+            self.assertTrue(store.has_seen("1", "2"))
+            self.assertEqual(reloaded.normalized_seen["1"], store.normalized_seen["1"])
+
+    def test_webhook_persists_exchange_through_wal(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = self._journal(tmp)
+            with mock.patch.object(answers_server, "STATE_JOURNAL", journal), mock.patch.object(
+                answers_server, "CONVERSATIONS", journal.stores["conversations"]
+            ), mock.patch.object(answers_server, "PENDING_ISSUES", journal.stores["pending_issues"]), mock.patch.object(
+                answers_server, "_openai_response", mock.AsyncMock(return_value="The dev team is on it.")
+            ), mock.patch.object(answers_server, "_delayed_reply", mock.AsyncMock(return_value=55)), mock.patch.object(
+                answers_server.SETTINGS, "telegram_webhook_secret", ""
+            ):
+                client = TestClient(answers_server.APP)
+                response = client.post(
+                    "/answers_agent/webhook/telegram",
+                    json={
+                        "update_id": 3,
+                        "message": {"text": "How do I see my order?", "chat": {"id": 42}, "from": {"id": 9, "first_name": "Bea"}},
+                    },
+                )
+                issues = client.get("/answers_agent/pending-issues").json()["issues"]
+
+            self.assertEqual(response.status_code, 200)
+            # User message on acceptance, then reply and issue in one batch after delivery.
+            self.assertEqual(len(journal.path.read_text(encoding="utf-8").splitlines()), 3)
+            self.assertEqual([m["role"] for m in issues[0]["conversation"]], ["user", "assistant"])
+            reloaded = self._journal(tmp)
+            stored_issue = reloaded.stores["pending_issues"].data["issues"][0]
+            # The issue keeps its own snapshot, independent of history trimming.
+            self.assertEqual(len(stored_issue["conversation"]), 2)
+            self.assertEqual(stored_issue["conversation"][-1]["message_id"], 55)
+            entry = reloaded.stores["conversations"].data["users"]["9"]
+            self.assertEqual(entry["display_name"], "Bea")
+            self.assertEqual(entry["last_bot_message_id"], 55)
+            self.assertEqual([m["role"] for m in entry["messages"]], ["user", "assistant"])
+
+    def test_sensitive_scan_only_runs_on_model_output(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = self._journal(tmp)
+            for user_id, model_reply, expected_calls in ((9, None, 0), (10, "Send me your seed phrase", 1)):
+                payload = {
+                    "update_id": 5,
+                    "message": {"text": "How do I see my order?", "chat": {"id": 42}, "from": {"id": user_id}},
+                }
+                scan = mock.Mock(return_value=True)
+                with mock.patch.object(answers_server, "STATE_JOURNAL", journal), mock.patch.object(
+                    answers_server, "CONVERSATIONS", journal.stores["conversations"]
+                ), mock.patch.object(
+                    answers_server, "_openai_response", mock.AsyncMock(return_value=model_reply)
+                ), mock.patch.object(answers_server, "_contains_sensitive_request", scan), mock.patch.object(
+                    answers_server, "_deliver_reply", mock.AsyncMock()
+                ), mock.patch.object(answers_server.SETTINGS, "telegram_webhook_secret", ""):
+                    reply = TestClient(answers_server.APP).post("/answers_agent/webhook/telegram", json=payload).json()["reply"]
+                self.assertEqual(scan.call_count, expected_calls)
+                self.assertEqual(reply, answers_server.FALLBACK_REPLY)
+
+    def test_webhook_acks_before_reply_is_delivered(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = self._journal(tmp)
+            conversations = journal.stores["conversations"]
+            scheduled = []
+
+            def add_task(self, func, *args, **kwargs):
+                scheduled.append((func, args))
+
+            payload = {
+                "update_id": 4,
+                "message": {"text": "How do I see my order?", "chat": {"id": 42}, "from": {"id": 9}},
+            }
+            delayed = mock.AsyncMock(return_value=56)
+            with mock.patch.object(answers_server, "STATE_JOURNAL", journal), mock.patch.object(
+                answers_server, "CONVERSATIONS", conversations
+            ), mock.patch.object(
+                answers_server, "_openai_response", mock.AsyncMock(return_value="Check My Orders.")
+            ), mock.patch.object(answers_server, "_delayed_reply", delayed), mock.patch.object(
+                answers_server.SETTINGS, "telegram_webhook_secret", ""
+            ), mock.patch.object(answers_server.BackgroundTasks, "add_task", add_task):
+                client = TestClient(answers_server.APP)
+                first = client.post("/answers_agent/webhook/telegram", json=payload).json()
+                second = client.post("/answers_agent/webhook/telegram", json=payload).json()
+
+            delayed.assert_not_awaited()
+            self.assertEqual(first["reply"], "Check My Orders.")
+            self.assertEqual(second["reply"], "The dev team is checking.")
+            self.assertEqual([func for func, _ in scheduled], [answers_server._deliver_reply] * 2)
+            entry = conversations.data["users"]["9"]
+            self.assertEqual([m["role"] for m in entry["messages"]], ["user", "user"])
+            self.assertIsNone(entry["last_bot_message_id"])
+
+    def test_user_message_is_kept_when_delivery_fails(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = self._journal(tmp)
+            payload = {
+                "update_id": 6,
+                "message": {"text": "How do I see my order?", "chat": {"id": 42}, "from": {"id": 9}},
+            }
+            with mock.patch.object(answers_server, "STATE_JOURNAL", journal), mock.patch.object(
+                answers_server, "CONVERSATIONS", journal.stores["conversations"]
+            ), mock.patch.object(
+                answers_server, "_openai_response", mock.AsyncMock(return_value="Check My Orders.")
+            ), mock.patch.object(
+                answers_server, "_delayed_reply", mock.AsyncMock(side_effect=RuntimeError("telegram down"))
+            ), mock.patch.object(answers_server.SETTINGS, "telegram_webhook_secret", ""):
+                response = TestClient(answers_server.APP).post("/answers_agent/webhook/telegram", json=payload)
+
+            self.assertEqual(response.status_code, 200)
+            entry = self._journal(tmp).stores["conversations"].data["users"]["9"]
+            self.assertEqual([m["content"] for m in entry["messages"]], ["How do I see my order?"])
+            self.assertIsNone(entry["last_bot_message_id"])
+
+
+if __name__ == "__main__":
+    unittest.main()
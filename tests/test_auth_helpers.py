@@ -6,7 +6,7 @@ try:
     from fastapi import HTTPException
     from starlette.requests import Request
 
-    from routers.auth import ensure_request_authorized, extract_secret
+    from routers.auth import ensure_request_authorized, extract_secret, secret_matches
 
     DEPS_AVAILABLE = True
 except ModuleNotFoundError:  # pragma: no cover - depende del entorno local
@@ -93,6 +93,11 @@ class AuthHelpersTests(unittest.TestCase):
 
         self.assertEqual(ctx.exception.status_code, 401)
 
+    def test_secret_matches_is_exact_and_tolerates_malformed_unicode(self) -> None:
+        self.assertTrue(secret_matches("clave-ñ", "clave-ñ"))
+        self.assertFalse(secret_matches("clave", "clave-ñ"))
+        self.assertFalse(secret_matches("\ud800", "correct"))
+
     def test_ensure_request_authorized_trusted_ingress_bypass(self) -> None:
         req = make_request(
             headers={"x-ingress-path": "/ingress/test"},
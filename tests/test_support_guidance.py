@@ -2,6 +2,7 @@ import unittest
 
 from agents.support_guidance import (
     SupportGuidanceConfig,
+    contains_sensitive_material,
     is_low_context_greeting,
     is_spam_like_message,
     match_support_workflow_reply,
@@ -18,6 +19,16 @@ class SupportGuidanceTests(unittest.TestCase):
         self.assertTrue(is_spam_like_message("QA promo for my token, buy now"))
         self.assertFalse(is_spam_like_message("Need support with token listing"))
 
+    def test_spam_detection_covers_every_pattern(self) -> None:
+        for sample in ("free   money", "haz dinero rápido", "premade pack", "copy-paste this", "onlyfans"):
+            self.assertTrue(is_spam_like_message(sample), sample)
+        self.assertFalse(is_spam_like_message("quality assurance question"))
+
+    def test_sensitive_material_detection(self) -> None:
+        self.assertTrue(contains_sensitive_material("here is my seed phrase"))
+        self.assertTrue(contains_sensitive_material("key: " + "ab" * 32))
+        self.assertFalse(contains_sensitive_material("tx " + "ab" * 31))
+
     def test_social_update_redirects_to_telegram_support(self) -> None:
         cfg = SupportGuidanceConfig(telegram_support_url="https://t.me/example_support")
         reply = match_support_workflow_reply(
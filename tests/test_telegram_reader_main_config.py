@@ -4,10 +4,12 @@ import importlib.util
 import os
 import sys
 import tempfile
+import threading
 import time
 import types
 import unittest
 from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
 from typing import Iterator
 from unittest.mock import Mock, patch
@@ -220,6 +222,114 @@ class TelegramReaderMainConfigTests(unittest.TestCase):
 
         cleanup.assert_called_once_with(intake_ready=False)
 
+    def test_health_endpoint_reports_every_agent_module(self) -> None:
+        from fastapi.testclient import TestClient
+
+        with _load_isolated_main(
+            answers_token="test-bot-token",
+            webhook_secret="test-webhook-secret",
+        ) as app:
+            response = TestClient(app.APP).get("/health")
+            module_names = [module.name for module in app.AGENT_MODULES]
+
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertTrue(payload["ok"])
+        self.assertEqual(payload["agents"], module_names)
+        for name in module_names:
+            self.assertIn(name, payload)
+
+    def test_health_payloads_are_memoized_for_the_ttl_window(self) -> None:
+        with _load_isolated_main(
+            answers_token="test-bot-token",
+            webhook_secret="test-webhook-secret",
+        ) as app:
+            build = Mock(side_effect=lambda: {"calls": build.call_count})
+            memo = app._ttl_memo(build, ttl_seconds=60.0)
+            first = memo()
+            second = memo()
+            expired = app._ttl_memo(build, ttl_seconds=0.0)
+            expired()
+            expired()
+
+        self.assertIs(first, second)
+        self.assertEqual(build.call_count, 3)
+
+    def test_scheduler_state_is_written_atomically_and_only_when_changed(self) -> None:
+        with _load_isolated_main(
+            answers_token="test-bot-token",
+            webhook_secret="test-webhook-secret",
+        ) as app:
+            state = {"last_run_date": "2026-01-05", "last_run_id": "auto-1"}
+            app._save_scheduler_state(state)
+            state_path = app.WORKDAY_SCHEDULER_STATE_PATH
+            first_write = state_path.stat().st_mtime_ns
+            leftovers = [path.name for path in state_path.parent.iterdir() if path.name.endswith(".tmp")]
+
+            with patch.object(app, "_json_dumps_pretty") as dumps:
+                app._save_scheduler_state(dict(state))
+            loaded = app._load_scheduler_state()
+
+            self.assertEqual(state_path.stat().st_mtime_ns, first_write)
+
+        dumps.assert_not_called()
+        self.assertEqual(leftovers, [])
+        self.assertEqual(loaded, state)
+
+    def test_startup_does_not_start_a_running_task_twice(self) -> None:
+        with _load_isolated_main(
+            answers_token="test-bot-token",
+            webhook_secret="test-webhook-secret",
+        ) as app:
+            release = threading.Event()
+            started = Mock(side_effect=lambda: release.wait(5))
+            app.telegram_reader_service.baseline_from_now = Mock(return_value={"status": "ok"})
+            app.AGENT_MODULES = [
+                app.AgentModule(
+                    name="fake_agent",
+                    router_factory=Mock(),
+                    health_factory=Mock(),
+                    startup_tasks=(("loop", started),),
+                )
+            ]
+
+            app._on_startup()
+            app._on_startup()
+            thread = app._startup_threads["agent-fake_agent-loop"]
+            release.set()
+            thread.join(timeout=5)
+
+        self.assertEqual(started.call_count, 1)
+        self.assertTrue(thread.daemon)
+
+    def test_workday_scheduler_sleeps_until_the_next_start_window(self) -> None:
+        with _load_isolated_main(
+            answers_token="test-bot-token",
+            webhook_secret="test-webhook-secret",
+        ) as app:
+            before_window = app._seconds_until_start_window(datetime(2026, 1, 5, 6, 0))
+            after_window = app._seconds_until_start_window(datetime(2026, 1, 5, 9, 31))
+            at_opening = app._seconds_until_start_window(datetime(2026, 1, 5, 6, 57))
+
+        self.assertEqual(before_window, 57 * 60)
+        self.assertEqual(after_window, (21 * 60 + 26) * 60)
+        self.assertEqual(at_opening, 24 * 3600)
+
+    def test_workday_scheduler_stops_when_woken_for_shutdown(self) -> None:
+        with _load_isolated_main(
+            answers_token="test-bot-token",
+            webhook_secret="test-webhook-secret",
+        ) as app:
+            app.workday_service.has_active_run = Mock(return_value=True)
+            app.workday_service.get_status = Mock(return_value={"phase": "before_start"})
+            with patch.object(app, "_WORKDAY_MISSING_CONFIG", ()):
+                worker = threading.Thread(target=app._workday_scheduler_loop, daemon=True)
+                worker.start()
+                app._stop_workday_scheduler()
+                worker.join(timeout=5)
+
+        self.assertFalse(worker.is_alive())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,11 +1,17 @@
+import gzip
 import json
 import logging
+import os
+import queue
 import sys
 import tempfile
+import threading
+import time
 import types
 import unittest
 from datetime import datetime
 from pathlib import Path
+from unittest import mock
 
 
 def _load_workday_service():
@@ -251,8 +257,7 @@ class WorkdayResilienceTests(unittest.TestCase):
 
             svc._click_icon_button = fake_click_icon
             svc._is_selector_visible = fake_is_visible
-            svc._dismiss_cookie_popup = lambda page_obj: False
-            svc._dismiss_location_prompt = lambda page_obj: False
+            svc._dismiss_overlays = lambda page_obj: None
 
             svc._click_and_confirm_transition(page, "Icon-play", "Icon-stop", "break end")
 
@@ -283,14 +288,644 @@ class WorkdayResilienceTests(unittest.TestCase):
 
             svc._click_icon_button = fake_click_icon
             svc._is_selector_visible = fake_is_visible
-            svc._dismiss_cookie_popup = lambda page_obj: False
-            svc._dismiss_location_prompt = lambda page_obj: False
+            svc._dismiss_overlays = lambda page_obj: None
 
             svc._click_and_confirm_transition(page, "Icon-play", "Icon-stop", "break end")
 
             self.assertEqual(page.reloads, 1)
             self.assertEqual(clicked_icons, ["Icon-play"])
 
+    def test_wait_until_or_selector_returns_early_when_selector_appears(self) -> None:
+        class _ObservedPage:
+            url = "https://example.invalid/workday"
+
+            def __init__(self):
+                self.probes = 0
+
+            def evaluate(self, script, args):
+                self.probes += 1
+                return self.probes >= 2
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            page = _ObservedPage()
+            with mock.patch("agents.workday_agent.service.time.sleep") as fake_sleep:
+                seen = svc._wait_until_or_selector(page, time.time() + 3600, "button")
+
+            self.assertTrue(seen)
+            self.assertEqual(page.probes, 2)
+            self.assertEqual([call.args[0] for call in fake_sleep.call_args_list], [0.5, 1])
+
+    def test_wait_until_or_selector_shared_backoff_keeps_growing(self) -> None:
+        class _ObservedPage:
+            url = "https://example.invalid/workday"
+
+            def evaluate(self, script, args):
+                return True
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            backoff = svc._wait_backoff_steps()
+            with mock.patch("agents.workday_agent.service.time.sleep") as fake_sleep:
+                for _ in range(3):
+                    self.assertTrue(svc._wait_until_or_selector(_ObservedPage(), time.time() + 3600, "button", backoff=backoff))
+
+            self.assertEqual([call.args[0] for call in fake_sleep.call_args_list], [0.5, 1, 2])
+
+    def test_wait_until_or_selector_skips_probe_on_blank_page(self) -> None:
+        class _BlankPage:
+            url = "about:blank"
+
+            def evaluate(self, script, args):
+                raise AssertionError("blank page must not be probed")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            seen = svc._wait_until_or_selector(_BlankPage(), time.time() + 0.05, "button")
+            self.assertFalse(seen)
+
+    def test_save_screenshot_uses_viewport_jpeg_and_bounded_clip(self) -> None:
+        class _ShotPage:
+            viewport_size = {"width": 1024, "height": 768}
+
+            def __init__(self):
+                self.calls = []
+
+            def evaluate(self, script):
+                return 90_000
+
+            def screenshot(self, **kwargs):
+                self.calls.append(kwargs)
+
+        page = _ShotPage()
+        WorkdayAgentService._save_screenshot(page, Path("/tmp/step.jpg"))
+        WorkdayAgentService._save_screenshot(page, Path("/tmp/failed.jpg"), bounded_full_page=True)
+
+        self.assertFalse(page.calls[0]["full_page"])
+        self.assertEqual(page.calls[0]["type"], "jpeg")
+        self.assertNotIn("clip", page.calls[0])
+        self.assertEqual(
+            page.calls[1]["clip"],
+            {"x": 0, "y": 0, "width": 1024, "height": WorkdayAgentService.SCREENSHOT_MAX_CLIP_HEIGHT},
+        )
+
+    def test_html_snapshot_is_only_written_when_enabled(self) -> None:
+        class _ContentPage:
+            def __init__(self):
+                self.evaluate_calls = 0
+
+            def evaluate(self, script):
+                self.evaluate_calls += 1
+                return "<html>ok</html>"
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            page = _ContentPage()
+            html_path = Path(tmp) / "snap.html"
+
+            svc._save_html_snapshot(page, html_path)
+            self.assertFalse(html_path.exists())
+            self.assertEqual(page.evaluate_calls, 0)
+
+            svc.debug_html_snapshots = True
+            svc._save_html_snapshot(page, html_path)
+            gz_path = Path(tmp) / "snap.html.gz"
+            self.assertEqual(gzip.decompress(gz_path.read_bytes()).decode("utf-8"), "<html>ok</html>")
+
+            svc._save_html_snapshot(page, Path(tmp) / "again.html")
+            self.assertFalse((Path(tmp) / "again.html.gz").exists())
+            self.assertEqual((Path(tmp) / "again.html.ref").read_text(encoding="utf-8"), "snap.html.gz")
+
+    def test_dismiss_location_prompt_uses_single_evaluate_round_trip(self) -> None:
+        class _EvalPage:
+            def __init__(self, result):
+                self.result = result
+                self.calls = []
+
+            def evaluate(self, script, args):
+                self.calls.append(args)
+                return self.result
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            page = _EvalPage("Rechazar")
+            self.assertTrue(svc._dismiss_location_prompt(page))
+            self.assertEqual(len(page.calls), 1)
+            self.assertEqual(page.calls[0][1], ["Deny", "Block", "No permitir", "Rechazar"])
+
+            empty_page = _EvalPage(None)
+            self.assertFalse(svc._dismiss_cookie_popup(empty_page))
+            self.assertEqual(empty_page.calls[0][0], ["#onetrust-reject-all-handler"])
+
+    def test_confirm_end_of_day_modal_waits_for_selector_instead_of_sleeping(self) -> None:
+        class _ModalPage:
+            def __init__(self):
+                self.waits = []
+
+            def wait_for_selector(self, selector, **kwargs):
+                self.waits.append((selector, kwargs))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            page = _ModalPage()
+            clicked = []
+            svc._humanized_click = lambda page_obj, selector, **kwargs: clicked.append(selector)
+
+            with mock.patch("agents.workday_agent.service.time.sleep") as fake_sleep:
+                svc._confirm_end_of_day_modal(page)
+
+            fake_sleep.assert_not_called()
+            self.assertEqual(page.waits[0][1].get("state"), "visible")
+            self.assertEqual(clicked, [WorkdayAgentService.END_OF_DAY_MODAL_PRIMARY_SELECTOR])
+
+    def test_can_reuse_target_page_only_when_recent_and_on_target(self) -> None:
+        class _OpenPage:
+            def __init__(self, url, closed=False):
+                self.url = url
+                self._closed = closed
+
+            def is_closed(self):
+                return self._closed
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            now = time.monotonic()
+            on_target = _OpenPage("https://example.invalid/workday/")
+
+            self.assertTrue(svc._can_reuse_target_page(on_target, now))
+            self.assertFalse(svc._can_reuse_target_page(on_target, 0.0))
+            self.assertFalse(
+                svc._can_reuse_target_page(
+                    on_target,
+                    now - WorkdayAgentService.TARGET_PAGE_REUSE_MAX_AGE_SECONDS - 1,
+                )
+            )
+            self.assertFalse(svc._can_reuse_target_page(_OpenPage("https://example.invalid/login"), now))
+            self.assertFalse(
+                svc._can_reuse_target_page(_OpenPage("https://example.invalid/workday", closed=True), now)
+            )
+
+    def test_jitter_helpers_stay_within_bounds_across_buffer_refill(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            for _ in range(WorkdayAgentService.JITTER_BUFFER_SIZE + 10):
+                value = svc._jitter_uniform(-2.0, 2.0)
+                self.assertGreaterEqual(value, -2.0)
+                self.assertLessEqual(value, 2.0)
+                steps = svc._jitter_randint(6, 14)
+                self.assertGreaterEqual(steps, 6)
+                self.assertLessEqual(steps, 14)
+
+    def test_enqueued_io_runs_in_order_and_drain_waits_for_it(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            svc._set_runtime_state("on_break", "On break", run_id="r1", job="workday_flow", ok=None)
+            svc._enqueue_io(
+                svc.send_click_webhook,
+                "",
+                phase="working_before_break",
+                job_name="workday_flow",
+                run_id="r1",
+                click_name="start_break_click",
+                ok=True,
+            )
+            svc._enqueue_io(svc._append_runtime_event, "resume_completed", phase="completed", run_id="r1")
+            svc._drain_io_queue()
+
+            events = [
+                json.loads(line)
+                for line in svc.runtime_events_path.read_text(encoding="utf-8").splitlines()
+                if line.strip()
+            ]
+            self.assertEqual(
+                [item["event"] for item in events[-2:]],
+                ["click_webhook_sent", "resume_completed"],
+            )
+            self.assertEqual(events[-2]["phase"], "working_before_break")
+
+    def test_runtime_events_append_after_prune_keeps_file_consistent(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            svc._append_runtime_event("first", phase="before_start")
+            current = svc.runtime_events_path.read_text(encoding="utf-8")
+            stale = json.dumps({"ts": "2000-01-01T00:00:00", "event": "stale"}) + "\n"
+            svc.runtime_events_path.write_text(stale + current, encoding="utf-8")
+
+            svc._prune_runtime_events(retention_days=30)
+            svc._append_runtime_event("second", phase="before_start")
+
+            events = [
+                json.loads(line)["event"]
+                for line in svc.runtime_events_path.read_text(encoding="utf-8").splitlines()
+                if line.strip()
+            ]
+            self.assertEqual(events, ["first", "second"])
+            svc._close_runtime_events_fd()
+
+    def test_background_snapshot_writes_bytes_after_drain(self) -> None:
+        class _BytesPage:
+            viewport_size = {"width": 800, "height": 600}
+
+            def __init__(self):
+                self.shot_kwargs = None
+
+            def screenshot(self, **kwargs):
+                self.shot_kwargs = kwargs
+                return b"jpeg-bytes"
+
+            def evaluate(self, script):
+                return "<html></html>"
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            svc.debug_html_snapshots = True
+            page = _BytesPage()
+            image_path = Path(tmp) / "step.jpg"
+            html_path = Path(tmp) / "step.html"
+
+            svc._save_screenshot_in_background(page, image_path)
+            svc._save_html_snapshot(page, html_path, background=True)
+            svc._drain_io_queue()
+
+            self.assertNotIn("path", page.shot_kwargs)
+            self.assertEqual(image_path.read_bytes(), b"jpeg-bytes")
+            html_gz = html_path.with_name("step.html.gz")
+            self.assertEqual(gzip.decompress(html_gz.read_bytes()).decode("utf-8"), "<html></html>")
+
+    def test_snapshot_plan_parses_runtime_floats_once(self) -> None:
+        plan = WorkdayAgentService._snapshot_plan(
+            {"first_click_ts": "100.5", "planned_final_ts": None, "start_break_ts": "bad"}
+        )
+
+        self.assertEqual(plan.first_click_ts, 100.5)
+        self.assertEqual(plan.planned_final_ts, 0.0)
+        self.assertEqual(plan.start_break_ts, 0.0)
+        self.assertFalse(hasattr(plan, "__dict__"))
+
+    def test_humanized_click_skips_scroll_when_locator_in_viewport(self) -> None:
+        class _Locator:
+            def __init__(self, in_view):
+                self.in_view = in_view
+                self.scrolled = False
+
+            def evaluate(self, script):
+                return self.in_view
+
+            def scroll_into_view_if_needed(self, timeout):
+                self.scrolled = True
+
+            def bounding_box(self):
+                return None
+
+            def hover(self, timeout):
+                return None
+
+            def click(self, timeout, delay):
+                return None
+
+        class _Page:
+            def __init__(self):
+                self.waits = 0
+
+            def wait_for_selector(self, selector, timeout):
+                self.waits += 1
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            for in_view, expected_scroll in ((True, False), (False, True)):
+                locator = _Locator(in_view)
+                page = _Page()
+                with mock.patch.object(svc, "_pick_largest_visible_locator", return_value=locator), mock.patch.object(
+                    svc, "_human_pause"
+                ):
+                    svc._humanized_click(page, "button")
+                self.assertEqual(locator.scrolled, expected_scroll)
+                self.assertEqual(page.waits, 0)
+
+    def test_click_failure_snapshot_writes_capped_html_excerpt(self) -> None:
+        class _FailurePage:
+            viewport_size = {"width": 800, "height": 600}
+
+            def __init__(self):
+                self.content_calls = 0
+
+            def screenshot(self, **kwargs):
+                return b"jpeg"
+
+            def evaluate(self, script, arg=None):
+                return ["Workday | https://example.test/ | complete", "x" * (arg + 50)]
+
+            def content(self):
+                self.content_calls += 1
+                return "<html></html>"
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            page = _FailurePage()
+            svc._capture_click_failure_snapshot(page, "icon_Icon-play")
+            svc._drain_io_queue()
+
+            self.assertEqual(len(list(Path(tmp).rglob("click_failed_*.jpg"))), 1)
+            html_files = list(Path(tmp).rglob("click_failed_*.html"))
+            self.assertEqual(len(html_files), 1)
+            body = html_files[0].read_text(encoding="utf-8")
+            self.assertTrue(body.startswith("<!-- Workday | https://example.test/ | complete -->"))
+            self.assertEqual(len(body.split("\n", 1)[1]), WorkdayAgentService.HTML_EXCERPT_MAX_CHARS)
+            self.assertEqual(page.content_calls, 0)
+
+    def test_probe_icons_uses_single_evaluate_and_falls_back(self) -> None:
+        class _ProbePage:
+            def __init__(self, fail):
+                self.fail = fail
+                self.calls = []
+
+            def evaluate(self, script, args):
+                self.calls.append(args)
+                if self.fail:
+                    raise RuntimeError("evaluate unavailable")
+                return {"Icon-play": True, "Icon-pause": False}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            page = _ProbePage(fail=False)
+            probes = svc._probe_icons(page, ("Icon-play", "Icon-pause"), timeout_ms=2_000)
+            self.assertEqual(probes, {"Icon-play": True, "Icon-pause": False})
+            self.assertEqual(page.calls, [[["Icon-play", "Icon-pause"], 2_000]])
+
+            with mock.patch.object(svc, "_is_icon_visible", side_effect=lambda _p, label, timeout_ms: label == "Icon-pause"):
+                probes = svc._probe_icons(_ProbePage(fail=True), ("Icon-play", "Icon-pause"))
+            self.assertEqual(probes, {"Icon-play": False, "Icon-pause": True})
+
+    def test_browser_session_starts_and_stops_playwright_per_run(self) -> None:
+        sessions = []
+
+        class _PlaywrightManager:
+            def __enter__(self):
+                sessions.append({"stopped": False})
+                return sessions[-1]
+
+            def __exit__(self, *_exc):
+                sessions[-1]["stopped"] = True
+                return False
+
+        service_module = sys.modules[WorkdayAgentService.__module__]
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            with mock.patch.object(service_module, "sync_playwright", _PlaywrightManager), mock.patch.object(
+                svc, "_launch_browser", side_effect=lambda *_a, **_k: mock.Mock()
+            ):
+                with svc._browser_session(run_id="r1", job_name="job") as first:
+                    pass
+                with self.assertRaises(RuntimeError):
+                    with svc._browser_session(run_id="r2", job_name="job") as second:
+                        raise RuntimeError("boom")
+
+            first.close.assert_called_once()
+            second.close.assert_called_once()
+            self.assertIsNot(first, second)
+            self.assertEqual(sessions, [{"stopped": True}, {"stopped": True}])
+
+    def test_wait_for_workday_icons_falls_back_to_domcontentloaded(self) -> None:
+        class _NavPage:
+            def __init__(self, icons_found):
+                self.icons_found = icons_found
+                self.load_states = []
+
+            def evaluate(self, script, args):
+                return self.icons_found
+
+            def wait_for_load_state(self, state, timeout):
+                self.load_states.append(state)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            found = _NavPage(icons_found=True)
+            svc._wait_for_workday_icons(found)
+            self.assertEqual(found.load_states, [])
+
+            missing = _NavPage(icons_found=False)
+            svc._wait_for_workday_icons(missing)
+            self.assertEqual(missing.load_states, ["domcontentloaded"])
+
+    def test_sleep_until_waits_on_event_in_log_intervals(self) -> None:
+        cancel = mock.Mock()
+        cancel.wait.return_value = False
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            with mock.patch.object(time, "sleep") as sleep_mock, mock.patch.object(
+                time, "monotonic", side_effect=[100.0, 100.0, 1000.0, 1900.0, 2800.0, 3700.0]
+            ):
+                svc._sleep_until(time.time() + 3600, cancel)
+
+        sleep_mock.assert_not_called()
+        self.assertEqual(cancel.wait.call_count, 4)
+        self.assertTrue(all(call[0][0] <= 900 for call in cancel.wait.call_args_list))
+
+    def test_cancel_run_wakes_planned_wait(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            self.assertFalse(svc.cancel_run("missing"))
+            cancel = svc._cancel_events["run-1"] = threading.Event()
+            self.assertTrue(svc.cancel_run("run-1"))
+            started = time.monotonic()
+            with self.assertRaisesRegex(RuntimeError, "cancelled"):
+                svc._sleep_until(time.time() + 3600, cancel)
+            self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_fast_mode_fast_forwards_browser_clock_instead_of_sleeping(self) -> None:
+        context = mock.Mock()
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            svc.fast_mode = True
+            with mock.patch.object(svc, "_sleep_until") as sleep_mock:
+                svc._wait_for_planned_click(context, time.time() + 3600)
+                svc._wait_for_planned_click(context, time.time() - 5)
+
+        sleep_mock.assert_not_called()
+        self.assertEqual(context.clock.fast_forward.call_count, 1)
+        self.assertGreater(context.clock.fast_forward.call_args[0][0], 3_590_000)
+
+    def test_ensure_icon_ready_reloads_only_when_icon_missing(self) -> None:
+        class _IconPage:
+            def __init__(self, visible):
+                self.visible = visible
+
+            def wait_for_selector(self, selector, state, timeout):
+                if not self.visible:
+                    raise TimeoutError("icon missing")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            with mock.patch.object(svc, "_reload_target") as reload_mock, mock.patch.object(svc, "_dismiss_overlays"):
+                svc._ensure_icon_ready(_IconPage(visible=True), "Icon-pause")
+                reload_mock.assert_not_called()
+
+                svc._ensure_icon_ready(_IconPage(visible=False), "Icon-pause")
+                reload_mock.assert_called_once()
+
+    def test_webhooks_share_one_keepalive_client(self) -> None:
+        service_module = sys.modules[WorkdayAgentService.__module__]
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            with mock.patch.object(service_module.httpx, "Client", create=True) as client_cls, mock.patch.object(
+                service_module.httpx, "Limits", create=True
+            ):
+                svc._post_webhook("https://example.invalid/a", {"n": 1})
+                svc._post_webhook("https://example.invalid/b", {"n": 2})
+                svc._close_http_client()
+
+            client_cls.assert_called_once()
+            self.assertEqual(client_cls.return_value.post.call_count, 2)
+            client_cls.return_value.close.assert_called_once()
+            self.assertEqual(json.loads(client_cls.return_value.post.call_args.kwargs["content"]), {"n": 2})
+
+    def test_shutdown_flushes_queued_webhooks_before_closing_client(self) -> None:
+        service_module = sys.modules[WorkdayAgentService.__module__]
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            with mock.patch.object(service_module.httpx, "Client", create=True) as client_cls, mock.patch.object(
+                service_module.httpx, "Limits", create=True
+            ):
+                svc._enqueue_io(svc._post_webhook, "https://example.invalid/a", {"n": 1})
+                svc.shutdown()
+
+            client_cls.return_value.post.assert_called_once()
+            client_cls.return_value.close.assert_called_once()
+            self.assertIsNone(svc._http)
+
+    def test_io_queue_drops_tasks_when_full_instead_of_blocking(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            release = threading.Event()
+            done = []
+            with mock.patch.object(svc, "IO_QUEUE_MAXSIZE", 1):
+                svc._io_queue = queue.Queue(maxsize=svc.IO_QUEUE_MAXSIZE)
+                svc._enqueue_io(release.wait, 5)
+                time.sleep(0.05)
+                svc._enqueue_io(done.append, "kept")
+                with self.assertLogs("tests.workday.resilience", level="ERROR"):
+                    svc._enqueue_io(done.append, "dropped")
+                release.set()
+                svc._drain_io_queue()
+            self.assertEqual(done, ["kept"])
+
+    def test_storage_state_is_written_only_when_changed(self) -> None:
+        context = mock.Mock()
+        context.storage_state.return_value = {"cookies": [{"name": "sid", "value": "1"}], "origins": []}
+        with tempfile.TemporaryDirectory() as tmp:
+            storage_path = Path(tmp) / "storage" / "job.json"
+            storage_path.parent.mkdir(parents=True)
+            storage_path.write_text(
+                json.dumps({"origins": [], "cookies": [{"value": "1", "name": "sid"}]}, indent=2),
+                encoding="utf-8",
+            )
+            svc = self._build_service(Path(tmp))
+
+            self.assertFalse(svc._persist_storage_state(context, storage_path))
+            context.storage_state.return_value = {"cookies": [{"name": "sid", "value": "2"}], "origins": []}
+            self.assertTrue(svc._persist_storage_state(context, storage_path))
+            self.assertFalse(svc._persist_storage_state(context, storage_path))
+            self.assertEqual(json.loads(storage_path.read_text(encoding="utf-8"))["cookies"][0]["value"], "2")
+            self.assertEqual(sorted(p.name for p in storage_path.parent.iterdir()), ["job.json"])
+
+    def test_dismiss_overlays_waits_for_both_prompts_in_one_evaluate(self) -> None:
+        class _OverlayPage:
+            def __init__(self):
+                self.calls = []
+
+            url = "https://example.invalid/workday"
+
+            def evaluate(self, script, groups):
+                self.calls.append(groups)
+                return [None, "Rechazar"][-len(groups):]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            page = _OverlayPage()
+            with self.assertLogs(svc.logger, level="INFO") as logs:
+                svc._dismiss_overlays(page)
+
+        self.assertEqual(len(page.calls), 1)
+        self.assertEqual([group[2] for group in page.calls[0]], [1_500, 1_500])
+        self.assertTrue(any("Rechazar" in line for line in logs.output))
+        self.assertFalse(any("Consent banner" in line for line in logs.output))
+
+    def test_dismissed_overlays_are_skipped_until_origin_changes(self) -> None:
+        class _OverlayPage:
+            def __init__(self):
+                self.url = "https://example.invalid/workday"
+                self.calls = []
+
+            def evaluate(self, script, groups):
+                self.calls.append(groups)
+                return ["#onetrust-reject-all-handler", "Deny"][: len(groups)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            page = _OverlayPage()
+            svc._dismiss_overlays(page)
+            svc._dismiss_overlays(page)
+            self.assertEqual(len(page.calls), 1)
+
+            page.url = "https://sso.example.invalid/login"
+            svc._dismiss_overlays(page)
+            self.assertEqual(len(page.calls), 2)
+
+    def test_timestamp_to_local_iso_is_cached_per_second(self) -> None:
+        ts = datetime(2026, 3, 2, 8, 15, 30).timestamp()
+        WorkdayAgentService._local_iso_seconds.cache_clear()
+
+        first = WorkdayAgentService._timestamp_to_local_iso(ts + 0.4)
+        second = WorkdayAgentService._timestamp_to_local_iso(ts + 0.9)
+
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith("2026-03-02T08:15:30"))
+        self.assertEqual(WorkdayAgentService._local_iso_seconds.cache_info().hits, 1)
+        self.assertEqual(WorkdayAgentService._timestamp_to_local_iso(0), "")
+
+    def test_timestamp_to_local_iso_uses_the_offset_in_force_at_each_timestamp(self) -> None:
+        if not hasattr(time, "tzset"):
+            self.skipTest("time.tzset is not available on this platform")
+        WorkdayAgentService._local_iso_seconds.cache_clear()
+        with mock.patch.dict(os.environ, {"TZ": "Europe/Madrid"}):
+            time.tzset()
+            try:
+                winter = WorkdayAgentService._timestamp_to_local_iso(datetime(2026, 1, 15, 12, 0).timestamp())
+                summer = WorkdayAgentService._timestamp_to_local_iso(datetime(2026, 7, 15, 12, 0).timestamp())
+            finally:
+                WorkdayAgentService._local_iso_seconds.cache_clear()
+        time.tzset()
+
+        self.assertEqual(winter, "2026-01-15T12:00:00+01:00")
+        self.assertEqual(summer, "2026-07-15T12:00:00+02:00")
+
+    def test_snapshot_level_controls_step_and_error_captures(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            self.assertEqual(svc.snapshot_level, "all")
+            self.assertTrue(svc._should_snapshot())
+
+            svc.snapshot_level = svc._normalize_snapshot_level(" Error_Only ")
+            self.assertFalse(svc._should_snapshot())
+            self.assertTrue(svc._should_snapshot(error=True))
+
+            svc.snapshot_level = svc._normalize_snapshot_level("none")
+            self.assertFalse(svc._should_snapshot(error=True))
+            self.assertEqual(svc._normalize_snapshot_level("verbose"), "all")
+
+    def test_browser_launch_failure_releases_run_lock_and_cancel_event(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = self._build_service(Path(tmp))
+            with mock.patch.object(svc, "_browser_session", side_effect=RuntimeError("launch failed")):
+                result = svc.run_workday_flow(job_name="workday_flow", supervision=False, run_id="r1")
+
+            self.assertFalse(result["ok"])
+            self.assertEqual(result["error"], "launch failed")
+            self.assertEqual(svc._cancel_events, {})
+            self.assertTrue(svc._run_lock.acquire(blocking=False))
+            svc._run_lock.release()
+            svc.shutdown()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,113 @@
+import threading
+import time
+import unittest
+
+try:
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from routers.workday_agent import create_workday_router
+
+    DEPS_AVAILABLE = True
+except ModuleNotFoundError:  # pragma: no cover - depende del entorno local
+    DEPS_AVAILABLE = False
+
+
+class _FakeWorkdayService:
+    def __init__(self) -> None:
+        self.release = threading.Event()
+        self.cancelled = []
+
+    def list_jobs(self):
+        return {"workday_flow": self.run_workday_flow}
+
+    def run_workday_flow(self, job_name, supervision, run_id):
+        self.release.wait(5)
+        return {"ok": True, "job": job_name, "run_id": run_id}
+
+    def update_settings(self, blocked_start_date, blocked_end_date, reduced_start_date, reduced_end_date):
+        return {"blocked_start_date": blocked_start_date, "blocked_end_date": blocked_end_date}
+
+    def cancel_run(self, run_id):
+        self.cancelled.append(run_id)
+        return run_id == "run-1"
+
+    @staticmethod
+    def now_id():
+        return "generated-id"
+
+
+@unittest.skipUnless(DEPS_AVAILABLE, "fastapi no está instalado en este entorno")
+class WorkdayRouterRunTests(unittest.TestCase):
+    def _build_client(self, on_change=None):
+        service = _FakeWorkdayService()
+        app = FastAPI()
+        app.include_router(
+            create_workday_router(
+                service=service,
+                job_secret="top-secret",
+                missing_config_fn=lambda: [],
+                on_change=on_change,
+            )
+        )
+        return TestClient(app), service
+
+    def test_run_returns_202_and_result_is_polled(self) -> None:
+        client, service = self._build_client()
+        response = client.post("/run/workday_flow?secret=top-secret", json={"run_id": "run-1"})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"accepted": True, "job": "workday_flow", "run_id": "run-1"})
+
+        pending = client.get("/runs/run-1?secret=top-secret").json()
+        self.assertFalse(pending["done"])
+
+        service.release.set()
+        for _ in range(100):
+            polled = client.get("/runs/run-1?secret=top-secret").json()
+            if polled["done"]:
+                break
+            time.sleep(0.01)
+        self.assertTrue(polled["done"])
+        self.assertEqual(polled["result"]["run_id"], "run-1")
+
+    def test_pending_run_id_cannot_be_reused(self) -> None:
+        client, service = self._build_client()
+        first = client.post("/run/workday_flow?secret=top-secret", json={"run_id": "run-1"})
+        duplicate = client.post("/run/workday_flow?secret=top-secret", json={"run_id": "run-1"})
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(duplicate.status_code, 409)
+
+        service.release.set()
+        for _ in range(100):
+            if client.get("/runs/run-1?secret=top-secret").json()["done"]:
+                break
+            time.sleep(0.01)
+        self.assertEqual(client.post("/run/workday_flow?secret=top-secret", json={"run_id": "run-1"}).status_code, 202)
+
+    def test_jobs_are_listed_and_unknown_job_is_404(self) -> None:
+        client, _ = self._build_client()
+        self.assertEqual(client.get("/jobs?secret=top-secret").json(), {"jobs": ["workday_flow"]})
+        self.assertEqual(client.post("/run/missing?secret=top-secret", json={}).status_code, 404)
+
+    def test_unknown_run_and_cancel(self) -> None:
+        client, service = self._build_client()
+        self.assertEqual(client.get("/runs/missing?secret=top-secret").status_code, 404)
+        self.assertEqual(client.post("/runs/run-1/cancel?secret=top-secret").status_code, 200)
+        self.assertEqual(client.post("/runs/other/cancel?secret=top-secret").status_code, 404)
+        self.assertEqual(service.cancelled, ["run-1", "other"])
+        self.assertEqual(client.get("/runs/run-1").status_code, 401)
+
+    def test_on_change_is_notified_after_run_cancel_and_settings(self) -> None:
+        notified = []
+        client, service = self._build_client(on_change=lambda: notified.append(True))
+        client.post("/run/workday_flow?secret=top-secret", json={"run_id": "run-1"})
+        client.post("/runs/run-1/cancel?secret=top-secret")
+        client.post("/runs/other/cancel?secret=top-secret")
+        client.post("/settings?secret=top-secret", json={"blocked_start_date": "", "blocked_end_date": ""})
+        service.release.set()
+
+        self.assertEqual(len(notified), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()